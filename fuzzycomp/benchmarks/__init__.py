@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks for the fuzzycomp package. Every module can be run on its own,
+for example::
+
+    $ python -m fuzzycomp.benchmarks.deletion_index
+    $ python -m fuzzycomp.benchmarks.lcs
+    $ python -m fuzzycomp.benchmarks.suite
+"""
+
+import time
+
+
+def timed(func, *args):
+    """
+    :return: A (seconds, result) tuple for calling *func* with *args*
+    """
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares lookups in a :class:`~fuzzycomp.index.DeletionIndex` with a linear
+scan over the same vocabulary using :func:`~fuzzycomp.levenshtein_distance`.
+"""
+
+from optparse import OptionParser
+import random
+import string
+import sys
+
+from fuzzycomp import fuzzycomp
+from fuzzycomp.benchmarks import timed
+from fuzzycomp.index import DeletionIndex
+
+
+def random_word(rnd, min_length=4, max_length=12):
+    return ''.join(rnd.choice(string.ascii_lowercase)
+                   for _ in range(rnd.randint(min_length, max_length)))
+
+
+def misspell(rnd, word, edits):
+    """
+    :return: *word* with *edits* random insertions, deletions or
+        substitutions applied.
+    """
+    for _ in range(edits):
+        i = rnd.randint(0, len(word) - 1)
+        operation = rnd.randint(0, 2)
+        if operation == 0 and len(word) > 1:
+            word = word[:i] + word[i + 1:]
+        elif operation == 1:
+            word = word[:i] + rnd.choice(string.ascii_lowercase) + word[i:]
+        else:
+            word = word[:i] + rnd.choice(string.ascii_lowercase) + word[i + 1:]
+    return word
+
+
+def linear_scan(words, term, max_distance):
+    return [(word, distance) for word, distance in
+            ((word, fuzzycomp.levenshtein_distance(term, word, max_distance))
+             for word in words) if distance <= max_distance]
+
+
+def main(argv=None):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-w", "--words", type="int", default=20000,
+                      help="number of words in the vocabulary")
+    parser.add_option("-q", "--queries", type="int", default=200,
+                      help="number of queries")
+    parser.add_option("-k", "--max-distance", type="int", default=2,
+                      help="largest distance searched for")
+    parser.add_option("-s", "--seed", type="int", default=0,
+                      help="random seed")
+    options, _ = parser.parse_args(argv)
+
+    rnd = random.Random(options.seed)
+    words = list(set(random_word(rnd) for _ in range(options.words)))
+    terms = [misspell(rnd, rnd.choice(words),
+                      rnd.randint(0, options.max_distance))
+             for _ in range(options.queries)]
+
+    build, index = timed(DeletionIndex, words, options.max_distance)
+    print("Vocabulary: %d words, %d deletion variants, built in %.2f s"
+          % (len(words), len(index._variants), build))
+
+    def run_index():
+        return [sorted(index.query(term)) for term in terms]
+
+    def run_scan():
+        return [sorted(linear_scan(words, term, options.max_distance))
+                for term in terms]
+
+    index_time, index_results = timed(run_index)
+    scan_time, scan_results = timed(run_scan)
+    if index_results != scan_results:
+        print("Results differ between the index and the linear scan")
+        return 1
+
+    print("%-12s %12s %12s" % ("method", "queries/s", "ms/query"))
+    for name, elapsed in [("index", index_time), ("linear scan", scan_time)]:
+        print("%-12s %12.1f %12.3f" % (name, len(terms) / elapsed,
+                                       1000 * elapsed / len(terms)))
+    print("Speedup: %.1fx" % (scan_time / index_time))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the bit-parallel :func:`~fuzzycomp.lcs_length` with the reference
+dynamic programming implementation over a range of input lengths.
+
+The reference implementation is quadratic, so above *--max-reference*
+elements its time is extrapolated from the longest measured length, and
+marked with a ``~``.
+"""
+
+from optparse import OptionParser
+import random
+import sys
+
+from fuzzycomp import fuzzycomp
+from fuzzycomp.benchmarks import timed
+
+
+def main(argv=None):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-l", "--lengths", default="10,100,1000,10000,100000",
+                      help="comma separated input lengths")
+    parser.add_option("-a", "--alphabet", default="ACGT",
+                      help="characters the inputs are drawn from")
+    parser.add_option("-r", "--max-reference", type="int", default=2000,
+                      help="longest input timed with the reference "
+                           "implementation")
+    parser.add_option("-s", "--seed", type="int", default=0,
+                      help="random seed")
+    options, _ = parser.parse_args(argv)
+
+    rnd = random.Random(options.seed)
+    measured = None
+
+    print("%8s %14s %14s %10s" % ("length", "bit-parallel", "reference",
+                                  "speedup"))
+    for length in [int(value) for value in options.lengths.split(",")]:
+        lhs = ''.join(rnd.choice(options.alphabet) for _ in range(length))
+        rhs = ''.join(rnd.choice(options.alphabet) for _ in range(length))
+
+        # Repeat short inputs to get a measurable time
+        repeat = max(1, 10000 // length)
+        fast, result = timed(lambda: [fuzzycomp.lcs_length(lhs, rhs)
+                                      for _ in range(repeat)][0])
+        fast /= repeat
+
+        if length <= options.max_reference:
+            reference, expected = timed(
+                lambda: [fuzzycomp._lcs_rows(lhs, rhs)
+                         for _ in range(repeat)][0])
+            reference /= repeat
+            if result != expected:
+                print("Results differ for length %d" % length)
+                return 1
+            measured = length, reference
+            estimate = ""
+        elif measured:
+            reference = measured[1] * (float(length) / measured[0]) ** 2
+            estimate = "~"
+        else:
+            reference = None
+
+        if reference is None:
+            print("%8d %13.6fs %14s %10s" % (length, fast, "-", "-"))
+        else:
+            print("%8d %13.6fs %14s %9.1fx" % (
+                length, fast, "%s%.6fs" % (estimate, reference),
+                reference / fast))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Times every function in :data:`fuzzycomp.__all__` over generated inputs of
+several lengths, alphabets and edit rates, and compares the times with a
+saved baseline to catch regressions::
+
+    $ python -m fuzzycomp.benchmarks.suite -o baseline.json
+    $ python -m fuzzycomp.benchmarks.suite --baseline baseline.json
+
+Every comparison function is timed on a random string and a copy of it
+with a fraction of its positions edited, where an edit rate of 1 gives
+two unrelated strings. The Hamming distances get substitutions only, to
+keep the lengths equal. The phonetic encoders are timed once per length,
+on lower case letters.
+
+The time of a case is the best of *--repeat* rounds, each calling the
+function until *--min-time* has passed. A case is flagged as a regression
+when it is more than *--tolerance* slower than in the baseline, and the
+exit status is then 1.
+"""
+
+from optparse import OptionParser
+import json
+import platform
+import random
+import string
+import sys
+import time
+
+from fuzzycomp import fuzzycomp
+from fuzzycomp.benchmarks import timed
+
+ALPHABETS = {"binary": "01", "dna": "ACGT",
+             "latin": string.ascii_lowercase}
+
+# Additional arguments of the functions that need them
+ARGUMENTS = {"tversky_index": (0.5, 0.5)}
+
+# The functions that compare equal lengths only
+EQUAL_LENGTHS = ["hamming_distance", "bitwise_hamming_distance"]
+
+
+def edit(rnd, text, rate, alphabet, substitute_only=False):
+    """
+    :return: *text* with about *rate* of its positions replaced, deleted or
+        followed by an inserted element, or only replaced if
+        *substitute_only* is true.
+    """
+    result = []
+    for element in text:
+        if rnd.random() >= rate:
+            result.append(element)
+            continue
+        operation = 0 if substitute_only else rnd.randint(0, 2)
+        if operation == 0:
+            result.append(rnd.choice(alphabet))
+        elif operation == 1:
+            result.append(element)
+            result.append(rnd.choice(alphabet))
+    return ''.join(result) or rnd.choice(alphabet)
+
+
+def measure(func, args, repeat, min_time):
+    """
+    :return: The best time of one call of *func* with *args*, in seconds
+    """
+    first, _ = timed(func, *args)
+    number = max(1, int(min_time / max(first, 1e-6)))
+    best = first
+    # A first call taking the whole round counts as one
+    for _ in range(repeat - 1 if number == 1 else repeat):
+        seconds, _ = timed(lambda: [func(*args) for _ in xrange(number)])
+        best = min(best, seconds / number)
+    return best
+
+
+def cases(names, lengths, alphabets, rates, seed):
+    """
+    :return: An iterator over *(key, function, args)* tuples for every
+        case to time, where *key* is a dict describing the case
+    """
+    for name in names:
+        func = getattr(fuzzycomp, name)
+        for length in lengths:
+            rnd = random.Random("%s %d" % (seed, length))
+            if name in fuzzycomp._ENCODERS:
+                text = ''.join(rnd.choice(string.ascii_lowercase)
+                               for _ in xrange(length))
+                yield (dict(function=name, length=length, alphabet="latin",
+                            edit_rate=None), func, (text,))
+                continue
+
+            for alphabet in alphabets:
+                letters = ALPHABETS[alphabet]
+                text = ''.join(rnd.choice(letters) for _ in xrange(length))
+                for rate in rates:
+                    other = edit(rnd, text, rate, letters,
+                                 name in EQUAL_LENGTHS)
+                    yield (dict(function=name, length=length,
+                                alphabet=alphabet, edit_rate=rate),
+                           func, (text, other) + ARGUMENTS.get(name, ()))
+
+
+def _key(result):
+    return (result["function"], result["length"], result["alphabet"],
+            result["edit_rate"])
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: A list of result dicts
+    :param baseline: A list of result dicts to compare with
+    :param tolerance: The fraction by which a case may be slower
+    :return: A list of *(result, ratio)* tuples for the cases in both lists
+        that are slower than their baseline by more than *tolerance*, where
+        *ratio* is the time divided by that of the baseline
+    """
+    previous = dict((_key(result), result) for result in baseline)
+    regressions = []
+    for result in results:
+        before = previous.get(_key(result))
+        if before is None or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append((result, ratio))
+    return regressions
+
+
+def _describe(result):
+    return "%-26s %6d %-7s %5s" % (
+        result["function"], result["length"], result["alphabet"],
+        "-" if result["edit_rate"] is None else result["edit_rate"])
+
+
+def main(argv=None):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-f", "--functions",
+                      help="comma separated functions to time, by default "
+                           "all of fuzzycomp.__all__")
+    parser.add_option("-l", "--lengths", default="4,16,64,256,4096,65536",
+                      help="comma separated input lengths")
+    parser.add_option("-a", "--alphabets", default="binary,dna,latin",
+                      help="comma separated alphabets out of %s"
+                           % ", ".join(sorted(ALPHABETS)))
+    parser.add_option("-e", "--edit-rates", default="0.05,0.25,1",
+                      help="comma separated fractions of edited positions")
+    parser.add_option("-r", "--repeat", type="int", default=3,
+                      help="number of rounds per case")
+    parser.add_option("-m", "--min-time", type="float", default=0.05,
+                      help="least time of a round in seconds")
+    parser.add_option("-s", "--seed", type="int", default=0,
+                      help="random seed")
+    parser.add_option("-o", "--output", help="file to write the results to, "
+                      "as JSON")
+    parser.add_option("-b", "--baseline",
+                      help="JSON results to compare the results with")
+    parser.add_option("-i", "--input",
+                      help="compare these saved JSON results with the "
+                           "baseline instead of running the benchmarks")
+    parser.add_option("-t", "--tolerance", type="float", default=0.25,
+                      help="fraction by which a case may be slower than its "
+                           "baseline")
+    options, _ = parser.parse_args(argv)
+
+    if options.input:
+        results = json.load(open(options.input))["results"]
+    else:
+        if options.functions:
+            names = options.functions.split(",")
+        else:
+            names = [name for name in fuzzycomp.__all__
+                     if hasattr(fuzzycomp, name)]
+        for name in names:
+            if name not in fuzzycomp.__all__ or not hasattr(fuzzycomp, name):
+                parser.error("unknown function %r" % name)
+        alphabets = options.alphabets.split(",")
+        for alphabet in alphabets:
+            if alphabet not in ALPHABETS:
+                parser.error("unknown alphabet %r" % alphabet)
+
+        results = []
+        print("%-26s %6s %-7s %5s %14s %12s" % ("function", "length",
+                                                "letters", "edits",
+                                                "seconds", "calls/s"))
+        for key, func, args in cases(
+                names, [int(value) for value in options.lengths.split(",")],
+                alphabets,
+                [float(value) for value in options.edit_rates.split(",")],
+                options.seed):
+            try:
+                key["seconds"] = measure(func, args, options.repeat,
+                                         options.min_time)
+            except (ValueError, ZeroDivisionError), e:
+                print("%s skipped: %s" % (_describe(key), e))
+                continue
+            results.append(key)
+            print("%s %13.7fs %12.1f" % (_describe(key), key["seconds"],
+                                         1 / max(key["seconds"], 1e-12)))
+            sys.stdout.flush()
+
+        if options.output:
+            report = dict(python=platform.python_version(),
+                          platform=platform.platform(),
+                          date=time.strftime("%Y-%m-%d %H:%M:%S"),
+                          results=results)
+            output = open(options.output, "w")
+            try:
+                json.dump(report, output, indent=1, sort_keys=True)
+            finally:
+                output.close()
+
+    if not options.baseline:
+        return 0
+
+    regressions = compare(results, json.load(open(options.baseline))["results"],
+                          options.tolerance)
+    for result, ratio in regressions:
+        print("Slower: %s %.2fx" % (_describe(result), ratio))
+    print("%d of %d cases more than %d%% slower than the baseline" % (
+        len(regressions), len(results), options.tolerance * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Matches the names in one file against the names in another from the
+command line::
+
+    $ python -m fuzzycomp -m jaro_winkler -t 0.9 -k 3 queries.csv choices.csv
+
+Inputs can be CSV or TSV files with a header row, or NDJSON files with one
+JSON object or string per line. The choices are read into memory, as the
+names only, and the queries are streamed in chunks, so the memory used
+does not grow with the number of queries. The matches of every chunk are
+written as soon as it is done, and progress goes to stderr.
+"""
+
+from exceptions import ValueError
+from optparse import OptionParser
+import csv
+import heapq
+import inspect
+import json
+import multiprocessing
+import sys
+import time
+
+from fuzzycomp import levenshtein_distance, jaro_winkler, \
+    levenshtein_distance_many, jaro_winkler_topk, prepare, _get_metric, \
+    _get_encoder
+from dedupe import _DISTANCES
+
+__all__ = ["main"]
+
+# The formats known by their file extensions
+_FORMATS = {".csv": "csv", ".tsv": "tsv", ".ndjson": "ndjson",
+            ".jsonl": "ndjson"}
+
+# The columns of the output
+_HEADER = ["query_id", "choice_id", "query", "choice", "score"]
+
+# The settings of the matching, installed in every worker process by _init
+_state = {}
+
+
+def _format(path, default):
+    """
+    :return: The format of *path* by its extension, or *default*
+    """
+    for extension, name in _FORMATS.iteritems():
+        if path.lower().endswith(extension):
+            return name
+    return default
+
+
+def _read(path, fmt, field):
+    """
+    :param path: The file to read, or "-" for stdin
+    :param fmt: "csv", "tsv" or "ndjson"
+    :param field: The column or key holding the name, or None for the first
+        column of a CSV or TSV file
+    :return: An iterator over *(id, name)* tuples, where *id* is the number
+        of the record in the file, starting at 1. Blank lines of an NDJSON
+        file are not records. Records with empty names are skipped.
+    :raise: ValueError
+    """
+    stream = sys.stdin if path == "-" else open(path, "rb")
+    try:
+        if fmt == "ndjson":
+            records = (json.loads(line) for line in stream if line.strip())
+            for i, record in enumerate(records):
+                if isinstance(record, dict):
+                    if field is None:
+                        raise ValueError("%s: --field is required for "
+                                         "JSON objects" % path)
+                    if field not in record:
+                        raise ValueError("%s: record %d has no key named %r"
+                                         % (path, i + 1, field))
+                    record = record[field]
+                if record:
+                    yield i + 1, unicode(record)
+            return
+
+        reader = csv.reader(stream, delimiter="\t" if fmt == "tsv" else ",")
+        header = next(reader, [])
+        column = 0
+        if field is not None:
+            if field not in header:
+                raise ValueError("%s: no column named %r" % (path, field))
+            column = header.index(field)
+        for i, row in enumerate(reader):
+            if column < len(row) and row[column]:
+                yield i + 1, row[column].decode("utf-8")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _chunks(iterable, size):
+    """
+    :return: An iterator over lists of up to *size* items of *iterable*
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init(state):
+    """
+    Pool initializer publishing the choices and settings to a worker
+    process, so they are transferred once per worker instead of once per
+    chunk.
+    """
+    _state.update(state)
+
+
+def _candidates(query):
+    """
+    :return: A list of the ids of the choices to compare *query* with, or
+        None to compare it with all of them
+    """
+    encoder = _state["encoder"]
+    if encoder is None:
+        return None
+    try:
+        code = encoder(query.value)
+    except ValueError:
+        return []
+    return _state["blocks"].get(code, [])
+
+
+def _scores(query, candidates):
+    """
+    :return: A list of *(choice number, score)* tuples for the matches of
+        *query* among the choices numbered in *candidates*, or all choices
+        if it is None
+    """
+    names = _state["names"]
+    metric, threshold, top = _state["metric"], _state["threshold"], \
+        _state["top"]
+    kwargs = _state["kwargs"]
+    distance = metric in _DISTANCES
+    choices = names if candidates is None else [names[i] for i in candidates]
+
+    # Use the batch functions when they apply, they skip choices that
+    # cannot match without calculating their scores
+    if metric is levenshtein_distance and not kwargs:
+        cutoff = None if threshold is None else int(threshold)
+        found = [(index, score) for _, score, index in
+                 levenshtein_distance_many(query, choices, cutoff, top)]
+    elif metric is jaro_winkler and top and not kwargs:
+        found = [(index, score) for _, score, index in
+                 jaro_winkler_topk(query, choices, top, threshold)]
+    else:
+        found = []
+        for index, choice in enumerate(choices):
+            try:
+                score = metric(query, choice, **kwargs)
+            except ValueError:
+                continue
+            if threshold is None or (score <= threshold if distance
+                                     else score >= threshold):
+                found.append((index, score))
+        if top:
+            select = heapq.nsmallest if distance else heapq.nlargest
+            found = select(top, found, key=lambda match: match[1])
+
+    if candidates is not None:
+        found = [(candidates[index], score) for index, score in found]
+    return found
+
+
+def _match(chunk):
+    """
+    :param chunk: A list of *(id, name)* queries
+    :return: A list of output rows for the matches of *chunk*
+    """
+    ids, names = _state["ids"], _state["names"]
+    rows = []
+    for query_id, name in chunk:
+        try:
+            query = prepare(name)
+            matches = _scores(query, _candidates(query))
+        except ValueError:
+            continue
+        for i, score in matches:
+            rows.append((query_id, ids[i], name, names[i].value, score))
+    return rows
+
+
+def _results(chunks, workers):
+    """
+    :return: An iterator over the *(chunk, rows)* results of matching
+        *chunks*, in order. With more than one worker, at most two chunks
+        per worker are read ahead.
+    """
+    if workers == 1:
+        for chunk in chunks:
+            yield chunk, _match(chunk)
+        return
+
+    pool = multiprocessing.Pool(workers, _init, (_state,))
+    try:
+        pending = []
+        for chunk in chunks:
+            pending.append((chunk, pool.apply_async(_match, (chunk,))))
+            if len(pending) >= 2 * workers:
+                chunk, result = pending.pop(0)
+                yield chunk, result.get()
+        for chunk, result in pending:
+            yield chunk, result.get()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _writer(stream, fmt):
+    """
+    :return: A function writing one output row to *stream* in *fmt*
+    """
+    if fmt == "ndjson":
+        def write(row):
+            stream.write(json.dumps(dict(zip(_HEADER, row))) + "\n")
+        return write
+
+    writer = csv.writer(stream, delimiter="\t" if fmt == "tsv" else ",",
+                        lineterminator="\n")
+    writer.writerow(_HEADER)
+
+    def write(row):
+        writer.writerow([value.encode("utf-8") if isinstance(value, unicode)
+                         else value for value in row])
+    return write
+
+
+def _parse_args(parser, options):
+    """
+    :return: A dict of the metric arguments given as NAME=VALUE
+    """
+    kwargs = {}
+    for arg in options.args:
+        name, sep, value = arg.partition("=")
+        if not sep:
+            parser.error("arguments must be given as NAME=VALUE")
+        try:
+            kwargs[name] = float(value)
+        except ValueError:
+            parser.error("argument %s is not a number" % name)
+    return kwargs
+
+
+def _check_args(parser, metric, kwargs):
+    """
+    Reports a usage error if *kwargs* lacks an argument that *metric*
+    requires besides the two objects to compare, or holds one it does not
+    take.
+    """
+    try:
+        names, _, keywords, defaults = inspect.getargspec(metric)
+    except TypeError:
+        return
+    extra = names[2:]
+    required = extra[:len(extra) - len(defaults or ())]
+    missing = [name for name in required if name not in kwargs]
+    if missing:
+        parser.error("%s requires %s" % (metric.__name__, ", ".join(
+            "-a %s=VALUE" % name for name in missing)))
+    if keywords is None:
+        unknown = sorted(name for name in kwargs if name not in extra)
+        if unknown:
+            parser.error("%s takes no argument %s" % (metric.__name__,
+                                                     ", ".join(unknown)))
+
+
+def main(argv=None):
+    parser = OptionParser(usage="%prog [options] QUERIES CHOICES",
+                          description="Finds the names in QUERIES that "
+                          "match names in CHOICES. Use - to read QUERIES "
+                          "from stdin.")
+    parser.add_option("-m", "--metric", default="levenshtein_distance",
+                      help="comparison function from fuzzycomp.__all__")
+    parser.add_option("-a", "--arg", dest="args", action="append",
+                      default=[], metavar="NAME=VALUE",
+                      help="additional argument for the metric, e.g. "
+                           "alpha=0.5")
+    parser.add_option("-t", "--threshold", type="float",
+                      help="largest distance, or smallest similarity, of a "
+                           "match")
+    parser.add_option("-k", "--top", type="int",
+                      help="write only the best TOP matches per query")
+    parser.add_option("-b", "--block", metavar="ENCODER",
+                      help="only compare names with the same code under a "
+                           "phonetic encoder, e.g. soundex")
+    parser.add_option("-f", "--field",
+                      help="column or key holding the names in both inputs")
+    parser.add_option("--query-field", help="field of the queries")
+    parser.add_option("--choice-field", help="field of the choices")
+    parser.add_option("--format", choices=["csv", "tsv", "ndjson"],
+                      help="format of the inputs, by default taken from "
+                           "their extensions")
+    parser.add_option("-o", "--output", default="-",
+                      help="file to write the matches to, in the format "
+                           "of its extension, CSV by default")
+    parser.add_option("-w", "--workers", type="int", default=1,
+                      help="number of processes, 0 for one per CPU")
+    parser.add_option("-c", "--chunk-size", type="int", default=1000,
+                      help="number of queries read at a time")
+    parser.add_option("-q", "--quiet", action="store_true",
+                      help="do not report progress on stderr")
+    options, args = parser.parse_args(argv)
+
+    if len(args) != 2:
+        parser.error("QUERIES and CHOICES are required")
+    if options.top is not None and options.top < 1:
+        parser.error("--top must be 1 or greater")
+    if options.workers < 0 or options.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be positive")
+    try:
+        metric = _get_metric(options.metric)
+        encoder = options.block and _get_encoder(options.block)
+    except ValueError, e:
+        parser.error(str(e))
+    kwargs = _parse_args(parser, options)
+    _check_args(parser, metric, kwargs)
+
+    queries, choices = args
+    query_field = options.query_field or options.field
+    choice_field = options.choice_field or options.field
+    workers = options.workers or multiprocessing.cpu_count()
+    start = time.time()
+
+    def progress(message):
+        if not options.quiet:
+            sys.stderr.write(message + "\n")
+
+    try:
+        ids = []
+        names = []
+        blocks = {}
+        unencoded = 0
+        for choice_id, name in _read(choices,
+                                     options.format or _format(choices, "csv"),
+                                     choice_field):
+            if encoder:
+                try:
+                    code = encoder(name)
+                except ValueError:
+                    unencoded += 1
+                    continue
+                blocks.setdefault(code, []).append(len(names))
+            ids.append(choice_id)
+            names.append(prepare(name))
+        progress("Read %d choices in %.1fs" % (len(names), time.time() - start))
+        if unencoded:
+            progress("Skipped %d choices that %s can not encode"
+                     % (unencoded, options.block))
+
+        _state.update(ids=ids, names=names, blocks=blocks, metric=metric,
+                      threshold=options.threshold, top=options.top,
+                      encoder=encoder or None, kwargs=kwargs)
+
+        output = sys.stdout if options.output == "-" else \
+            open(options.output, "wb")
+        try:
+            write = _writer(output, _format(options.output, "csv"))
+            read = matched = 0
+            reported = start
+            chunks = _chunks(_read(queries,
+                                   options.format or _format(queries, "csv"),
+                                   query_field),
+                             options.chunk_size)
+            for chunk, rows in _results(chunks, workers):
+                for row in rows:
+                    write(row)
+                output.flush()
+                read += len(chunk)
+                matched += len(rows)
+                if time.time() - reported >= 1:
+                    reported = time.time()
+                    progress("%d queries, %d matches, %.0f queries/s"
+                             % (read, matched, read / (reported - start)))
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    except (IOError, ValueError), e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+
+    elapsed = time.time() - start
+    progress("Matched %d queries against %d choices: %d matches in %.1fs, "
+             "%.0f queries/s" % (read, len(names), matched, elapsed,
+                                 read / max(elapsed, 1e-9)))
+    return 0
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from exceptions import EOFError, ValueError
+from itertools import groupby, imap
+from operator import itemgetter
+import cPickle
+import heapq
+import os
+import tempfile
+
+from fuzzycomp import levenshtein_distance, jaccard_distance, \
+    hamming_distance, bitwise_hamming_distance, prepare, _get_metric, \
+    _get_encoder
+
+__all__ = ["UnionFind", "dedupe"]
+
+# The metrics returning a distance, where smaller values are closer. Every
+# other metric is taken to return a similarity.
+_DISTANCES = (levenshtein_distance, jaccard_distance, hamming_distance,
+              bitwise_hamming_distance)
+
+
+class UnionFind(object):
+    """
+    A `disjoint-set forest <http://en.wikipedia.org/wiki/Disjoint-set_data_
+    structure>`__ over the ids 0 to *size* - 1, merging the sets by size and
+    halving the paths on every lookup.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: The number of ids, each starting in a set of its own
+        :type size: int
+        :raise: ValueError
+        """
+        if size < 0:
+            raise ValueError("size must be 0 or greater")
+        self._parents = range(size)
+        self._sizes = [1] * size
+
+    def __len__(self):
+        return len(self._parents)
+
+    def find(self, i):
+        """
+        :param i: An id
+        :return: The id representing the set that *i* belongs to
+        """
+        parents = self._parents
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    def union(self, i, j):
+        """
+        Merges the sets of the ids *i* and *j*.
+
+        :return: True if the sets were merged, False if *i* and *j* were
+            already in the same set.
+        """
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return False
+        if self._sizes[i] < self._sizes[j]:
+            i, j = j, i
+        self._parents[j] = i
+        self._sizes[i] += self._sizes[j]
+        return True
+
+    def sets(self):
+        """
+        :return: A list of the sets as lists of ids, ordered by their
+            smallest id.
+        """
+        sets = {}
+        result = []
+        for i in range(len(self._parents)):
+            root = self.find(i)
+            if root not in sets:
+                sets[root] = []
+                result.append(sets[root])
+            sets[root].append(i)
+        return result
+
+
+def _code(encoder, name):
+    """
+    :return: The code of *name*, or None if it is empty or *encoder* cannot
+        encode it
+    """
+    if not name:
+        return None
+    try:
+        return encoder(name) or None
+    except ValueError:
+        return None
+
+
+# The largest number of sorted runs merged at once. A run is only open
+# while it is written or merged, so at most this many runs and the output
+# of a merge are open at a time, and a merge holds one record per run.
+_MERGE_WIDTH = 64
+
+
+def _write_run(items):
+    """
+    :param items: A sorted iterable of *(code, number, record)* tuples
+    :return: The path of a closed temporary file holding *items*
+    """
+    fd, path = tempfile.mkstemp(prefix="fuzzycomp-", suffix=".run")
+    run = os.fdopen(fd, "wb")
+    try:
+        for item in items:
+            cPickle.dump(item, run, cPickle.HIGHEST_PROTOCOL)
+    except:
+        run.close()
+        _remove(path)
+        raise
+    run.close()
+    return path
+
+
+def _remove(path):
+    """
+    Removes the file at *path*, if it is still there.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _read_run(path):
+    """
+    :return: An iterator over the items in the temporary file at *path*,
+        which is closed and removed when they have all been read
+    """
+    run = open(path, "rb")
+    try:
+        while True:
+            try:
+                yield cPickle.load(run)
+            except EOFError:
+                return
+    finally:
+        run.close()
+        _remove(path)
+
+
+def _sorted_blocks(coded, run_size):
+    """
+    :param coded: An iterable of *(code, record)* tuples
+    :param run_size: The number of records sorted in memory at a time
+    :return: An iterator over *(code, records)* tuples, one per code in
+        order of the codes, where *records* is an iterator over the records
+        with that code in the order they were read
+
+    The records are sorted by their codes in runs of *run_size* that are
+    written to temporary files, and the runs are merged back while the
+    blocks are read. Only one record per merged run and the block being
+    read are held in memory, and no more than *_MERGE_WIDTH* + 1 files are
+    open, however many records there are.
+    """
+    runs = []
+    merging = []
+    readers = []
+    try:
+        chunk = []
+        for number, (code, record) in enumerate(coded):
+            chunk.append((code, number, record))
+            if len(chunk) == run_size:
+                chunk.sort(key=itemgetter(0, 1))
+                runs.append(_write_run(chunk))
+                chunk = []
+        chunk.sort(key=itemgetter(0, 1))
+        runs.append(_write_run(chunk))
+        del chunk
+
+        # Merge the oldest runs into one until few enough are left to merge
+        # at once. The merged runs are removed as they are read.
+        while len(runs) > _MERGE_WIDTH:
+            merging, runs = runs[:_MERGE_WIDTH], runs[_MERGE_WIDTH:]
+            readers = map(_read_run, merging)
+            runs.append(_write_run(heapq.merge(*readers)))
+
+        # The numbers are unique, so merging never compares the records
+        merging, runs = runs, []
+        readers = map(_read_run, merging)
+        for code, items in groupby(heapq.merge(*readers), itemgetter(0)):
+            yield code, imap(itemgetter(2), items)
+    finally:
+        # Close the runs still being read and remove any left behind when
+        # the blocks are not read to the end
+        for reader in readers:
+            reader.close()
+        for path in merging + runs:
+            _remove(path)
+
+
+def _clusters(block, names, metric, threshold, distance, kwargs):
+    """
+    :param block: A list of records
+    :param names: The names of the records in *block*
+    :return: A list of the clusters in *block*, as lists of records
+    """
+    # Records with the same name are merged without comparing them
+    distinct = {}
+    for name in names:
+        distinct.setdefault(name, len(distinct))
+    ids = [distinct[name] for name in names]
+
+    names = [None] * len(distinct)
+    for name, i in distinct.iteritems():
+        names[i] = prepare(name)
+
+    sets = UnionFind(len(names))
+    for j in range(1, len(names)):
+        for i in range(j):
+            if sets.find(i) == sets.find(j):
+                continue
+            try:
+                score = metric(names[i], names[j], **kwargs)
+            except ValueError:
+                continue
+            if (score <= threshold) if distance else (score >= threshold):
+                sets.union(i, j)
+
+    clusters = {}
+    result = []
+    for record, i in zip(block, ids):
+        root = sets.find(i)
+        if root not in clusters:
+            clusters[root] = []
+            result.append(clusters[root])
+        clusters[root].append(record)
+    return result
+
+
+def dedupe(records, key=None, blocker="soundex", metric="jaro_winkler",
+           threshold=0.9, presorted=False, run_size=100000, **kwargs):
+    """
+    :param records: An iterable of records, read once
+    :param key: A function returning the name of a record, or None if the
+        records are the names themselves.
+    :param blocker: The name of a phonetic encoder in
+        :data:`fuzzycomp.__all__`, or a function taking a name and
+        returning its code.
+    :param metric: The name of a comparison function in
+        :data:`fuzzycomp.__all__`, or the function itself.
+    :param threshold: The largest distance, or the smallest similarity, at
+        which two names are duplicates.
+    :param presorted: True if the records with the same code already follow
+        each other in *records*.
+    :type presorted: bool
+    :param run_size: The number of records sorted in memory at a time when
+        they are not presorted.
+    :type run_size: int
+    :param kwargs: Additional arguments passed on to *metric*
+    :return: An iterator over the clusters of duplicate records, as lists
+        of records in the order they were read. Every record is part of
+        exactly one cluster, so records without duplicates form clusters of
+        their own.
+    :raise: ValueError
+
+    Finds the duplicates among *records* by comparing the names of the
+    records that share a phonetic code under *blocker*. Within such a
+    block, every pair of names is compared with *metric*, and the records
+    are clustered through union-find, so that a cluster holds all records
+    connected by a chain of matching pairs. Names that are equal are
+    clustered without being compared, and pairs already in the same cluster
+    are skipped.
+
+    :func:`~fuzzycomp.levenshtein_distance`,
+    :func:`~fuzzycomp.jaccard_distance` and the Hamming distances match
+    when the result is at most *threshold*. Every other metric, including
+    any function given as *metric*, is taken to return a similarity and
+    matches when the result is at least *threshold*. Pairs for which
+    *metric* raises ValueError, e.g. names of different lengths under the
+    Hamming distance, do not match.
+
+    Records with empty names, or names the blocker cannot encode, are
+    yielded as clusters of their own. Only one block is held in memory at a
+    time. When *presorted* is true, the blocks are read one after the other.
+    Otherwise the records, which must then be picklable, are first sorted
+    by their codes in temporary files, in runs of *run_size* records that
+    are merged while the blocks are read. The clusters are then yielded in
+    order of the codes.
+    """
+    if run_size < 1:
+        raise ValueError("run_size must be 1 or greater")
+
+    encoder = _get_encoder(blocker)
+    metric = _get_metric(metric)
+    distance = metric in _DISTANCES
+    name_of = (lambda record: record) if key is None else key
+
+    coded = ((_code(encoder, name_of(record)), record) for record in records)
+    if presorted:
+        blocks = ((code, imap(itemgetter(1), items))
+                  for code, items in groupby(coded, itemgetter(0)))
+    else:
+        blocks = _sorted_blocks(coded, run_size)
+
+    for code, block in blocks:
+        if code is None:
+            for record in block:
+                yield [record]
+            continue
+
+        block = list(block)
+        if len(block) == 1:
+            yield block
+            continue
+        for cluster in _clusters(block, map(name_of, block), metric,
+                                 threshold, distance, kwargs):
+            yield cluster
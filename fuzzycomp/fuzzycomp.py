@@ -18,84 +18,729 @@
 #TODO: Write up the documentation for all functions
 
 from exceptions import IndexError, ValueError
-from math import floor
+from array import array
+from binascii import hexlify
+import heapq
 import itertools
+import operator
 import unicodedata
 import re
+import string
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 __all__ = ["levenshtein_distance", "jaccard_distance", "soerensen_index",
-           "hamming_distance", "lcs_length", "jaro_distance", "jaro_winkler",
-           "dice_coefficient", "tversky_index", "soundex", "nysiis",
-           "metaphone", "cologne_phonetic"]
+           "hamming_distance", "bitwise_hamming_distance", "lcs_length",
+           "jaro_distance", "jaro_winkler", "dice_coefficient",
+           "tversky_index", "soundex", "nysiis", "metaphone",
+           "cologne_phonetic"]
+
+# The names in __all__ that are phonetic encoders rather than comparisons
+_ENCODERS = ["soundex", "nysiis", "metaphone", "cologne_phonetic"]
+
+
+# Patterns up to this length fit in a single machine word, which keeps the
+# bit-parallel kernels cheaper than the banded dynamic programming.
+_WORD_SIZE = 64
+
+
+# The array typecodes used by Matrix for the types of default value that
+# arrays can hold. Any other default is kept in a list.
+_MATRIX_TYPECODES = {int: 'l', float: 'd'}
 
 
 class Matrix(object):
+    """
+    A table of *rows* by *cols* values, indexed by ``matrix[row, col]``.
+
+    The values are stored row after row in one flat buffer: an
+    :class:`array.array` of C longs or doubles when *default* is an int or
+    a float, and a list for any other default. Storing a value of another
+    type in an array turns the buffer into a list, so any value can be
+    stored in any matrix.
+
+    :attr:`data` is a view of the values as a list of rows. Reading
+    ``matrix.data[row][col]`` reads the buffer, and assigning to a value or
+    a row of it stores into the matrix.
+    """
+
+    __slots__ = ("rows", "cols", "_cells")
+
     def __init__(self, rows, cols, default=0):
         if rows < 0 or cols < 0:
             raise ValueError("Array size must not be negative.")
 
         self.rows = rows
         self.cols = cols
-        self.data = [[default for _ in range(cols)] for _ in range(rows)]
+        typecode = _MATRIX_TYPECODES.get(type(default))
+        if typecode is None:
+            self._cells = [default] * (rows * cols)
+        else:
+            self._cells = array(typecode, [default]) * (rows * cols)
 
     def __setitem__(self, pos, v):
-        if 0 <= pos[0] < self.rows and 0 <= pos[1] < self.cols:
-            self.data[pos[0]][pos[1]] = v
+        row, col = pos
+        cols = self.cols
+        if 0 <= row < self.rows and 0 <= col < cols:
+            cells = self._cells
+            if type(cells) is not list and \
+               _MATRIX_TYPECODES.get(type(v)) != cells.typecode:
+                cells = self._cells = list(cells)
+            cells[row * cols + col] = v
         else:
-            raise IndexError("Index out of bounds ( %d, %d )"
-            % (pos[0], pos[1]))
+            raise IndexError("Index out of bounds ( %d, %d )" % (row, col))
 
     def __getitem__(self, pos):
-        if 0 <= pos[0] < self.rows and 0 <= pos[1] < self.cols:
-            return self.data[pos[0]][pos[1]]
+        row, col = pos
+        cols = self.cols
+        if 0 <= row < self.rows and 0 <= col < cols:
+            return self._cells[row * cols + col]
         else:
-            raise IndexError("Index out of bounds ( %d, %d )"
-            % (pos[0], pos[1]))
+            raise IndexError("Index out of bounds ( %d, %d )" % (row, col))
 
     def __str__(self):
-        return '\n'.join(['Row %s = %s' % (i, self.data[i])
-                          for i in range(self.rows)])
+        return '\n'.join(['Row %s = %s' % (i, list(row))
+                          for i, row in enumerate(self.data)])
 
     def __repr__(self):
         return 'Matrix(%d, %d)' % (self.rows, self.cols)
 
+    def __getstate__(self):
+        return self.rows, self.cols, self._cells
+
+    def __setstate__(self, state):
+        self.rows, self.cols, self._cells = state
+
+    @property
+    def data(self):
+        """
+        The values as a list of rows, each a list of values, that reads and
+        writes the matrix in place
+        """
+        return _MatrixRows(self)
+
+    @data.setter
+    def data(self, rows):
+        rows = list(rows)
+        if len(rows) != self.rows:
+            raise ValueError("data must have %d rows" % self.rows)
+        view = _MatrixRows(self)
+        for i, row in enumerate(rows):
+            view[i] = row
+
     def size(self):
         return self.rows, self.cols
 
 
-def levenshtein_distance(lhs, rhs):
+def _view_index(index, length):
+    """
+    :return: *index* into a sequence of *length*, counting from the end if
+        it is negative
+    :raise: IndexError
+    """
+    if index < 0:
+        index += length
+    if not 0 <= index < length:
+        raise IndexError("list index out of range")
+    return index
+
+
+class _MatrixRow(object):
+    """
+    A row of a :class:`Matrix`, behaving like a list of its values that
+    reads and writes the matrix in place.
+    """
+
+    __slots__ = ("_matrix", "_row")
+
+    def __init__(self, matrix, row):
+        self._matrix = matrix
+        self._row = row
+
+    def __len__(self):
+        return self._matrix.cols
+
+    def __iter__(self):
+        cols = self._matrix.cols
+        return iter(self._matrix._cells[self._row * cols:
+                                        (self._row + 1) * cols])
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return list(self)[col]
+        matrix = self._matrix
+        return matrix._cells[self._row * matrix.cols +
+                             _view_index(col, matrix.cols)]
+
+    def __setitem__(self, col, value):
+        self._matrix[self._row, _view_index(col, self._matrix.cols)] = value
+
+    def __eq__(self, other):
+        if isinstance(other, _MatrixRow):
+            other = list(other)
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _MatrixRows(object):
+    """
+    The rows of a :class:`Matrix`, as returned by :attr:`Matrix.data`.
+    Assigning a sequence to a row stores its values into the matrix.
+    """
+
+    __slots__ = ("_matrix",)
+
+    def __init__(self, matrix):
+        self._matrix = matrix
+
+    def __len__(self):
+        return self._matrix.rows
+
+    def __iter__(self):
+        return (_MatrixRow(self._matrix, i)
+                for i in range(self._matrix.rows))
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return list(self)[row]
+        return _MatrixRow(self._matrix, _view_index(row, self._matrix.rows))
+
+    def __setitem__(self, row, values):
+        matrix = self._matrix
+        row = _view_index(row, matrix.rows)
+        values = list(values)
+        if len(values) != matrix.cols:
+            raise ValueError("A row must have %d values" % matrix.cols)
+        for col, value in enumerate(values):
+            matrix[row, col] = value
+
+    def __eq__(self, other):
+        if isinstance(other, _MatrixRows):
+            other = [list(row) for row in other]
+        if not isinstance(other, list):
+            return NotImplemented
+        return [list(row) for row in self] == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr([list(row) for row in self])
+
+
+
+class Prepared(object):
+    """
+    An object prepared for repeated comparisons, as returned by
+    :func:`prepare`. It can be passed to any of the comparison functions in
+    place of the object it wraps.
+
+    It behaves like the wrapped sequence for :func:`len`, iteration and
+    indexing. What the comparison functions derive from the sequence, such
+    as its bigrams, its set of elements and the bit masks of the positions
+    of every element, is calculated on first use and kept for the following
+    calls.
+    """
+
+    __slots__ = ("value", "length", "_elements", "_grams", "_gram_set",
+                 "_masks")
+
+    def __init__(self, value):
+        if not value:
+            raise ValueError("Input cannot be empty")
+
+        self.value = value
+        self.length = len(value)
+        self._elements = None
+        self._grams = None
+        self._gram_set = None
+        self._masks = None
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __getitem__(self, index):
+        return self.value[index]
+
+    def __repr__(self):
+        return 'Prepared(%r)' % (self.value,)
+
+    def __getstate__(self):
+        return self.value
+
+    def __setstate__(self, value):
+        self.__init__(value)
+
+
+def prepare(obj):
+    """
+    :param obj: The object to prepare
+    :return: A :class:`Prepared` object wrapping *obj*, or *obj* itself if
+        it is already prepared.
+    :raise: ValueError
+
+    Preparing an object that is compared with many others, such as the
+    query of a search, means the work that only depends on that object is
+    done once rather than on every comparison::
+
+        >>> query = fuzzycomp.prepare("MARTHA")
+        >>> [fuzzycomp.jaro_winkler(query, name) for name in names]
+    """
+    if isinstance(obj, Prepared):
+        return obj
+    return Prepared(obj)
+
+
+def _value(obj):
+    """
+    :return: The object wrapped by *obj* if it is prepared, else *obj*
+    """
+    if isinstance(obj, Prepared):
+        return obj.value
+    return obj
+
+
+def _type(obj):
+    """
+    :return: The type of the object wrapped by *obj* if it is prepared,
+        else the type of *obj*
+    """
+    if isinstance(obj, Prepared):
+        return type(obj.value)
+    return type(obj)
+
+
+def _bigrams(seq):
+    """
+    :return: The bigrams of *seq* if it is a string, else *seq* itself
+    """
+    if isinstance(seq, (str, unicode)):
+        return [seq[index:index + 2] for index in range(len(seq) - 1)]
+    return seq
+
+
+def _elements(obj):
+    """
+    :return: The set of elements of *obj*
+    """
+    if not isinstance(obj, Prepared):
+        return set(obj)
+    if obj._elements is None:
+        obj._elements = set(obj.value)
+    return obj._elements
+
+
+def _grams(obj):
+    """
+    :return: The bigrams of *obj*, as returned by :func:`_bigrams`
+    """
+    if not isinstance(obj, Prepared):
+        return _bigrams(obj)
+    if obj._grams is None:
+        obj._grams = _bigrams(obj.value)
+    return obj._grams
+
+
+def _gram_set(obj):
+    """
+    :return: The set of bigrams of *obj*
+    """
+    if not isinstance(obj, Prepared):
+        return set(_bigrams(obj))
+    if obj._gram_set is None:
+        obj._gram_set = set(_grams(obj))
+    return obj._gram_set
+
+
+def _masks(obj):
+    """
+    :return: The masks of *obj*, as returned by :func:`_pattern_masks`
+    :raise: TypeError if the elements of *obj* are not hashable
+    """
+    if not isinstance(obj, Prepared):
+        return _pattern_masks(obj)
+    if obj._masks is None:
+        try:
+            obj._masks = _pattern_masks(obj.value)
+        except TypeError:
+            obj._masks = False
+    if obj._masks is False:
+        raise TypeError("The elements are not hashable")
+    return obj._masks
+
+
+def _levenshtein_step(previous, current, item, seq):
+    """
+    :param previous: The previous row of the Levenshtein table
+    :param current: The list to fill with the next row
+    :param item: The element consumed by the next row
+    :param seq: The sequence along the rows
+
+    Calculates one row of the Levenshtein table from the row before it.
+    """
+    diag = previous[0]
+    left = current[0] = diag + 1
+    for j, other in enumerate(seq, 1):
+        up = previous[j]
+        if item != other:
+            if up < diag:
+                diag = up
+            if left < diag:
+                diag = left
+            diag += 1
+        current[j] = left = diag
+        diag = up
+
+
+def _levenshtein_rows(lhs, rhs):
+    """
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :return: The Levenshtein distance between *lhs* and *rhs*
+
+    Fills the Levenshtein matrix one row at a time, keeping only the
+    previous and the current row. The rows are sized to the shorter of the
+    two sequences, so memory grows with O(min(m, n)).
+    """
+    if len(lhs) < len(rhs):
+        lhs, rhs = rhs, lhs
+
+    previous = list(range(len(rhs) + 1))
+    current = [0] * (len(rhs) + 1)
+
+    for item in lhs:
+        _levenshtein_step(previous, current, item, rhs)
+        previous, current = current, previous
+
+    return previous[-1]
+
+
+def _lcs_rows(lhs, rhs):
+    """
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :return: The length of the longest common subsequence
+
+    Row by row version of the LCS table, keeping only two rows sized to the
+    shorter of the two sequences.
+    """
+    if len(lhs) < len(rhs):
+        lhs, rhs = rhs, lhs
+
+    return _lcs_row(lhs, rhs)[-1]
+
+
+def _lcs_row(lhs, rhs):
+    """
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :return: The last row of the LCS table, a list where item *j* is the
+        length of the longest common subsequence of *lhs* and ``rhs[:j]``
+    """
+    previous = [0] * (len(rhs) + 1)
+    current = [0] * (len(rhs) + 1)
+
+    for char1 in lhs:
+        diag = left = 0
+        for j, char2 in enumerate(rhs, 1):
+            up = previous[j]
+            if char1 == char2:
+                left = diag + 1
+            elif up > left:
+                left = up
+            current[j] = left
+            diag = up
+        previous, current = current, previous
+
+    return previous
+
+
+def _levenshtein_bounded(lhs, rhs, max_distance):
+    """
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :param max_distance: The largest distance of interest
+    :return: The Levenshtein distance, or *max_distance* + 1 if the distance
+        is larger than *max_distance*
+
+    Ukkonen style banded version of :func:`_levenshtein_rows`. Only the
+    diagonal band of width 2 * *max_distance* + 1 is filled, and the
+    computation stops as soon as every cell of a row is above *max_distance*.
+    """
+    if len(lhs) < len(rhs):
+        lhs, rhs = rhs, lhs
+
+    cutoff = max_distance + 1
+    if len(lhs) - len(rhs) > max_distance:
+        return cutoff
+
+    previous = [min(j, cutoff) for j in range(len(rhs) + 1)]
+    current = [cutoff] * (len(rhs) + 1)
+
+    for i, char1 in enumerate(lhs, 1):
+        first = max(1, i - max_distance)
+        last = min(len(rhs), i + max_distance)
+
+        if first == 1:
+            current[0] = min(i, cutoff)
+        else:
+            current[first - 1] = cutoff
+
+        diag = previous[first - 1]
+        best = left = current[first - 1]
+        for j in range(first, last + 1):
+            up = previous[j]
+            if char1 != rhs[j - 1]:
+                if up < diag:
+                    diag = up
+                if left < diag:
+                    diag = left
+                diag += 1
+            current[j] = left = diag
+            if left < best:
+                best = left
+            diag = up
+
+        if last < len(rhs):
+            current[last + 1] = cutoff
+        if best > max_distance:
+            return cutoff
+        previous, current = current, previous
+
+    return min(previous[-1], cutoff)
+
+
+def _pattern_masks(seq):
+    """
+    :param seq: The sequence to build the masks for
+    :return: A dict mapping every element of *seq* to an int with bit *i*
+        set wherever the element occurs at position *i*.
+    :raise: TypeError if the elements of *seq* are not hashable
+    """
+    masks = {}
+    bit = 1
+    for item in seq:
+        masks[item] = masks.get(item, 0) | bit
+        bit <<= 1
+    return masks
+
+
+def _levenshtein_bitparallel(masks, length, text):
+    """
+    :param masks: The masks of the pattern, as returned by
+        :func:`_pattern_masks`
+    :param length: The length of the pattern
+    :param text: The sequence to compare the pattern with
+    :return: The Levenshtein distance between the pattern and *text*
+
+    Myers' bit-vector algorithm in the formulation by Hyyrö. A whole column
+    of the Levenshtein table is encoded in the vertical delta vectors *vp*
+    and *vn*, and is advanced with a handful of word operations for every
+    element of *text*. Python ints have arbitrary precision, so patterns
+    longer than a machine word are handled by the same code, with the
+    carries between words propagated by the int addition.
+    """
+    mask = (1 << length) - 1
+    last = 1 << (length - 1)
+    vp = mask
+    vn = 0
+    score = length
+
+    for item in text:
+        eq = masks.get(item, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | ~(xh | vp)
+        hn = vp & xh
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        hp = (hp << 1) | 1
+        vp = ((hn << 1) | ~(xv | hp)) & mask
+        vn = hp & xv
+
+    return score
+
+
+def _lcs_bitparallel(masks, length, text):
+    """
+    :param masks: The masks of the pattern, as returned by
+        :func:`_pattern_masks`
+    :param length: The length of the pattern
+    :param text: The sequence to compare the pattern with
+    :return: The length of the longest common subsequence
+
+    Bit-vector LCS of Allison and Dix, in the formulation by Hyyrö. The
+    zero bits of *v* mark the positions of the pattern where the LCS row
+    increases, so the LCS length is the number of zero bits left after
+    the whole text has been processed.
+    """
+    mask = (1 << length) - 1
+    v = mask
+
+    for item in text:
+        u = v & masks.get(item, 0)
+        v = ((v + u) | (v - u)) & mask
+
+    return length - bin(v).count('1')
+
+
+def levenshtein_distance(lhs, rhs, max_distance=None):
     """
     :param lhs: The object to compare
     :param rhs: The object to compare with
-    :return: An int >= 0 representing the Levenshtein Distance.
+    :param max_distance: The largest distance of interest, or None to always
+        calculate the full distance.
+    :type max_distance: int
+    :return: An int >= 0 representing the Levenshtein Distance. If
+        *max_distance* is given and the distance is larger than it,
+        *max_distance* + 1 is returned.
     :raise: ValueError
 
     Calculates the Levenshtein distance between two strings as described in
     more detail `here <https://secure.wikimedia
     .org/wikipedia/en/wiki/Levenshtein_distance>`__ .
+
+    Inputs with hashable elements, such as strings, are compared with a
+    bit-parallel algorithm that processes a whole column of the distance
+    table at a time. Other inputs fall back to filling the table row by row.
+
+    When only small distances matter, passing *max_distance* limits the
+    calculation to a diagonal band around the main diagonal, which is much
+    faster for long inputs. Inputs whose lengths differ by more than
+    *max_distance* are rejected without any calculation at all.
     """
 
     if not lhs or not rhs:
         raise ValueError("Input cannot be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
-    m = Matrix(len(lhs), len(rhs))
+    if len(lhs) < len(rhs):
+        lhs, rhs = rhs, lhs
+    pattern = rhs
+    lhs, rhs = _value(lhs), _value(rhs)
 
-    for i in range(len(lhs)):
-        m[i, 0] = i
-    for i in range(len(rhs)):
-        m[0, i] = i
+    if max_distance is not None:
+        if max_distance < 0:
+            raise ValueError("max_distance must be 0 or greater")
+        if len(rhs) > _WORD_SIZE:
+            return _levenshtein_bounded(lhs, rhs, max_distance)
+        if len(lhs) - len(rhs) > max_distance:
+            return max_distance + 1
 
-    for j in range(1, len(rhs)):
-        for i in range(1, len(lhs)):
-            if lhs[i] == rhs[j]:
-                m[i, j] = m[i - 1, j - 1]
-            else:
-                m[i, j] = min(m[i - 1, j] + 1, m[i, j - 1] + 1,
-                              m[i - 1, j - 1] + 1)
+    try:
+        distance = _levenshtein_bitparallel(_masks(pattern), len(rhs), lhs)
+    except TypeError:
+        distance = _levenshtein_rows(lhs, rhs)
 
-    return m[len(lhs) - 1, len(rhs) - 1]
+    if max_distance is not None:
+        return min(distance, max_distance + 1)
+    return distance
+
+
+def levenshtein_distance_many(query, choices, score_cutoff=None, limit=None):
+    """
+    :param query: The object to compare
+    :param choices: An iterable of objects to compare *query* with
+    :param score_cutoff: The largest distance to report, or None to report
+        every choice.
+    :type score_cutoff: int
+    :param limit: The maximum number of results to return, or None to return
+        all of them.
+    :type limit: int
+    :return: A list of *(choice, distance, index)* tuples, where *index* is
+        the position of *choice* in *choices*. If *limit* is given,
+        the list holds the *limit* closest choices sorted by distance,
+        otherwise the choices are listed in the order they were read.
+    :raise: ValueError
+
+    Calculates the :func:`levenshtein_distance` between *query* and every
+    object in *choices*. The query is validated and prepared only once,
+    and *choices* is consumed as a stream, so it can be a generator over a
+    large collection.
+
+    Choices whose length alone puts them further away than *score_cutoff*
+    are skipped without calculating the distance. When *limit* is given,
+    the distance of the worst result kept so far is used as an additional
+    cutoff once *limit* results have been found. Ties are resolved in
+    favour of the choice read first.
+    """
+
+    if not query:
+        raise ValueError("Input cannot be empty")
+    if score_cutoff is not None and score_cutoff < 0:
+        raise ValueError("score_cutoff must be 0 or greater")
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be 1 or greater")
+
+    query_type = _type(query)
+    length = len(query)
+    try:
+        masks = _masks(query)
+    except TypeError:
+        masks = None
+    query = _value(query)
+
+    bound = score_cutoff
+    results = []
+
+    for index, choice in enumerate(choices):
+        if not choice:
+            raise ValueError("Input cannot be empty")
+        if _type(choice) != query_type:
+            raise ValueError("Input should be of the same type")
+
+        if bound is not None and abs(len(choice) - length) > bound:
+            continue
+
+        value = _value(choice)
+        if masks is not None and (bound is None or length <= _WORD_SIZE):
+            try:
+                distance = _levenshtein_bitparallel(masks, length, value)
+            except TypeError:
+                distance = _levenshtein_rows(query, value)
+        elif bound is not None:
+            distance = _levenshtein_bounded(query, value, bound)
+        else:
+            distance = _levenshtein_rows(query, value)
+
+        if bound is not None and distance > bound:
+            continue
+
+        if limit is None:
+            results.append((choice, distance, index))
+        else:
+            heapq.heappush(results, (-distance, -index, choice))
+            if len(results) > limit:
+                heapq.heappop(results)
+            if len(results) == limit:
+                bound = -results[0][0] - 1
+
+    if limit is None:
+        return results
+    return [(choice, -distance, -index)
+            for distance, index, choice in sorted(results, reverse=True)]
 
 
 def jaccard_distance(lhs, rhs):
@@ -118,11 +763,11 @@ def jaccard_distance(lhs, rhs):
     """
     if not lhs or not rhs:
         raise ValueError("Input cannot be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
-    s1 = set(lhs)
-    s2 = set(rhs)
+    s1 = _elements(lhs)
+    s2 = _elements(rhs)
 
     try:
         return  1 - float(len(s1.intersection(s2))) / float(len(s1.union(s2)))
@@ -144,15 +789,145 @@ def hamming_distance(lhs, rhs):
     """
     if not lhs or not rhs:
         raise ValueError("Input cannot be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
     if len(lhs) == len(rhs):
-        return sum(ch1 != ch2 for ch1, ch2 in zip(lhs, rhs))
+        return sum(itertools.imap(operator.ne, _value(lhs), _value(rhs)))
     else:
         raise ValueError("Iterables should be equal length")
 
 
+def bitwise_hamming_distance(lhs, rhs):
+    """
+    :param lhs: The code to compare, a byte string, bytearray or int >= 0
+    :param rhs: The code to compare with
+    :return: An int >= 0 with the number of bits that differ between the
+        two codes.
+    :raise: ValueError
+
+    Calculates the Hamming Distance between two packed binary codes, such
+    as perceptual hashes, counting bits rather than elements. Byte strings
+    must be of equal length. Ints are compared as if padded with zeros to
+    the same length.
+    """
+    lhs, rhs = _value(lhs), _value(rhs)
+    if isinstance(lhs, (str, bytearray)) and \
+       isinstance(rhs, (str, bytearray)):
+        if not lhs or not rhs:
+            raise ValueError("Input cannot be empty")
+        if len(lhs) != len(rhs):
+            raise ValueError("Iterables should be equal length")
+        return bin(int(hexlify(lhs), 16) ^ int(hexlify(rhs), 16)).count("1")
+
+    if not isinstance(lhs, (int, long)) or not isinstance(rhs, (int, long)):
+        raise ValueError("Input should be byte strings or ints")
+    if lhs < 0 or rhs < 0:
+        raise ValueError("Codes must not be negative")
+    return bin(lhs ^ rhs).count("1")
+
+
+# Masks of the SWAR bit count, summing the bits of a 64-bit word in pairs,
+# nibbles and bytes, and the multiplier adding up its bytes.
+_POPCOUNT_MASKS = (0x5555555555555555, 0x3333333333333333,
+                   0x0f0f0f0f0f0f0f0f, 0x0101010101010101)
+
+# The number of set bits in every byte value
+_POPCOUNT_BYTES = [bin(i).count("1") for i in range(256)]
+
+# The number of codes compared in one array step, chosen to keep the
+# temporary arrays in the cache
+_POPCOUNT_ROWS = 1 << 14
+
+
+def _popcount_rows(words, out):
+    """
+    Counts the set bits in every row of the 2-D uint64 array *words*, in
+    place, and stores the count of each row in *out*.
+    """
+    m1, m2, m4, h01 = [np.uint64(mask) for mask in _POPCOUNT_MASKS]
+    words -= (words >> np.uint64(1)) & m1
+    pairs = words >> np.uint64(2)
+    pairs &= m2
+    words &= m2
+    words += pairs
+    words += words >> np.uint64(4)
+    words &= m4
+    words *= h01
+    words >>= np.uint64(56)
+    words.sum(axis=1, dtype=np.intp, out=out)
+
+
+def bitwise_hamming_distance_many(query, codes):
+    """
+    :param query: The code to compare, a byte string, bytearray, int >= 0
+        or NumPy array holding one code
+    :param codes: A NumPy array of packed codes to compare *query* with,
+        either 1-D with one int code per element, or 2-D with one code per
+        row, e.g. an array of uint8 with one byte per column. Like ints,
+        the elements must not be negative.
+    :return: A NumPy array of ints with the :func:`bitwise_hamming_distance`
+        between *query* and every code, in the order of *codes*.
+    :raise: ValueError, ImportError
+
+    Compares *query* with all the codes in one pass of array operations,
+    which makes it suitable for scanning millions of hashes. Requires
+    `NumPy <http://numpy.scipy.org/>`__.
+    """
+    if np is None:
+        raise ImportError("bitwise_hamming_distance_many requires NumPy")
+
+    codes = np.asarray(codes)
+    if codes.ndim not in (1, 2) or codes.dtype.kind not in "iu":
+        raise ValueError("codes should be a 1-D or 2-D array of ints")
+    if codes.dtype.kind == "i" and codes.size and codes.min() < 0:
+        raise ValueError("Codes must not be negative")
+    if codes.ndim == 1:
+        codes = codes.reshape(-1, 1)
+    codes = np.ascontiguousarray(codes)
+    width = codes.shape[1] * codes.itemsize
+
+    query = _value(query)
+    if isinstance(query, (str, bytearray)):
+        query = np.frombuffer(bytes(query), np.uint8)
+        if query.nbytes != width:
+            raise ValueError("Iterables should be equal length")
+        query = query.view(codes.dtype)
+    elif isinstance(query, (int, long)):
+        if query < 0:
+            raise ValueError("Codes must not be negative")
+        code = query
+        query = np.array([query], codes.dtype)
+        if int(query[0]) != code or codes.shape[1] != 1:
+            raise ValueError("query does not fit the codes")
+    else:
+        query = np.asarray(query)
+        if query.dtype.kind == "i" and query.size and query.min() < 0:
+            raise ValueError("Codes must not be negative")
+        query = query.astype(codes.dtype).reshape(-1)
+        if query.shape[0] != codes.shape[1]:
+            raise ValueError("Iterables should be equal length")
+
+    # Count whole 64-bit words when the codes fill them, else bytes
+    codes = codes.view(np.uint8).reshape(len(codes), width)
+    query = query.view(np.uint8)
+    if width % 8 == 0:
+        codes = codes.view(np.uint64)
+        query = query.view(np.uint64)
+    else:
+        table = np.array(_POPCOUNT_BYTES, np.uint8)
+
+    result = np.empty(len(codes), np.intp)
+    for start in range(0, len(codes), _POPCOUNT_ROWS):
+        stop = start + _POPCOUNT_ROWS
+        words = codes[start:stop] ^ query
+        if width % 8 == 0:
+            _popcount_rows(words, result[start:stop])
+        else:
+            table[words].sum(axis=1, dtype=np.intp, out=result[start:stop])
+    return result
+
+
 def lcs_length(lhs, rhs):
     """
     :param lhs: The object to compare
@@ -163,33 +938,181 @@ def lcs_length(lhs, rhs):
     Calculates the longest common subsequence as described in more detail
     `here <https://secure.wikimedia.org/wikipedia/en/wiki/Long
     est_common_subsequence_problem>`__.
+
+    Inputs with hashable elements, such as strings, are compared with a
+    bit-parallel algorithm that processes a whole row of the table at a
+    time. Other inputs fall back to filling the table row by row.
     """
 
     if not lhs or not rhs:
         raise ValueError("Input cannot be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
-    m = Matrix(len(lhs) + 1, len(rhs) + 1)
+    if len(lhs) < len(rhs):
+        lhs, rhs = rhs, lhs
+    pattern = rhs
+    lhs, rhs = _value(lhs), _value(rhs)
+
+    try:
+        return _lcs_bitparallel(_masks(pattern), len(rhs), lhs)
+    except TypeError:
+        return _lcs_rows(lhs, rhs)
+
+
+# The bit-parallel rows of lcs() are only used while the masks, one per
+# distinct element of the shorter input, stay below this many bits in total.
+_LCS_MASK_BITS = 1 << 25
 
-    for i, char1 in zip(range(1, len(lhs) + 1), lhs):
-        for j, char2 in zip(range(1, len(rhs) + 1), rhs):
-            if char1 == char2:
-                m[i, j] = m[i - 1, j - 1] + 1
-            else:
-                m[i, j] = max(m[i, j - 1], m[i - 1, j])
 
-    return m[len(lhs), len(rhs)]
+def _lcs_last_row(lhs, rhs):
+    """
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :return: The last row of the LCS table, as returned by :func:`_lcs_row`
+
+    Uses the bit-parallel kernel when the elements of *rhs* are hashable and
+    its masks are small enough, reading the row off the zero bits of the
+    final bit-vector.
+    """
+    try:
+        masks = _pattern_masks(rhs)
+    except TypeError:
+        return _lcs_row(lhs, rhs)
+    if len(masks) * len(rhs) > _LCS_MASK_BITS:
+        return _lcs_row(lhs, rhs)
+
+    mask = (1 << len(rhs)) - 1
+    v = mask
+    for item in lhs:
+        u = v & masks.get(item, 0)
+        v = ((v + u) | (v - u)) & mask
+
+    row = [0]
+    length = 0
+    for bit in reversed(bin(v | (1 << len(rhs)))[3:]):
+        if bit == '0':
+            length += 1
+        row.append(length)
+    return row
+
+
+def _hirschberg(lhs, rhs, lhs_offset, rhs_offset, pairs):
+    """
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :param lhs_offset: The position of *lhs* in the original sequence
+    :param rhs_offset: The position of *rhs* in the original sequence
+    :param pairs: The list the matching (lhs, rhs) positions are appended to
+
+    Hirschberg's divide and conquer: the LCS rows of the first half of *lhs*
+    and of the reversed second half meet at a column where an optimal
+    alignment crosses the middle, and both halves are solved on their own.
+    Only the rows for the current split are alive at any time, so the memory
+    stays linear in the length of *rhs*.
+    """
+    # A common prefix and suffix are always part of some LCS
+    start = 0
+    lhs_end = len(lhs)
+    rhs_end = len(rhs)
+    while start < lhs_end and start < rhs_end and lhs[start] == rhs[start]:
+        pairs.append((lhs_offset + start, rhs_offset + start))
+        start += 1
+    while lhs_end > start and rhs_end > start and \
+          lhs[lhs_end - 1] == rhs[rhs_end - 1]:
+        lhs_end -= 1
+        rhs_end -= 1
+    suffix = [(lhs_offset + i, rhs_offset + rhs_end + i - lhs_end)
+              for i in range(lhs_end, len(lhs))]
+
+    if start < lhs_end and start < rhs_end:
+        if start or lhs_end < len(lhs):
+            lhs = lhs[start:lhs_end]
+        if start or rhs_end < len(rhs):
+            rhs = rhs[start:rhs_end]
+        lhs_offset += start
+        rhs_offset += start
+
+        if len(lhs) == 1:
+            for j, item in enumerate(rhs):
+                if item == lhs[0]:
+                    pairs.append((lhs_offset, rhs_offset + j))
+                    break
+        elif len(rhs) == 1:
+            for i, item in enumerate(lhs):
+                if item == rhs[0]:
+                    pairs.append((lhs_offset + i, rhs_offset))
+                    break
+        else:
+            middle = len(lhs) // 2
+            forward = _lcs_last_row(lhs[:middle], rhs)
+            backward = _lcs_last_row(lhs[middle:][::-1], rhs[::-1])
+            split = best = 0
+            for j, length in enumerate(forward):
+                length += backward[len(rhs) - j]
+                if length > best:
+                    split, best = j, length
+            del forward, backward
+
+            _hirschberg(lhs[:middle], rhs[:split], lhs_offset, rhs_offset,
+                        pairs)
+            _hirschberg(lhs[middle:], rhs[split:], lhs_offset + middle,
+                        rhs_offset + split, pairs)
+
+    pairs.extend(suffix)
+
+
+def lcs(lhs, rhs, pairs=False):
+    """
+    :param lhs: The object to compare
+    :param rhs: The object to compare with
+    :param pairs: Return the positions of the subsequence instead
+    :return: A longest common subsequence of *lhs* and *rhs*, of the same
+        type as the input for strings, lists and tuples and a list
+        otherwise. If *pairs* is True, a list of ``(i, j)`` tuples where
+        ``lhs[i] == rhs[j]`` is returned instead, in increasing order.
+    :raise: ValueError
+
+    Finds the subsequence itself rather than only its length, as
+    :func:`lcs_length` does, using Hirschberg's algorithm. The memory used
+    is linear in the length of the shorter input, so long sequences such as
+    token streams can be compared without a full table.
+    """
+
+    if not lhs or not rhs:
+        raise ValueError("Input cannot be empty")
+    if _type(lhs) != _type(rhs):
+        raise ValueError("Input should be of the same type")
+
+    lhs, rhs = _value(lhs), _value(rhs)
+    swapped = len(lhs) < len(rhs)
+    if swapped:
+        lhs, rhs = rhs, lhs
+
+    positions = []
+    _hirschberg(lhs, rhs, 0, 0, positions)
+
+    if swapped:
+        lhs, rhs = rhs, lhs
+        positions = [(i, j) for j, i in positions]
+
+    if pairs:
+        return positions
+    if isinstance(lhs, basestring):
+        return lhs[:0].join(lhs[i] for i, _ in positions)
+    if isinstance(lhs, tuple):
+        return tuple(lhs[i] for i, _ in positions)
+    return [lhs[i] for i, _ in positions]
 
 
 def _get_prefix(lhs, rhs, max_prefix=4):
     """
-    :param lhs:
-    :param rhs:
-    :param max_prefix:
-    :return:
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :param max_prefix: The longest prefix to consider
+    :return: The length of the common prefix, at most *max_prefix*
     """
-    length = min(len(lhs), min(rhs), max_prefix)
+    length = min(len(lhs), len(rhs), max_prefix)
 
     for i in range(0, length):
         if lhs[i] != rhs[i]:
@@ -197,17 +1120,69 @@ def _get_prefix(lhs, rhs, max_prefix=4):
     return length
 
 
-def _get_commons(lhs, rhs, dist):
+def _jaro_matches(lhs, rhs):
     """
-    :param lhs:
-    :param rhs:
-    :param dist:
-    :return:
+    :param lhs: The first sequence
+    :param rhs: The second sequence
+    :return: A (matches, transpositions) tuple, where *transpositions* is
+        the number of matched elements that are out of order, twice the
+        number of transpositions of the Jaro distance.
+
+    Every element of *lhs* is matched with the first unmatched equal element
+    of *rhs* within the match window, in a single pass over *lhs*. When the
+    elements are hashable the positions of *rhs* are kept as bits of ints:
+    one mask per element, the matched positions and the window, which is
+    shifted along instead of sliced. The window and the matched positions
+    are offset by the window size so that the window never starts at a
+    negative position. Other inputs scan the window against a list of
+    flags.
+
+    The result is the same either way round, so when only *lhs* is
+    prepared the two are swapped to use its cached masks.
     """
+    if isinstance(lhs, Prepared) and not isinstance(rhs, Prepared):
+        lhs, rhs = rhs, lhs
 
-    commons = [char for index, char in enumerate(lhs) if char in\
-            rhs[int(max(0, index - dist)): int(min(index + dist, len(rhs)))]]
-    return commons, len(commons)
+    window = max(max(len(lhs), len(rhs)) // 2 - 1, 0)
+    matched = []
+
+    try:
+        masks = _masks(rhs)
+    except TypeError:
+        masks = None
+    lhs, rhs = _value(lhs), _value(rhs)
+
+    if masks is not None:
+        get = masks.get
+        span = (2 << (2 * window)) - 1
+        flags = 0
+        for item in lhs:
+            found = (get(item, 0) << window) & span & ~flags
+            if found:
+                found &= -found
+                flags |= found
+                matched.append(item)
+            span <<= 1
+
+        transpositions = 0
+        for item in matched:
+            bit = flags & -flags
+            if rhs[bit.bit_length() - 1 - window] != item:
+                transpositions += 1
+            flags ^= bit
+    else:
+        flags = [False] * len(rhs)
+        for i, item in enumerate(lhs):
+            for j in range(max(i - window, 0), min(i + window + 1, len(rhs))):
+                if not flags[j] and rhs[j] == item:
+                    flags[j] = True
+                    matched.append(item)
+                    break
+
+        transpositions = sum(lhs_item != rhs_item for lhs_item, rhs_item in
+                             zip(matched, itertools.compress(rhs, flags)))
+
+    return len(matched), transpositions
 
 
 def jaro_distance(lhs, rhs):
@@ -223,21 +1198,25 @@ def jaro_distance(lhs, rhs):
     """
     if not lhs or not rhs:
         raise ValueError("Input cannot be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
-    max_range = max(floor(float(max(len(lhs), len(rhs))) / float(2.0)) - 1, 0)
+    return _jaro(lhs, rhs)
+
 
-    commons1, _len1 = _get_commons(lhs, rhs, max_range)
-    commons2, _len2 = _get_commons(rhs, lhs, max_range)
+def _jaro(lhs, rhs):
+    """
+    :param lhs: The object to compare
+    :param rhs: The object to compare with
+    :return: The Jaro distance of *lhs* and *rhs*, without checking them
+    """
+    matches, transpositions = _jaro_matches(lhs, rhs)
 
-    if _len1 == 0 or _len2 == 0:
+    if matches == 0:
         return 0
 
-    num_transpositions = sum(
-        ch1 != ch2 for ch1, ch2 in zip(commons1, commons2)) / 2.0
-    return (_len1 / float(len(lhs)) + _len2 / float(len(rhs)) +
-            (_len1 - num_transpositions) / float(_len1)) / 3.0
+    return (matches / float(len(lhs)) + matches / float(len(rhs)) +
+            (matches - transpositions / 2.0) / matches) / 3.0
 
 
 def jaro_winkler(lhs, rhs, prefix_scale=0.1):
@@ -265,14 +1244,129 @@ def jaro_winkler(lhs, rhs, prefix_scale=0.1):
 
     if not lhs or not rhs:
         raise ValueError("Input cannot be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
-    dist = jaro_distance(lhs, rhs)
-    prefix = _get_prefix(lhs, rhs)
+    dist = _jaro(lhs, rhs)
+    prefix = _get_prefix(_value(lhs), _value(rhs))
     return dist + (prefix * prefix_scale * (1 - dist))
 
 
+def jaro_winkler_topk(query, choices, k=1, score_cutoff=None,
+                      prefix_scale=0.1):
+    """
+    :param query: The object to compare
+    :param choices: An iterable of objects to compare *query* with
+    :param k: The maximum number of results to return
+    :type k: int
+    :param score_cutoff: The smallest score to report, or None to report
+        any score.
+    :type score_cutoff: float
+    :param prefix_scale: The scale factor to use for common prefixes, as
+        for :func:`jaro_winkler`.
+    :return: A list of at most *k* *(choice, score, index)* tuples sorted
+        by decreasing score, where *index* is the position of *choice* in
+        *choices*.
+    :raise: ValueError
+
+    Finds the *k* choices with the highest :func:`jaro_winkler` score. The
+    Jaro distance of two objects can be no higher than when every element
+    of the shorter one is matched in order, which depends on the lengths
+    alone, and the prefix bonus can be no larger than that of a full prefix
+    of four elements. Choices whose bound cannot beat the *k*-th best score
+    found so far, or *score_cutoff*, are skipped without calculating the
+    distance. Choices that pass are checked against a second bound, where
+    the number of matches is limited by how often every element of *query*
+    occurs in the choice. Ties are resolved in favour of the choice read
+    first.
+    """
+
+    if not query:
+        raise ValueError("Input cannot be empty")
+    if k < 1:
+        raise ValueError("k must be 1 or greater")
+
+    query_type = _type(query)
+    length = len(query)
+    max_prefix = min(4, length) if prefix_scale > 0 else 0
+    bounds = {}
+    # The query is prepared so that its masks are built once for all choices
+    prepared = prepare(query)
+    query = prepared.value
+
+    counts = None
+    if hasattr(query, "count"):
+        try:
+            counts = {}
+            for item in query:
+                counts[item] = counts.get(item, 0) + 1
+            items, counts = counts.keys(), counts.values()
+        except TypeError:
+            counts = None
+
+    threshold = score_cutoff
+    results = []
+
+    for index, choice in enumerate(choices):
+        if not choice:
+            raise ValueError("Input cannot be empty")
+        if _type(choice) != query_type:
+            raise ValueError("Input should be of the same type")
+
+        value = _value(choice)
+        prefix = None
+        if threshold is not None:
+            # The bounds are written like the score in _jaro and
+            # jaro_winkler, so that a bound reached exactly is not rounded
+            # below the score.
+            bound = bounds.get(len(choice))
+            if bound is None:
+                matches = float(min(length, len(choice)))
+                bound = (matches / length + matches / len(choice) + 1.0) / 3.0
+                bound += min(max_prefix, len(choice)) * prefix_scale * \
+                         (1 - bound)
+                bounds[len(choice)] = bound
+            if bound < threshold or \
+               (len(results) == k and bound <= threshold):
+                continue
+
+            if counts is not None:
+                matches = sum(map(min, counts, map(value.count, items)))
+                if matches == 0:
+                    bound = 0.0
+                else:
+                    bound = (matches / float(length) +
+                             matches / float(len(choice)) + 1.0) / 3.0
+                    prefix = _get_prefix(query, value) \
+                             if value[0] == query[0] else 0
+                    bound += prefix * prefix_scale * (1 - bound)
+                if bound < threshold or \
+                   (len(results) == k and bound <= threshold):
+                    continue
+
+        dist = _jaro(prepared, choice)
+        if prefix is None:
+            prefix = _get_prefix(query, value)
+        score = dist + prefix * prefix_scale * (1 - dist)
+
+        if score_cutoff is not None and score < score_cutoff:
+            continue
+
+        if len(results) < k:
+            heapq.heappush(results, (score, -index, choice))
+        elif score > results[0][0]:
+            heapq.heapreplace(results, (score, -index, choice))
+        else:
+            continue
+
+        if len(results) == k:
+            threshold = results[0][0] if score_cutoff is None else \
+                        max(results[0][0], score_cutoff)
+
+    return [(choice, score, -index)
+            for score, index, choice in sorted(results, reverse=True)]
+
+
 def dice_coefficient(lhs, rhs):
     """
     :param lhs: The object to compare
@@ -292,16 +1386,11 @@ def dice_coefficient(lhs, rhs):
 
     if not lhs or not rhs:
         raise ValueError("Input can not be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input should be of the same type")
 
-    if isinstance(lhs, (str, unicode)) and isinstance(rhs, (str, unicode)):
-        #Generate the bigrams
-        lhs = [lhs[index:index + 2] for index, _ in enumerate(lhs[0:-1])]
-        rhs = [rhs[index:index + 2] for index, _ in enumerate(rhs[0:-1])]
-
-    inter = len(set(lhs).intersection(set(rhs)))
-    return (2 * inter) / float(len(lhs) + len(rhs))
+    inter = len(_gram_set(lhs) & _gram_set(rhs))
+    return (2 * inter) / float(len(_grams(lhs)) + len(_grams(rhs)))
 
 
 def tversky_index(lhs, rhs, alpha, beta):
@@ -327,21 +1416,526 @@ def tversky_index(lhs, rhs, alpha, beta):
         raise ValueError("Alpha and Beta must be greater than 0")
     if not lhs or not rhs:
         raise ValueError("Input can not be empty")
-    if type(lhs) != type(rhs):
+    if _type(lhs) != _type(rhs):
         raise ValueError("Input must be of the same type")
 
-    if isinstance(lhs, (str, unicode)) and isinstance(rhs, (str, unicode)):
-        lhs = [lhs[index:index + 2] for index, _ in enumerate(lhs[0:-1])]
-        rhs = [rhs[index:index + 2] for index, _ in enumerate(rhs[0:-1])]
-
-    lhs = set(lhs)
-    rhs = set(rhs)
+    lhs = _gram_set(lhs)
+    rhs = _gram_set(rhs)
 
     return float(len(lhs & rhs)) /\
            (float(len(lhs & rhs)) + alpha * len(lhs - rhs) +
             beta * len(rhs - lhs))
 
 
+def _get_metric(metric):
+    """
+    :param metric: The name of a comparison function in :data:`__all__`,
+        or a function taking two objects to compare.
+    :return: The comparison function
+    :raise: ValueError
+    """
+    if callable(metric):
+        return metric
+    if metric not in __all__ or metric in _ENCODERS or \
+       metric not in globals():
+        raise ValueError("Unknown comparison metric %r" % (metric,))
+    return globals()[metric]
+
+
+def _get_encoder(encoder):
+    """
+    :param encoder: The name of a phonetic encoder in :data:`__all__`, or a
+        function taking a name and returning its code.
+    :return: The encoding function
+    :raise: ValueError
+    """
+    if callable(encoder):
+        return encoder
+    if encoder not in _ENCODERS:
+        raise ValueError("Unknown phonetic encoder %r" % (encoder,))
+    return globals()[encoder]
+
+
+def _encode_groups(sequences, codes):
+    """
+    :param sequences: A list of sequences
+    :param codes: A dict mapping elements to ints, updated in place
+    :return: A dict mapping every sequence length to a tuple of an index
+        array and a 2-D int array holding the encoded sequences of that
+        length.
+    :raise: TypeError if the elements are not hashable
+    """
+    groups = {}
+    for index, seq in enumerate(sequences):
+        encoded = [codes.setdefault(item, len(codes)) for item in seq]
+        groups.setdefault(len(seq), ([], []))
+        groups[len(seq)][0].append(index)
+        groups[len(seq)][1].append(encoded)
+
+    return dict((length, (np.array(indexes, dtype=np.intp),
+                          np.array(rows, dtype=np.intp).reshape(-1, length)))
+                for length, (indexes, rows) in groups.items())
+
+
+def _cdist_levenshtein(lhs, rhs):
+    """
+    :param lhs: A 2-D int array of encoded sequences of length m
+    :param rhs: A 2-D int array of encoded sequences of length n
+    :return: A 2-D array with the Levenshtein distance of every pair
+
+    Advances the rows of the Levenshtein table for all pairs at once. The
+    dependency on the cell to the left is resolved with a running minimum,
+    using that cur[j] = min(tmp[k] + j - k) over all k <= j.
+    """
+    steps = np.arange(rhs.shape[1] + 1)
+    previous = np.empty((lhs.shape[0], rhs.shape[0], len(steps)),
+                        dtype=np.intp)
+    previous[...] = steps
+
+    for i in range(lhs.shape[1]):
+        current = np.empty_like(previous)
+        current[:, :, 0] = i + 1
+        np.minimum(previous[:, :, 1:] + 1,
+                   previous[:, :, :-1] +
+                   (lhs[:, None, i, None] != rhs[None, :, :]),
+                   out=current[:, :, 1:])
+        current -= steps
+        previous = np.minimum.accumulate(current, axis=2)
+        previous += steps
+
+    return previous[:, :, -1]
+
+
+def _cdist_lcs(lhs, rhs):
+    """
+    :param lhs: A 2-D int array of encoded sequences of length m
+    :param rhs: A 2-D int array of encoded sequences of length n
+    :return: A 2-D array with the LCS length of every pair
+
+    Advances the rows of the LCS table for all pairs at once, resolving the
+    dependency on the cell to the left with a running maximum.
+    """
+    previous = np.zeros((lhs.shape[0], rhs.shape[0], rhs.shape[1] + 1),
+                        dtype=np.intp)
+
+    for i in range(lhs.shape[1]):
+        current = np.zeros_like(previous)
+        np.maximum(previous[:, :, 1:],
+                   previous[:, :, :-1] +
+                   (lhs[:, None, i, None] == rhs[None, :, :]),
+                   out=current[:, :, 1:])
+        previous = np.maximum.accumulate(current, axis=2)
+
+    return previous[:, :, -1]
+
+
+def _cdist_hamming(lhs, rhs):
+    """
+    :param lhs: A 2-D int array of encoded sequences of length m
+    :param rhs: A 2-D int array of encoded sequences of length n
+    :return: A 2-D array with the Hamming distance of every pair
+    :raise: ValueError if m and n differ
+    """
+    if lhs.shape[1] != rhs.shape[1]:
+        raise ValueError("Iterables should be equal length")
+    return (lhs[:, None, :] != rhs[None, :, :]).sum(axis=2)
+
+
+# Upper bound for the number of table cells processed in one array step
+_CDIST_CELLS = 1 << 20
+
+
+# Comparison state installed in every worker process by _cdist_init
+_cdist_state = {}
+
+
+def _cdist_init(choices, metric, kwargs):
+    """
+    Pool initializer publishing the choices and the metric to a worker
+    process, so they are transferred once per worker instead of once per
+    task.
+    """
+    _cdist_state["args"] = (choices, metric, kwargs)
+
+
+def _cdist_tile(queries):
+    """
+    :param queries: The queries of one tile
+    :return: The :func:`cdist` rows for *queries*, calculated against the
+        choices published by :func:`_cdist_init`
+    """
+    choices, metric, kwargs = _cdist_state["args"]
+    return cdist(queries, choices, metric, **kwargs)
+
+
+def _cdist_parallel(queries, choices, metric, workers, kwargs):
+    """
+    :return: The :func:`cdist` matrix, calculated by *workers* processes
+    """
+    # Imported here, as multiprocessing is only needed with several workers
+    import multiprocessing
+
+    # A few tiles per worker evens out tiles of different cost
+    step = max(1, -(-len(queries) // (workers * 4)))
+    tiles = [queries[start:start + step]
+             for start in range(0, len(queries), step)]
+
+    pool = multiprocessing.Pool(min(workers, len(tiles)), _cdist_init,
+                                (choices, metric, kwargs))
+    try:
+        rows = pool.map(_cdist_tile, tiles)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return np.concatenate(rows)
+
+
+def cdist(queries, choices, metric="levenshtein_distance", workers=1,
+          **kwargs):
+    """
+    :param queries: A sequence of objects to compare
+    :param choices: A sequence of objects to compare with
+    :param metric: The name of a comparison function in :data:`__all__`,
+        or the function itself.
+    :param workers: The number of processes to use, or None to use one
+        process per CPU.
+    :type workers: int
+    :param kwargs: Additional arguments passed on to *metric*
+    :return: A NumPy array of shape (len(*queries*), len(*choices*)),
+        where the element (i, j) is the result of *metric* for
+        *queries[i]* and *choices[j]*.
+    :raise: ValueError, ImportError
+
+    Compares every object in *queries* with every object in *choices*.
+    Requires `NumPy <http://numpy.scipy.org/>`__.
+
+    For :func:`levenshtein_distance`, :func:`lcs_length` and
+    :func:`hamming_distance` the pairs are grouped by the lengths of their
+    objects, and each group is calculated with array operations that
+    advance all of its pairs together. Every other metric, and any call
+    with *kwargs*, is evaluated one pair at a time.
+
+    With more than one worker, the queries are split into tiles that are
+    calculated in a :class:`multiprocessing.Pool`. The choices are handed
+    to each worker process once, when it starts. A function given as
+    *metric* must then be picklable, i.e. defined at module level.
+    """
+
+    if np is None:
+        raise ImportError("cdist requires NumPy")
+    if workers is None:
+        import multiprocessing
+        workers = multiprocessing.cpu_count()
+    if workers < 1:
+        raise ValueError("workers must be 1 or greater")
+
+    func = _get_metric(metric)
+    queries = list(queries)
+    choices = list(choices)
+
+    if workers > 1 and len(queries) > 1 and choices:
+        return _cdist_parallel(queries, choices, metric, workers, kwargs)
+
+    kernel = None
+    if not kwargs:
+        kernel = {levenshtein_distance: _cdist_levenshtein,
+                  lcs_length: _cdist_lcs,
+                  hamming_distance: _cdist_hamming}.get(func)
+
+    if kernel is not None and queries and choices:
+        for seq in itertools.chain(queries, choices):
+            if not seq:
+                raise ValueError("Input cannot be empty")
+            if _type(seq) != _type(queries[0]):
+                raise ValueError("Input should be of the same type")
+
+        codes = {}
+        try:
+            query_groups = _encode_groups(queries, codes)
+            choice_groups = _encode_groups(choices, codes)
+        except TypeError:
+            kernel = None
+
+    if kernel is None:
+        result = np.empty((len(queries), len(choices)))
+        for i, query in enumerate(queries):
+            for j, choice in enumerate(choices):
+                result[i, j] = func(query, choice, **kwargs)
+        return result
+
+    result = np.empty((len(queries), len(choices)), dtype=np.intp)
+    for m, (query_indexes, query_rows) in query_groups.items():
+        for n, (choice_indexes, choice_rows) in choice_groups.items():
+            # Both kernels loop over the first sequence, so let it be the
+            # shorter one. All supported metrics are symmetric.
+            transpose = m > n
+            if transpose:
+                outer, inner = choice_rows, query_rows
+            else:
+                outer, inner = query_rows, choice_rows
+
+            step = max(1, _CDIST_CELLS // (len(inner) * (inner.shape[1] + 1)))
+            block = np.concatenate([kernel(outer[start:start + step], inner)
+                                    for start in range(0, len(outer), step)])
+            if transpose:
+                block = block.T
+            result[np.ix_(query_indexes, choice_indexes)] = block
+
+    return result
+
+
+# The kinds of guards placed in front of the rules of a rule program. A
+# guard is a cheap test that fails for every name the pattern of the rule
+# can not match, so that the rule is skipped without calling the regex
+# engine: the name has to contain a string, start or end with one of some
+# strings, or contain one of a set of characters, or one outside of it.
+_ALWAYS, _ANY_OF, _NONE_OF, _CONTAINS, _STARTS, _ENDS = range(6)
+
+_NOT_UPPER = (_NONE_OF, string.ascii_uppercase)
+
+# Rule cascades of the regex based phonetic encoders. Every rule is a
+# (pattern, replacement) pair applied with re.sub, in order, optionally
+# followed by the guard of the pattern. The tables are compiled into
+# programs by _rule_program the first time they are used.
+_PHONETIC_RULES = {
+    'nysiis_pre': [
+        (r'\s+JR\.?\s{0,}', '', (_CONTAINS, 'JR')),
+        (r'\s+SR\.?\s{0,}', '', (_CONTAINS, 'SR')),
+        (r'\s+[IVXMC]+\.?\s{0,}', '', (_ANY_OF, string.whitespace)),
+        (r'[^A-Z]+', '', _NOT_UPPER),
+        (r'^MAC', 'MCC', (_STARTS, 'MAC')),
+        (r'^KN', 'NN', (_STARTS, 'KN')),
+        (r'K', 'C'),
+        (r'^P[HF]', 'FF', (_STARTS, ('PH', 'PF'))),
+        (r'^SCH', 'SSS', (_STARTS, 'SCH')),
+        (r'[EI]E$', 'Y', (_ENDS, ('EE', 'IE'))),
+        (r'[DRN]T$', 'D', (_ENDS, ('DT', 'RT', 'NT'))),
+        (r'[RN]D$', 'D', (_ENDS, ('RD', 'ND')))
+    ],
+
+    'nysiis_post': [
+        (r'EV', 'AF', (_CONTAINS, 'EV')),
+        (r'[AEIOU]', 'A'),
+        (r'Q', 'G'),
+        (r'Z', 'S'),
+        (r'M', 'N'),
+        (r'KN', 'N', (_CONTAINS, 'KN')),
+        (r'K', 'C'),
+        (r'SCH', 'SSS', (_CONTAINS, 'SCH')),
+        (r'PH', 'FF', (_CONTAINS, 'PH')),
+        (r'([^AEIUO])H', r'\1', (_CONTAINS, 'H')),
+        (r'(.)H[^AEIUO]', r'\1', (_CONTAINS, 'H')),
+        (r'[AEIUO]W', 'A', (_CONTAINS, 'W')),
+        (r'S$', '', (_ENDS, 'S')),
+        (r'AY$', 'Y', (_ENDS, 'AY')),
+        (r'A+$', '', (_ENDS, 'A'))
+    ],
+
+    'metaphone': [
+        (r'[^A-Z]+', '', _NOT_UPPER),
+        (r'([ABCDEFHIJKLMNOPQRSTUVXYZ])\1+', r'\1'),
+        (r'^AE', 'E', (_STARTS, 'AE')),
+        (r'^[GKP]N', 'N', (_STARTS, ('GN', 'KN', 'PN'))),
+        (r'^WR', 'R', (_STARTS, 'WR')),
+        (r'^X', 'S', (_STARTS, 'X')),
+        (r'^WH', 'W', (_STARTS, 'WH')),
+        (r'MB$', 'M', (_ENDS, 'MB')),
+        (r'X', 'KS', (_CONTAINS, 'X')),
+        (r'(?!^)C(IA|H)', 'X', (_CONTAINS, 'C')),
+        (r'(?!^)C(?=[IEY])', 'S', (_CONTAINS, 'C')),
+        (r'(?<=\SS)C(?=[IEY])', 'S', (_CONTAINS, 'SC')),
+        (r'C', 'K'),
+        (r'(?!^)D(?=G([IEY]\S+))', 'J', (_CONTAINS, 'DG')),
+        (r'D', 'T'),
+        (r'(?!^)G(?=H[^AEIOU])', '', (_CONTAINS, 'GH')),
+        (r'(?!^)GN(?:ED)?$', '', (_ENDS, ('GN', 'GNED'))),
+        (r'(?<=\SD)G(?=[IEY]\S+)', '', (_CONTAINS, 'DG')),
+        (r'^G(?=[IEY])', 'J', (_STARTS, ('GI', 'GE', 'GY'))),
+        (r'(?<!G)G(?=[IEY])', 'J', (_CONTAINS, 'G')),
+        (r'G', 'K'),
+        (r'(?<=[AEIOU])H(?=\b|[^AEIOU])', '', (_CONTAINS, 'H')),
+        (r'(?<=\S[CSPTG]H)H(?=\S+)', '', (_CONTAINS, 'HH')),
+        (r'(?<=C)K', '', (_CONTAINS, 'CK')),
+        (r'P(?=H)', 'F', (_CONTAINS, 'PH')),
+        (r'Q', 'K'),
+        (r'SH', 'X', (_CONTAINS, 'SH')),
+        (r'(?!^)S(?=I[OA]\S+)', 'X', (_CONTAINS, 'SI')),
+        (r'(?!^)T(?=I[OA]\S+)', 'X', (_CONTAINS, 'TI')),
+        (r'TH', '0', (_CONTAINS, 'TH')),
+        (r'(?!^)T(?=CH\S+)', '', (_CONTAINS, 'TCH')),
+        (r'V', 'F'),
+        (r'W(?=[^AEIOU])', '', (_CONTAINS, 'W')),
+        (r'Y(?=\b|[^AEIOU])', '', (_CONTAINS, 'Y')),
+        (r'Z', 'S'),
+        (r'(?!^)[AEIOU]+', '', (_ANY_OF, 'AEIOU')),
+    ],
+
+    'cologne_phonetic': [
+        (r'[^A-Z]+', '', _NOT_UPPER),
+        (r'P(?!H)', '1', (_CONTAINS, 'P')),
+        (r'[DT](?![CSZ])', '2', (_ANY_OF, 'DT')),
+        (r'P(?=H)', '3', (_CONTAINS, 'PH')),
+        (r'(?<=^)C(?=[AHKLOQRUX])', '4', (_STARTS, 'C')),
+        (r'(?<![SZ])C(?=[AHKOQUX])', '4', (_CONTAINS, 'C')),
+        (r'(<![CKQ])X', '48', (_CONTAINS, '<!')),
+        (r'(?<=[SZ])C', '8', (_CONTAINS, 'C')),
+        (r'(?<=^)C(?![AHKLOQRUX])', '8', (_STARTS, 'C')),
+        (r'C(?![AHKOQUX])', '8', (_CONTAINS, 'C')),
+        (r'[DT](?=[CSZ])', '', (_ANY_OF, 'DT')),
+        (r'(?<=[CKQ])X', '', (_CONTAINS, 'X')),
+        (r'[FVW]', '3'),
+        (r'H', ''),
+        (r'B', '1'),
+        (r'[GKQ]', '4'),
+        (r'[SZ]', '8'),
+        (r'R', '7'),
+        (r'L', '5'),
+        (r'[MN]', '6'),
+        (r'[AEIJOUY]+', '0', (_ANY_OF, 'AEIJOUY')),
+        #remove duplicates
+        (r'(\d)\1+', r'\1'),
+        #Remove all 0
+        (r'0+', '', (_CONTAINS, '0')),
+    ],
+}
+
+# Matches the rules that replace single characters regardless of context
+_CHAR_RULE = re.compile(r'^(?:([A-Z0-9])|\[([A-Z0-9]+)\])$')
+_CHAR_REPLACEMENT = re.compile(r'^[A-Z0-9]?$')
+
+_rule_programs = {}
+
+
+def _rule_guard(rule):
+    """
+    :param rule: A rule of _PHONETIC_RULES
+    :return: The (kind, value) guard of *rule*, in the form taken by
+        :func:`_run_rules`
+    """
+    if len(rule) < 3:
+        return _ALWAYS, None
+    kind, value = rule[2]
+    if kind in (_ANY_OF, _NONE_OF):
+        return kind, frozenset(value)
+    if kind == _ENDS:
+        # $ also matches in front of a trailing newline
+        if isinstance(value, basestring):
+            value = (value,)
+        return kind, tuple(value) + tuple(suffix + '\n' for suffix in value)
+    return kind, value
+
+
+def _translate(tables, name):
+    """
+    :return: A (name, count) tuple, like re.subn, with *name* translated by
+        the tables of a fused step.
+    """
+    if isinstance(name, unicode):
+        return name.translate(tables[0]), 1
+    return name.translate(tables[1], tables[2]), 1
+
+
+def _compile_rules(rules):
+    """
+    :param rules: A list of (pattern, replacement) rules
+    :return: A program, a list of (func, arg, kind, guard) steps. Every
+        step is run as func(arg, name) and returns a (name, count) tuple.
+
+    Every rule is compiled once, behind the guard written next to it.
+    Consecutive rules that replace single characters without any context
+    are fused into one translation, so the name is scanned once for all of
+    them. Applying such rules one after the other is the same as mapping
+    every character through all of them in turn.
+    """
+    program = []
+    i = 0
+    while i < len(rules):
+        mapping = {}
+        while i < len(rules):
+            pattern, replacement = rules[i][:2]
+            match = _CHAR_RULE.match(pattern)
+            if not match or not _CHAR_REPLACEMENT.match(replacement):
+                break
+            chars = match.group(1) or match.group(2)
+            for char in mapping:
+                if mapping[char] and mapping[char] in chars:
+                    mapping[char] = replacement
+            for char in chars:
+                mapping.setdefault(char, replacement)
+            i += 1
+
+        if mapping:
+            table = [chr(code) for code in range(256)]
+            for char, replacement in mapping.iteritems():
+                if replacement:
+                    table[ord(char)] = replacement
+            tables = (dict((ord(char), unicode(replacement) or None)
+                           for char, replacement in mapping.iteritems()),
+                      ''.join(table),
+                      ''.join(char for char in mapping if not mapping[char]))
+            if len(mapping) == 1:
+                guard = _CONTAINS, mapping.keys()[0]
+            else:
+                guard = _ANY_OF, frozenset(mapping)
+            program.append((_translate, tables) + guard)
+            continue
+
+        pattern, replacement = rules[i][:2]
+        program.append((re.compile(pattern).subn, replacement) +
+                       _rule_guard(rules[i]))
+        i += 1
+
+    return program
+
+
+def _rule_program(name):
+    """
+    :param name: The name of a rule table in _PHONETIC_RULES
+    :return: The compiled program for the table, see :func:`_compile_rules`
+    """
+    program = _rule_programs.get(name)
+    if program is None:
+        program = _rule_programs[name] = \
+            _compile_rules(_PHONETIC_RULES[name])
+    return program
+
+
+def _run_rules(name, code):
+    """
+    :param name: The name of a rule table in _PHONETIC_RULES
+    :param code: The string to apply the rules to
+    :return: *code* with all rules applied
+    """
+    present = None
+    for func, arg, kind, guard in _rule_program(name):
+        if kind == _CONTAINS:
+            if guard not in code:
+                continue
+        elif kind == _STARTS:
+            if not code.startswith(guard):
+                continue
+        elif kind == _ENDS:
+            if not code.endswith(guard):
+                continue
+        elif kind != _ALWAYS:
+            if present is None:
+                present = set(code)
+            if kind == _ANY_OF:
+                if present.isdisjoint(guard):
+                    continue
+            elif present <= guard:
+                continue
+
+        code, count = func(arg, code)
+        if count:
+            present = None
+    return code
+
+
 def soundex(name):
     """
     :param name: The name to be encoded
@@ -384,7 +1978,10 @@ def soundex(name):
     name = re.sub(r'[^A-Z]+', '', name)
     name = re.sub(r'(?!^)[AEHIOUWY]', '', name)
 
-    code = name[0]
+    try:
+        code = name[0]
+    except IndexError:
+        raise ValueError("String is not encodable")
 
     digits = [digit[char] for char in name[1:]]
 
@@ -432,55 +2029,14 @@ def nysiis(name, truncate=True):
     if not isinstance(name, (str, unicode)):
         raise ValueError("Name must be sting or unicode")
 
-    vowels = ["A", "E", "I", "U", "O"]
-
-    name = name.upper().strip()
-
-    pre = [
-        (r'\s+JR\.?\s{0,}', ''),
-        (r'\s+SR\.?\s{0,}', ''),
-        (r'\s+[IVXMC]+\.?\s{0,}', ''),
-        (r'[^A-Z]+', ''),
-        (r'^MAC', 'MCC'),
-        (r'^KN', 'NN'),
-        (r'K', 'C'),
-        (r'^P[HF]', 'FF'),
-        (r'^SCH', 'SSS'),
-        (r'[EI]E$', 'Y'),
-        (r'[DRN]T$', 'D'),
-        (r'[RN]D$', 'D')
-    ]
-
-    post = [
-        (r'EV', 'AF'),
-        (r'[AEIOU]', 'A'),
-        (r'Q', 'G'),
-        (r'Z', 'S'),
-        (r'M', 'N'),
-        (r'KN', 'N'),
-        (r'K', 'C'),
-        (r'SCH', 'SSS'),
-        (r'PH', 'FF'),
-        (r'([^%s])H' % ''.join(vowels), r'\1'),
-        (r'(.)H[^%s]' % ''.join(vowels), r'\1'),
-        (r'[%s]W' % ''.join(vowels), 'A'),
-        (r'S$', ''),
-        (r'AY$', 'Y'),
-        (r'A+$', '')
-    ]
-
-    for reg, sub in pre:
-        name = re.sub(reg, sub, name)
+    name = _run_rules('nysiis_pre', name.upper().strip())
 
     try:
         code = name[0]
     except IndexError:
         raise ValueError("String is not encodable")
 
-    name = name[1:]
-
-    for reg, sub in post:
-        name = re.sub(reg, sub, name)
+    name = _run_rules('nysiis_post', name[1:])
 
     #remove all adjacent duplicates
     code += ''.join([key for key, _ in itertools.groupby(name)])
@@ -523,51 +2079,7 @@ def metaphone(name, length=4):
     if not isinstance(name, (str, unicode)):
         raise ValueError("Name must be string or unicode")
 
-    vowels = ["A", "E", "I", "O", "U"]
-
-    rules = [
-        (r'[^A-Z]+', ''),
-        (r'([ABCDEFHIJKLMNOPQRSTUVXYZ])\1+', r'\1'),
-        (r'^AE', 'E'),
-        (r'^[GKP]N', 'N'),
-        (r'^WR', 'R'),
-        (r'^X', 'S'),
-        (r'^WH', 'W'),
-        (r'MB$', 'M'),
-        (r'X', 'KS'),
-        (r'(?!^)C(IA|H)', 'X'),
-        (r'(?!^)C(?=[IEY])', 'S'),
-        (r'(?<=\SS)C(?=[IEY])', 'S'),
-        (r'C', 'K'),
-        (r'(?!^)D(?=G([IEY]\S+))', 'J'),
-        (r'D', 'T'),
-        (r'(?!^)G(?=H[^%s])' % ''.join(vowels), ''),
-        (r'(?!^)GN(?:ED)?$', ''),
-        (r'(?<=\SD)G(?=[IEY]\S+)', ''),
-        (r'^G(?=[IEY])', 'J'),
-        (r'(?<!G)G(?=[IEY])', 'J'),
-        (r'G', 'K'),
-        (r'(?<=[%s])H(?=\b|[^%s])' % (''.join(vowels), ''.join(vowels)), ''),
-        (r'(?<=\S[CSPTG]H)H(?=\S+)', ''),
-        (r'(?<=C)K', ''),
-        (r'P(?=H)', 'F'),
-        (r'Q', 'K'),
-        (r'SH', 'X'),
-        (r'(?!^)S(?=I[OA]\S+)', 'X'),
-        (r'(?!^)T(?=I[OA]\S+)', 'X'),
-        (r'TH', '0'),
-        (r'(?!^)T(?=CH\S+)', ''),
-        (r'V', 'F'),
-        (r'W(?=[^%s])' % ''.join(vowels), ''),
-        (r'Y(?=\b|[^%s])' % ''.join(vowels), ''),
-        (r'Z', 'S'),
-        (r'(?!^)[%s]+' % ''.join(vowels), ''),
-    ]
-
-    name = name.upper().strip()
-
-    for rule in rules:
-        name = re.sub(rule[0], rule[1], name)
+    name = _run_rules('metaphone', name.upper().strip())
 
     if len(name) > length:
         return name[:length]
@@ -605,40 +2117,171 @@ def cologne_phonetic(name):
     if not isinstance(name, (str, unicode)):
         raise ValueError("Name must be string or unicode")
 
+    # unicodedata only accepts unicode, byte strings are taken to be UTF-8
+    if isinstance(name, str):
+        name = name.decode('utf-8', 'replace')
+
     # note: this will convert 'ß' to 'SS'
     name = name.upper().strip()
     # replace umlauts, accents, etc with ascii letters - removes œ and æ, greek and cyrillic letters etc.
     name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
 
-    rules = [
-        (r'[^A-Z]+', ''),
-        (r'P(?!H)', '1'),
-        (r'[DT](?![CSZ])', '2'),
-        (r'P(?=H)', '3'),
-        (r'(?<=^)C(?=[AHKLOQRUX])', '4'),
-        (r'(?<![SZ])C(?=[AHKOQUX])', '4'),
-        (r'(<![CKQ])X', '48'),
-        (r'(?<=[SZ])C', '8'),
-        (r'(?<=^)C(?![AHKLOQRUX])', '8'),
-        (r'C(?![AHKOQUX])', '8'),
-        (r'[DT](?=[CSZ])', ''),
-        (r'(?<=[CKQ])X', ''),
-        (r'[FVW]', '3'),
-        (r'H', ''),
-        (r'B', '1'),
-        (r'[GKQ]', '4'),
-        (r'[SZ]', '8'),
-        (r'R', '7'),
-        (r'L', '5'),
-        (r'[MN]', '6'),
-        (r'[AEIJOUY]+', '0'),
-        #remove duplicates
-        (r'(\d)\1+', r'\1'),
-        #Remove all 0
-        (r'0+', ''),
-        ]
+    return _run_rules('cologne_phonetic', name)
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that discards the least recently used entry when it
+    is full, and counts its hits and misses. Used by :func:`encode_many` to
+    memoize phonetic codes.
+    """
+
+    def __init__(self, maxsize=4096):
+        """
+        :param maxsize: The maximum number of entries to keep
+        :type maxsize: int
+        :raise: ValueError
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be 1 or greater")
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        # Circular doubly linked list of [prev, next, key, value] links,
+        # from the least to the most recently used entry
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        return 'LRUCache(maxsize=%d, size=%d, hits=%d, misses=%d)' % (
+            self.maxsize, len(self._entries), self.hits, self.misses)
+
+    def get(self, key, default=None):
+        """
+        :return: The value for *key*, or *default* if it is not cached.
+            Looking up a key marks it as the most recently used one.
+        """
+        link = self._entries.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        prev, next_ = link[0], link[1]
+        prev[1] = next_
+        next_[0] = prev
+        last = self._root[0]
+        last[1] = self._root[0] = link
+        link[0] = last
+        link[1] = self._root
+        return link[3]
+
+    def put(self, key, value):
+        """
+        Stores *value* for *key*, discarding the least recently used entry
+        if the cache is full.
+        """
+        link = self._entries.get(key)
+        if link is not None:
+            link[3] = value
+            return
+
+        if len(self._entries) >= self.maxsize:
+            oldest = self._root[1]
+            self._root[1] = oldest[1]
+            oldest[1][0] = self._root
+            del self._entries[oldest[2]]
+
+        last = self._root[0]
+        link = [last, self._root, key, value]
+        last[1] = self._root[0] = self._entries[key] = link
+
+    def clear(self):
+        """
+        Removes all entries and resets the statistics.
+        """
+        self._entries.clear()
+        self._root[:] = [self._root, self._root, None, None]
+        self.hits = self.misses = 0
+
+
+def encode_many(encoder, names, cache=None, cache_size=4096, errors=None,
+                **kwargs):
+    """
+    :param encoder: The name of a phonetic encoder in :data:`__all__`, or
+        the function itself.
+    :param names: An iterable of names to encode
+    :param cache: An :class:`LRUCache` to memoize the codes in, or None to
+        use a new cache of *cache_size* entries. Passing a cache allows
+        inspecting its statistics, and sharing it between calls.
+    :param cache_size: The size of the cache created when *cache* is None
+    :type cache_size: int
+    :param errors: A function called with a name that can not be encoded
+        and the ValueError raised by *encoder*, returning the value to
+        yield in place of the code, or None to raise the ValueError.
+    :param kwargs: Additional arguments passed on to *encoder*
+    :return: An iterator over the code of each name
+    :raise: ValueError
 
-    for rule in rules:
-        name = re.sub(rule[0], rule[1], name)
+    Encodes a stream of names lazily. Columns of real names repeat the
+    same values over and over, so the codes are memoized in a least
+    recently used cache and every distinct name is normally encoded only
+    once. Passing *errors*, e.g. ``lambda name, error: None``, keeps one
+    bad row from stopping the batch.
+    """
+
+    func = _get_encoder(encoder)
+    if cache is None:
+        cache = LRUCache(cache_size)
+    options = tuple(sorted(kwargs.items()))
+
+    return _encode_many(func, names, cache, errors, options, kwargs)
+
+
+class _EncodeError(object):
+    """
+    The ValueError raised when encoding a name, as stored in the cache.
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
 
-    return name
+
+def _encode_many(func, names, cache, errors, options, kwargs):
+    """
+    The generator behind :func:`encode_many`, kept apart so that the
+    arguments are checked when it is called rather than on first use.
+    """
+    missing = object()
+    for name in names:
+        # The type is part of the key, as 'abc' and u'abc' are equal but
+        # may be encoded differently
+        try:
+            key = (func, options, type(name), name)
+            code = cache.get(key, missing)
+        except TypeError:
+            key = code = missing
+
+        if code is missing:
+            try:
+                code = func(name, **kwargs)
+            except ValueError, e:
+                code = _EncodeError(e)
+            if key is not missing:
+                cache.put(key, code)
+
+        if isinstance(code, _EncodeError):
+            if errors is None:
+                raise code.error
+            code = errors(name, code.error)
+        yield code
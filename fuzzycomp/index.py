@@ -0,0 +1,1234 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Björn Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from exceptions import ImportError, ValueError
+from array import array
+from binascii import hexlify
+from itertools import combinations
+from math import ceil
+import heapq
+
+from fuzzycomp import levenshtein_distance, jaccard_distance, \
+    dice_coefficient, tversky_index, prepare, np, _get_metric, \
+    _get_encoder, _levenshtein_step, _elements, _grams, _gram_set
+from dedupe import _DISTANCES
+
+__all__ = ["BKTree", "Trie", "DeletionIndex", "PhoneticIndex", "NGramIndex",
+           "MinHashLSH", "MultiIndexHash"]
+
+
+class BKTree(object):
+    """
+    A `Burkhard-Keller tree <http://en.wikipedia.org/wiki/BK-tree>`__ for
+    finding the objects close to a term under a metric, such as
+    :func:`~fuzzycomp.levenshtein_distance`,
+    :func:`~fuzzycomp.hamming_distance` or
+    :func:`~fuzzycomp.jaccard_distance`.
+
+    Every node keeps its children keyed by their distance to the node. By
+    the triangle inequality, a query only has to descend into the children
+    whose key is within the search radius of the distance between the
+    query and the node, which leaves most of the tree unvisited.
+
+    The pruning is only correct for a true distance, so the metric must be
+    one of the distance functions of :mod:`fuzzycomp`; similarities such
+    as :func:`~fuzzycomp.jaro_winkler` are rejected.
+
+    The nodes are stored in flat lists rather than nested objects, so a
+    built tree can be pickled and loaded without deep recursion. The
+    metric is pickled along with the tree and must therefore be a module
+    level function.
+    """
+
+    def __init__(self, items=(), metric=levenshtein_distance):
+        """
+        :param items: An iterable of objects to add to the tree
+        :param metric: The name of a distance function in
+            :data:`fuzzycomp.__all__`, or the function itself.
+        :raise: ValueError
+        """
+        self.metric = _get_metric(metric)
+        if self.metric not in _DISTANCES:
+            raise ValueError("%s is not a distance metric"
+                             % self.metric.__name__)
+        self._items = []
+        self._children = []
+
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __repr__(self):
+        return 'BKTree(%d items, %s)' % (len(self._items),
+                                         self.metric.__name__)
+
+    def add(self, item):
+        """
+        :param item: The object to add
+        :return: True if *item* was added, False if the tree already holds
+            an object at distance 0 from it.
+        """
+        if not self._items:
+            self._items.append(item)
+            self._children.append({})
+            return True
+
+        node = 0
+        while True:
+            distance = self.metric(item, self._items[node])
+            if distance == 0:
+                return False
+
+            child = self._children[node].get(distance)
+            if child is None:
+                self._children[node][distance] = len(self._items)
+                self._items.append(item)
+                self._children.append({})
+                return True
+            node = child
+
+    def query(self, term, max_distance):
+        """
+        :param term: The object to search for
+        :param max_distance: The largest distance to include
+        :return: A list of *(item, distance)* tuples for all objects within
+            *max_distance* of *term*, sorted by distance.
+        :raise: ValueError
+        """
+        if max_distance < 0:
+            raise ValueError("max_distance must be 0 or greater")
+
+        results = []
+        stack = self._items and [0] or []
+        while stack:
+            node = stack.pop()
+            distance = self.metric(term, self._items[node])
+            if distance <= max_distance:
+                results.append((self._items[node], distance))
+
+            # Integer distances let a node with many children look up the
+            # keys in range instead of checking every child
+            children = self._children[node]
+            if len(children) <= 2 * max_distance + 1 or \
+               not isinstance(distance, (int, long)) or \
+               not isinstance(max_distance, (int, long)):
+                stack.extend(child for key, child in children.iteritems()
+                             if abs(key - distance) <= max_distance)
+            else:
+                for key in range(max(1, distance - max_distance),
+                                 distance + max_distance + 1):
+                    if key in children:
+                        stack.append(children[key])
+
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def nearest(self, term, k=1):
+        """
+        :param term: The object to search for
+        :param k: The number of objects to return
+        :type k: int
+        :return: A list of at most *k* *(item, distance)* tuples for the
+            objects closest to *term*, sorted by distance.
+        :raise: ValueError
+
+        The nodes are visited best first, ordered by the lower bound on
+        their distance to *term* given by the triangle inequality, and the
+        search stops when no remaining node can beat the current k-th
+        result.
+        """
+        if k < 1:
+            raise ValueError("k must be 1 or greater")
+
+        best = []
+        queue = self._items and [(0, 0)] or []
+        while queue:
+            bound, node = heapq.heappop(queue)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+
+            distance = self.metric(term, self._items[node])
+            if len(best) < k:
+                heapq.heappush(best, (-distance, node))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, node))
+
+            for key, child in self._children[node].iteritems():
+                bound = abs(key - distance)
+                if len(best) < k or bound < -best[0][0]:
+                    heapq.heappush(queue, (bound, child))
+
+        best.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [(self._items[node], -distance) for distance, node in best]
+
+
+class Trie(object):
+    """
+    A prefix tree of words supporting searches for every word within a
+    Levenshtein distance of a term.
+
+    The search walks the tree depth first while carrying one row of the
+    Levenshtein table per node, the row for the prefix spelled by the path
+    to the node. Words sharing a prefix therefore share the rows calculated
+    for it, and a branch is abandoned as soon as the smallest value in its
+    row is larger than the search radius, since no extension of the prefix
+    can come closer.
+
+    Words can be strings or any other sequences of hashable elements.
+    """
+
+    def __init__(self, words=()):
+        """
+        :param words: An iterable of words to add to the trie
+        :raise: ValueError
+        """
+        # Every node is a list of [word, children], where word is None for
+        # nodes that do not end a word
+        self._root = [None, {}]
+        self._size = 0
+
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word):
+        node = self._root
+        for item in word:
+            node = node[1].get(item)
+            if node is None:
+                return False
+        return node[0] is not None
+
+    def __iter__(self):
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node[0] is not None:
+                yield node[0]
+            stack.extend(node[1].itervalues())
+
+    def __repr__(self):
+        return 'Trie(%d words)' % self._size
+
+    def add(self, word):
+        """
+        :param word: The word to add
+        :return: True if *word* was added, False if it was already present.
+        :raise: ValueError
+        """
+        if not word:
+            raise ValueError("Input cannot be empty")
+
+        node = self._root
+        for item in word:
+            node = node[1].setdefault(item, [None, {}])
+        if node[0] is not None:
+            return False
+
+        node[0] = word
+        self._size += 1
+        return True
+
+    def search(self, term, max_distance):
+        """
+        :param term: The word to search for
+        :param max_distance: The largest Levenshtein distance to include
+        :type max_distance: int
+        :return: A list of *(word, distance)* tuples for all words within
+            *max_distance* of *term*, sorted by distance.
+        :raise: ValueError
+        """
+        if not term:
+            raise ValueError("Input cannot be empty")
+        if max_distance < 0:
+            raise ValueError("max_distance must be 0 or greater")
+
+        results = []
+        stack = [(self._root, list(range(len(term) + 1)))]
+        while stack:
+            node, previous = stack.pop()
+            for item, child in node[1].iteritems():
+                row = [0] * len(previous)
+                _levenshtein_step(previous, row, item, term)
+
+                if child[0] is not None and row[-1] <= max_distance:
+                    results.append((child[0], row[-1]))
+                if child[1] and min(row) <= max_distance:
+                    stack.append((child, row))
+
+        results.sort(key=lambda result: result[1])
+        return results
+
+
+def _deletes(word, max_distance):
+    """
+    :param word: The word to generate the variants for
+    :param max_distance: The maximum number of deletions
+    :return: The set of all variants of *word* with up to *max_distance*
+        elements deleted, including *word* itself.
+    """
+    variants = set([word])
+    level = variants
+    for _ in range(max_distance):
+        level = set(variant[:i] + variant[i + 1:]
+                    for variant in level for i in range(len(variant)))
+        variants |= level
+    return variants
+
+
+class DeletionIndex(object):
+    """
+    A symmetric deletion index, as used by `SymSpell
+    <https://github.com/wolfgarbe/symspell>`__, for finding all words within
+    a small Levenshtein distance of a term.
+
+    Every variant of every word with up to *max_distance* elements deleted
+    is stored in a hash table. If two words are within Levenshtein distance
+    k of each other, deleting at most k elements from each of them gives a
+    common variant, so looking up the deletion variants of a term finds
+    every candidate with a few hash probes. The candidates are then checked
+    with :func:`~fuzzycomp.levenshtein_distance`, so the results are exact.
+
+    The number of variants grows quickly with *max_distance*, which should
+    therefore be kept at 1 or 2. Words must be strings or tuples.
+
+    The index can be pickled. The variant table is then packed into flat
+    arrays of word ids, which are much smaller than the dict of lists kept
+    in memory.
+    """
+
+    def __init__(self, words=(), max_distance=2):
+        """
+        :param words: An iterable of words to index
+        :param max_distance: The largest distance supported by queries
+        :type max_distance: int
+        :raise: ValueError
+        """
+        if max_distance < 0:
+            raise ValueError("max_distance must be 0 or greater")
+
+        self.max_distance = max_distance
+        self._words = []
+        self._ids = {}
+        self._variants = {}
+
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __iter__(self):
+        return iter(self._words)
+
+    def __contains__(self, word):
+        return word in self._ids
+
+    def __repr__(self):
+        return 'DeletionIndex(%d words, %d variants)' % (len(self._words),
+                                                        len(self._variants))
+
+    def __getstate__(self):
+        keys = list(self._variants)
+        offsets = array('l', [0])
+        ids = array('l')
+        for key in keys:
+            ids.extend(self._variants[key])
+            offsets.append(len(ids))
+        return (self.max_distance, self._words, keys,
+                offsets.tostring(), ids.tostring())
+
+    def __setstate__(self, state):
+        self.max_distance, self._words, keys, offsets, ids = state
+        offsets = array('l', offsets)
+        ids = array('l', ids)
+
+        self._ids = dict((word, i) for i, word in enumerate(self._words))
+        self._variants = dict((key, ids[offsets[i]:offsets[i + 1]].tolist())
+                              for i, key in enumerate(keys))
+
+    def add(self, word):
+        """
+        :param word: The word to add
+        :return: True if *word* was added, False if it was already present.
+        :raise: ValueError
+        """
+        if not word:
+            raise ValueError("Input cannot be empty")
+        if word in self._ids:
+            return False
+
+        self._ids[word] = len(self._words)
+        for variant in _deletes(word, self.max_distance):
+            self._variants.setdefault(variant, []).append(len(self._words))
+        self._words.append(word)
+        return True
+
+    def query(self, term, max_distance=None):
+        """
+        :param term: The word to search for
+        :param max_distance: The largest distance to include, at most the
+            *max_distance* of the index. Defaults to that of the index.
+        :type max_distance: int
+        :return: A list of *(word, distance)* tuples for all words within
+            *max_distance* of *term*, sorted by distance.
+        :raise: ValueError
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        if not 0 <= max_distance <= self.max_distance:
+            raise ValueError("max_distance must be between 0 and %d"
+                             % self.max_distance)
+        if not term:
+            raise ValueError("Input cannot be empty")
+
+        candidates = set()
+        for variant in _deletes(term, max_distance):
+            candidates.update(self._variants.get(variant, ()))
+
+        results = []
+        for i in candidates:
+            word = self._words[i]
+            if abs(len(word) - len(term)) > max_distance:
+                continue
+            distance = levenshtein_distance(term, word, max_distance)
+            if distance <= max_distance:
+                results.append((word, distance))
+
+        results.sort(key=lambda result: result[1])
+        return results
+
+
+class PhoneticIndex(object):
+    """
+    A blocking index grouping records by the phonetic codes of their names,
+    to limit record linkage to the records that sound alike.
+
+    Every record is encoded with each of the given encoders, and the ids of
+    the records, their positions in the input, are collected per code in
+    compact arrays. Codes from different encoders are kept apart, so a
+    record matches a name if any of the encoders gives them the same code.
+
+    Names that none of the encoders can encode, either by raising
+    ValueError or by returning an empty code, do not abort the build. Their
+    records are collected in :attr:`unencodable` instead.
+    """
+
+    def __init__(self, records, encoders=("soundex",), key=None):
+        """
+        :param records: An iterable of records to index
+        :param encoders: The names of phonetic encoders in
+            :data:`fuzzycomp.__all__`, or the functions themselves.
+        :param key: A function returning the name of a record, or None if
+            the records are the names themselves.
+        :raise: ValueError
+        """
+        if not encoders:
+            raise ValueError("At least one encoder is required")
+
+        self.encoders = [_get_encoder(encoder) for encoder in encoders]
+        self.key = key
+        self.size = 0
+
+        blocks = {}
+        unencodable = []
+        for record in records:
+            found = False
+            for code in self._codes(record if key is None else key(record)):
+                blocks.setdefault(code, []).append(self.size)
+                found = True
+            if not found:
+                unencodable.append(self.size)
+            self.size += 1
+
+        self._blocks = dict((code, array('l', ids))
+                            for code, ids in blocks.iteritems())
+        #: The ids of the records whose names could not be encoded
+        self.unencodable = array('l', unencodable)
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return 'PhoneticIndex(%d records, %d blocks)' % (self.size,
+                                                         len(self._blocks))
+
+    def _codes(self, name):
+        """
+        :return: A list of (encoder number, code) keys for *name*
+        """
+        codes = []
+        for i, encoder in enumerate(self.encoders):
+            try:
+                code = encoder(name)
+            except ValueError:
+                continue
+            if code:
+                codes.append((i, code))
+        return codes
+
+    def blocks(self):
+        """
+        :return: An iterator over the arrays of record ids sharing a code.
+            A record appears in one block per encoder that could encode it.
+        """
+        return self._blocks.itervalues()
+
+    def candidates(self, name):
+        """
+        :param name: The name to find the candidates for
+        :return: A sorted list of the ids of all records sharing a phonetic
+            code with *name*, under any of the encoders.
+        """
+        ids = set()
+        for code in self._codes(name):
+            ids.update(self._blocks.get(code, ()))
+        return sorted(ids)
+
+
+# Slack for the overlap bounds, so that rounding never prunes a pair that
+# the metric itself would accept.
+_EPSILON = 1e-9
+
+
+class NGramIndex(object):
+    """
+    An inverted index over the bigrams of strings, or the elements of other
+    sequences, for finding all objects whose :func:`~fuzzycomp.
+    dice_coefficient`, :func:`~fuzzycomp.tversky_index` or
+    :func:`~fuzzycomp.jaccard_distance` passes a threshold fixed when the
+    index is built.
+
+    The metrics only depend on the size of the overlap of two token sets,
+    so the threshold gives the smallest overlap a match can have. Ordering
+    the tokens of every object the same way, from rare to common, two
+    objects sharing *o* tokens must share one among their first
+    ``size - o + 1`` tokens. Only those prefixes are indexed and probed,
+    which is the prefix filter of AllPairs. Candidates whose sizes cannot
+    reach the overlap are skipped, and so are those that can no longer
+    reach it given the positions of the tokens seen so far, as in PPJoin.
+    The remaining candidates are checked with the metric itself, so the
+    results are exact.
+
+    The frequencies that order the tokens are taken from the objects given
+    to the constructor. Objects added later are indexed with the same
+    order, which stays correct but filters less well if their tokens are
+    distributed differently.
+
+    For :func:`~fuzzycomp.jaccard_distance` the threshold is the largest
+    distance to report. For the other metrics it is the smallest score.
+    """
+
+    def __init__(self, items=(), metric="dice_coefficient", threshold=0.8,
+                 alpha=0.5, beta=0.5):
+        """
+        :param items: An iterable of objects to index
+        :param metric: The name of the metric, one of ``dice_coefficient``,
+            ``jaccard_distance`` and ``tversky_index``, or the function.
+        :param threshold: The threshold supported by queries
+        :type threshold: float
+        :param alpha: The *alpha* of :func:`~fuzzycomp.tversky_index`
+        :param beta: The *beta* of :func:`~fuzzycomp.tversky_index`
+        :raise: ValueError
+        """
+        self.metric = _get_metric(metric)
+        if self.metric not in (dice_coefficient, jaccard_distance,
+                               tversky_index):
+            raise ValueError("Unsupported metric %r" % (metric,))
+        if self.metric is tversky_index and (alpha <= 0 or beta <= 0):
+            raise ValueError("Alpha and Beta must be greater than 0")
+
+        self.alpha = alpha
+        self.beta = beta
+        self.threshold = threshold
+        self._similarity = self._check_threshold(threshold)
+
+        self._items = []
+        self._sets = []
+        self._lengths = []
+        self._postings = {}
+
+        items = [prepare(item) for item in items]
+        self._frequencies = {}
+        for item in items:
+            for token in self._token_set(item):
+                self._frequencies[token] = \
+                    self._frequencies.get(token, 0) + 1
+
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return (item.value for item in self._items)
+
+    def __repr__(self):
+        return 'NGramIndex(%d items, %d tokens)' % (len(self._items),
+                                                   len(self._postings))
+
+    def _check_threshold(self, threshold):
+        """
+        :return: The similarity in (0, 1] that *threshold* corresponds to
+        :raise: ValueError
+        """
+        if self.metric is jaccard_distance:
+            similarity = 1.0 - threshold
+        else:
+            similarity = float(threshold)
+        if not 0 < similarity <= 1:
+            raise ValueError("Threshold %r would match everything or nothing"
+                             % (threshold,))
+        return similarity
+
+    def _token_set(self, item):
+        """
+        :return: The set of tokens *item* is compared by
+        """
+        if self.metric is jaccard_distance:
+            return _elements(item)
+        return _gram_set(item)
+
+    def _length(self, item):
+        """
+        :return: The length the metric divides by, which for the Dice
+            coefficient counts repeated bigrams
+        """
+        if self.metric is dice_coefficient:
+            return len(_grams(item))
+        return len(self._token_set(item))
+
+    def _sort(self, tokens):
+        """
+        :return: A list of *tokens*, from rare to common
+        """
+        frequencies = self._frequencies
+        return sorted(tokens,
+                      key=lambda token: (frequencies.get(token, 0), token))
+
+    def _min_overlap(self, size, length, similarity):
+        """
+        :return: The smallest overlap an object of *size* tokens, and the
+            given length, can have with any match
+        """
+        t = similarity
+        if self.metric is jaccard_distance:
+            bound = t * size
+        elif self.metric is dice_coefficient:
+            bound = t * length / (2 - t)
+        else:
+            scale = min(self.alpha, self.beta)
+            bound = t * scale * size / (1 - t + t * scale)
+        return max(1, int(ceil(bound - _EPSILON)))
+
+    def _overlap(self, lhs, rhs, similarity):
+        """
+        :param lhs: The (size, length) of the first object
+        :param rhs: The (size, length) of the second object
+        :return: The smallest overlap the two objects need to match
+        """
+        t = similarity
+        if self.metric is jaccard_distance:
+            bound = t / (1 + t) * (lhs[0] + rhs[0])
+        elif self.metric is dice_coefficient:
+            bound = t * (lhs[1] + rhs[1]) / 2.0
+        else:
+            bound = t * (self.alpha * lhs[0] + self.beta * rhs[0]) / \
+                    (1 - t + t * self.alpha + t * self.beta)
+        return max(1, int(ceil(bound - _EPSILON)))
+
+    def _score(self, lhs, rhs):
+        """
+        :return: The result of the metric for *lhs* and *rhs*
+        """
+        if self.metric is tversky_index:
+            return tversky_index(lhs, rhs, self.alpha, self.beta)
+        return self.metric(lhs, rhs)
+
+    def add(self, item):
+        """
+        :param item: The object to add
+        :return: The id of the object, its position in the index
+        :raise: ValueError
+        """
+        item = prepare(item)
+        token_set = self._token_set(item)
+        tokens = self._sort(token_set)
+        length = self._length(item)
+        index = len(self._items)
+
+        prefix = len(tokens) - \
+            self._min_overlap(len(tokens), length, self._similarity) + 1
+        for position in range(max(prefix, 0)):
+            self._postings.setdefault(tokens[position],
+                                      array('l')).extend((index, position))
+
+        self._items.append(item)
+        self._sets.append(token_set)
+        self._lengths.append(length)
+        return index
+
+    def _candidates(self, token_set, length, similarity, limit,
+                    query_first):
+        """
+        :param token_set: The tokens of the object to match
+        :param length: The length of the object to match
+        :param similarity: The similarity to pass
+        :param limit: Only consider objects with a smaller id than this
+        :param query_first: True if the object to match is the first
+            argument of the metric
+        :return: The ids of the objects sharing enough tokens with the
+            object to match, in increasing order
+        """
+        tokens = self._sort(token_set)
+        size = len(tokens)
+        prefix = size - self._min_overlap(size, length, similarity) + 1
+        counts = {}
+        needs = {}
+        sizes = {}
+        sets = self._sets
+
+        for i in range(max(prefix, 0)):
+            postings = self._postings.get(tokens[i])
+            if postings is None:
+                continue
+            left = size - i - 1
+            for k in range(0, len(postings), 2):
+                index = postings[k]
+                if index >= limit:
+                    break
+                count = counts.get(index, 0)
+                if count < 0:
+                    continue
+
+                other = len(sets[index])
+                if count == 0:
+                    key = other, self._lengths[index]
+                    need = sizes.get(key)
+                    if need is None:
+                        if query_first:
+                            need = self._overlap((size, length), key,
+                                                 similarity)
+                        else:
+                            need = self._overlap(key, (size, length),
+                                                 similarity)
+                        sizes[key] = need
+                    needs[index] = need
+                else:
+                    need = needs[index]
+
+                # Only the tokens after this one can still be shared
+                rest = other - postings[k + 1] - 1
+                if count + 1 + (left if left < rest else rest) < need:
+                    counts[index] = -1
+                else:
+                    counts[index] = count + 1
+
+        return [index for index in sorted(counts)
+                if counts[index] > 0 and
+                len(token_set & sets[index]) >= needs[index]]
+
+    def query(self, item, threshold=None):
+        """
+        :param item: The object to search for
+        :param threshold: The threshold to apply, which can only be stricter
+            than that of the index. Defaults to that of the index.
+        :return: A list of *(object, result)* tuples for all indexed objects
+            passing the threshold, where *result* is the metric with *item*
+            as its first argument. The list is sorted from the best match.
+        :raise: ValueError
+        """
+        if threshold is None:
+            threshold = self.threshold
+        similarity = self._check_threshold(threshold)
+        if similarity < self._similarity - _EPSILON:
+            raise ValueError("threshold cannot be looser than that of the "
+                             "index")
+
+        item = prepare(item)
+        results = []
+        for index in self._candidates(self._token_set(item),
+                                      self._length(item), similarity,
+                                      len(self._items), True):
+            other = self._items[index]
+            score = self._score(item, other)
+            if self._passes(score, threshold):
+                results.append((other.value, score))
+
+        results.sort(key=lambda result: result[1],
+                     reverse=self.metric is not jaccard_distance)
+        return results
+
+    def self_join(self):
+        """
+        :return: An iterator over *(i, j, result)* tuples for every pair of
+            indexed objects passing the threshold, where *i* < *j* are the
+            ids of the objects and *result* is the metric with object *i* as
+            its first argument. The pairs are generated in order of *j*.
+        """
+        for j, item in enumerate(self._items):
+            for i in self._candidates(self._sets[j], self._lengths[j],
+                                      self._similarity, j, False):
+                score = self._score(self._items[i], item)
+                if self._passes(score, self.threshold):
+                    yield i, j, score
+
+    def _passes(self, score, threshold):
+        """
+        :return: True if the result of the metric passes *threshold*
+        """
+        if self.metric is jaccard_distance:
+            return score <= threshold
+        return score >= threshold
+
+
+# The largest prime below 2 ** 32. The hash functions of MinHashLSH work
+# modulo this prime on 32 bit values, so their products fit in 64 bits.
+_PRIME = 4294967291
+
+# The largest number of hash values MinHashLSH calculates at once
+_MINHASH_CELLS = 1 << 20
+
+
+def _lsh_recall(similarity, bands, rows):
+    """
+    :return: The probability that a pair with the given Jaccard similarity
+        shares a bucket in one of *bands* bands of *rows* rows
+    """
+    return 1 - (1 - similarity ** rows) ** bands
+
+
+def _lsh_bands(num_perm, similarity, recall):
+    """
+    :return: The fewest bands for which a pair with the given Jaccard
+        similarity shares a bucket with probability *recall* or more, with
+        the *num_perm* // *bands* rows per band that MinHashLSH uses
+    :raise: ValueError if no number of bands reaches *recall*
+    """
+    # Fewer bands mean more rows per band, and so a lower recall
+    for bands in range(1, num_perm + 1):
+        if _lsh_recall(similarity, bands, num_perm // bands) >= recall:
+            return bands
+    raise ValueError("recall can not be reached with %d hash functions, "
+                     "use more or give the number of bands" % num_perm)
+
+
+class MinHashLSH(object):
+    """
+    An approximate index for finding the objects within a
+    :func:`~fuzzycomp.jaccard_distance` of each other, using `MinHash
+    <http://en.wikipedia.org/wiki/MinHash>`__ signatures and locality
+    sensitive hashing. Requires `NumPy <http://numpy.scipy.org/>`__.
+
+    Every object is reduced to the minimum values of *num_perm* random hash
+    functions over its set of elements. Two signatures agree at any
+    position with a probability equal to the Jaccard similarity of the
+    objects. The signatures are cut into bands of several rows, and objects
+    sharing all rows of any band are candidates. The candidates are then
+    checked with :func:`~fuzzycomp.jaccard_distance`, so the results hold
+    no false positives, but a match is missed when it shares no band.
+
+    Unless the number of bands is given, it is chosen so that a pair just
+    at the threshold becomes a candidate with probability *recall*, with
+    as many rows per band as possible to keep the number of candidates
+    low. A higher *recall* finds more matches and checks more candidates.
+
+    The signatures are calculated with NumPy for many objects at once, so
+    building the index from a list is much faster than adding the objects
+    one by one. Elements are hashed with :func:`hash`, so strings should
+    be shingled into tuples of n-grams first when more than single
+    characters should be compared.
+    """
+
+    def __init__(self, items=(), threshold=0.5, num_perm=128, recall=0.9,
+                 bands=None, seed=1):
+        """
+        :param items: An iterable of objects to index
+        :param threshold: The largest Jaccard distance to report
+        :type threshold: float
+        :param num_perm: The number of hash functions in a signature
+        :type num_perm: int
+        :param recall: The probability of finding a pair just at the
+            threshold, used to choose the number of bands. ValueError is
+            raised when no banding of *num_perm* rows reaches it.
+        :type recall: float
+        :param bands: The number of bands, overriding *recall*
+        :type bands: int
+        :param seed: The seed of the random hash functions. Indexes can
+            only be compared when their seeds are the same.
+        :raise: ValueError, ImportError
+        """
+        if np is None:
+            raise ImportError("MinHashLSH requires NumPy")
+        if not 0 <= threshold < 1:
+            raise ValueError("threshold must be at least 0 and less than 1")
+        if num_perm < 1:
+            raise ValueError("num_perm must be 1 or greater")
+        if not 0 < recall <= 1:
+            raise ValueError("recall must be greater than 0 and at most 1")
+        if bands is None:
+            bands = _lsh_bands(num_perm, 1.0 - threshold, recall)
+        if not 1 <= bands <= num_perm:
+            raise ValueError("bands must be between 1 and num_perm")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        state = np.random.RandomState(seed)
+        self._a = state.randint(1, _PRIME, num_perm).astype(np.uint64)
+        self._b = state.randint(0, _PRIME, num_perm).astype(np.uint64)
+
+        self._items = []
+        self._signatures = []
+        self._tables = [{} for _ in range(bands)]
+
+        items = [prepare(item) for item in items]
+        for start, signatures in self._signature_chunks(items):
+            for i, signature in enumerate(signatures):
+                self._insert(items[start + i], signature)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return (item.value for item in self._items)
+
+    def __repr__(self):
+        return 'MinHashLSH(%d items, %d bands of %d rows)' % (
+            len(self._items), self.bands, self.rows)
+
+    def _signature_chunks(self, items):
+        """
+        :param items: A list of prepared objects
+        :return: An iterator over *(start, signatures)* tuples, where
+            *signatures* is an array with the signatures of the objects
+            from *start* on as rows
+        """
+        start = 0
+        while start < len(items):
+            hashes = []
+            offsets = []
+            end = start
+            while end < len(items) and (
+                    end == start or
+                    (len(hashes) + len(_elements(items[end]))) *
+                    self.num_perm <= _MINHASH_CELLS):
+                offsets.append(len(hashes))
+                hashes.extend(hash(element) & 0xffffffff
+                              for element in _elements(items[end]))
+                end += 1
+
+            values = np.array(hashes, dtype=np.uint64)
+            values = (self._a[:, np.newaxis] * values +
+                      self._b[:, np.newaxis]) % _PRIME
+            signatures = np.minimum.reduceat(values, offsets, axis=1)
+            yield start, signatures.T.astype(np.uint32)
+            start = end
+
+    def signature(self, item):
+        """
+        :param item: The object to calculate the signature of
+        :return: The MinHash signature of *item*, an array of *num_perm*
+            hash values
+        :raise: ValueError
+        """
+        for _, signatures in self._signature_chunks([prepare(item)]):
+            return signatures[0]
+
+    def estimate(self, lhs, rhs):
+        """
+        :param lhs: The object to compare
+        :param rhs: The object to compare with
+        :return: The Jaccard distance of *lhs* and *rhs* estimated from
+            their signatures, with a standard error of about
+            1 / sqrt(*num_perm*)
+        :raise: ValueError
+        """
+        return 1.0 - float(np.mean(self.signature(lhs) ==
+                                   self.signature(rhs)))
+
+    def _keys(self, signature):
+        """
+        :return: The bucket keys of *signature*, one per band
+        """
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows].tostring()
+                for band in range(self.bands)]
+
+    def _insert(self, item, signature):
+        index = len(self._items)
+        for table, key in zip(self._tables, self._keys(signature)):
+            table.setdefault(key, []).append(index)
+        self._items.append(item)
+        self._signatures.append(signature)
+        return index
+
+    def add(self, item):
+        """
+        :param item: The object to add
+        :return: The id of the object, its position in the index
+        :raise: ValueError
+        """
+        item = prepare(item)
+        return self._insert(item, self.signature(item))
+
+    def _candidates(self, signature, limit):
+        """
+        :return: The ids below *limit* sharing a bucket with *signature*
+        """
+        ids = set()
+        for table, key in zip(self._tables, self._keys(signature)):
+            for index in table.get(key, ()):
+                if index >= limit:
+                    break
+                ids.add(index)
+        return sorted(ids)
+
+    def candidates(self, item):
+        """
+        :param item: The object to find the candidates for
+        :return: A sorted list of the ids of all objects sharing a bucket
+            with *item*, before they are checked
+        :raise: ValueError
+        """
+        return self._candidates(self.signature(item), len(self._items))
+
+    def query(self, item):
+        """
+        :param item: The object to search for
+        :return: A list of *(object, distance)* tuples for the candidates
+            within the threshold of *item*, sorted by distance.
+        :raise: ValueError
+        """
+        item = prepare(item)
+        results = []
+        for index in self.candidates(item):
+            distance = jaccard_distance(item, self._items[index])
+            if distance <= self.threshold:
+                results.append((self._items[index].value, distance))
+
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def self_join(self):
+        """
+        :return: An iterator over *(i, j, distance)* tuples for every pair of
+            indexed objects sharing a bucket and within the threshold, where
+            *i* < *j* are the ids of the objects. The pairs are generated in
+            order of *j*.
+        """
+        for j, item in enumerate(self._items):
+            for i in self._candidates(self._signatures[j], j):
+                distance = jaccard_distance(self._items[i], item)
+                if distance <= self.threshold:
+                    yield i, j, distance
+
+
+# The XOR masks of every distance seen so far, keyed by (length, distance)
+_flip_cache = {}
+
+
+def _flip_masks(length, distance):
+    """
+    :return: A list of all ints below 2 ** *length* with exactly *distance*
+        bits set, which turn a key into the keys at that Hamming distance
+    """
+    masks = _flip_cache.get((length, distance))
+    if masks is None:
+        masks = [sum(1 << bit for bit in bits)
+                 for bits in combinations(range(length), distance)]
+        _flip_cache[length, distance] = masks
+    return masks
+
+
+def _binomial(n, k):
+    """
+    :return: The number of ways to choose *k* of *n* elements
+    """
+    result = 1
+    for i in range(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+class MultiIndexHash(object):
+    """
+    A `multi-index hashing <http://www.cs.toronto.edu/~norouzi/research/
+    papers/multi_index_hashing.pdf>`__ index for finding the binary codes
+    within a :func:`~fuzzycomp.bitwise_hamming_distance` of a query, such
+    as perceptual hashes or fingerprints of a fixed number of bits.
+
+    Every code is cut into *substrings* consecutive parts, and each part
+    is stored in its own hash table. If two codes are within distance r of
+    each other, at least one of their m parts is within distance r // m, so
+    a query only has to look up the buckets near each of its own parts.
+    The candidates found are then checked with the exact distance, so the
+    results are exact as well.
+
+    More substrings give shorter parts and fewer buckets to probe, but more
+    candidates per bucket. A good number is about *bits* / log2(n) for n
+    codes. The counters :attr:`queries`, :attr:`probes` and
+    :attr:`candidates` add up the work done by all queries, to compare
+    different choices on a real workload.
+    """
+
+    def __init__(self, codes=(), bits=64, substrings=None):
+        """
+        :param codes: An iterable of codes to index, byte strings or ints
+        :param bits: The length of the codes in bits
+        :type bits: int
+        :param substrings: The number of parts each code is cut into.
+            Defaults to one part per 16 bits.
+        :type substrings: int
+        :raise: ValueError
+        """
+        if bits < 1:
+            raise ValueError("bits must be 1 or greater")
+        if substrings is None:
+            substrings = max(1, bits // 16)
+        if not 1 <= substrings <= bits:
+            raise ValueError("substrings must be between 1 and bits")
+
+        self.bits = bits
+        self.substrings = substrings
+        # The first bit, length and mask of each part
+        self._parts = []
+        for i in range(substrings):
+            start = bits * i // substrings
+            length = bits * (i + 1) // substrings - start
+            self._parts.append((start, length, (1 << length) - 1))
+        self._items = []
+        self._codes = []
+        self._tables = [{} for _ in range(substrings)]
+
+        #: The number of queries answered
+        self.queries = 0
+        #: The number of buckets looked up by all queries
+        self.probes = 0
+        #: The number of codes checked by all queries
+        self.candidates = 0
+
+        for code in codes:
+            self.add(code)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __repr__(self):
+        return 'MultiIndexHash(%d codes, %d bits in %d substrings)' % (
+            len(self._items), self.bits, self.substrings)
+
+    def _code(self, code):
+        """
+        :return: *code* as an int
+        :raise: ValueError if *code* is not a code of the length of the index
+        """
+        if isinstance(code, (str, bytearray)):
+            if len(code) * 8 != self.bits:
+                raise ValueError("Codes should be %d bits long" % self.bits)
+            return int(hexlify(code), 16)
+        if not isinstance(code, (int, long)) or not 0 <= code < 1 << self.bits:
+            raise ValueError("Codes should be ints of %d bits" % self.bits)
+        return code
+
+    def add(self, code):
+        """
+        :param code: The code to add, a byte string or int of *bits* bits
+        :return: The id of the code, its position in the index
+        :raise: ValueError
+        """
+        value = self._code(code)
+        index = len(self._items)
+        for table, (start, _, mask) in zip(self._tables, self._parts):
+            table.setdefault((value >> start) & mask, []).append(index)
+        self._items.append(code)
+        self._codes.append(value)
+        return index
+
+    def _bucket_ids(self, table, key, length, radius):
+        """
+        :return: A list of the id lists in the buckets of *table* within
+            *radius* of *key*, and the number of buckets looked at
+        """
+        if sum(_binomial(length, d) for d in range(radius + 1)) > len(table):
+            # Fewer buckets exist than would be probed, so scan them all
+            return [ids for other, ids in table.iteritems()
+                    if bin(other ^ key).count("1") <= radius], len(table)
+
+        found = []
+        probes = 0
+        for distance in range(radius + 1):
+            for mask in _flip_masks(length, distance):
+                ids = table.get(key ^ mask)
+                if ids is not None:
+                    found.append(ids)
+                probes += 1
+        return found, probes
+
+    def query(self, code, max_distance):
+        """
+        :param code: The code to search for
+        :param max_distance: The largest distance to include
+        :type max_distance: int
+        :return: A list of *(code, distance)* tuples for all codes within
+            *max_distance* of *code*, sorted by distance.
+        :raise: ValueError
+        """
+        if max_distance < 0:
+            raise ValueError("max_distance must be 0 or greater")
+        value = self._code(code)
+
+        # Of the codes within max_distance, each has one of the first
+        # max_distance % m + 1 parts within quotient, or one of the others
+        # within quotient - 1 of the query.
+        quotient, remainder = divmod(max_distance, self.substrings)
+        ids = set()
+        for i, (table, (start, length, mask)) in enumerate(zip(self._tables,
+                                                                self._parts)):
+            radius = quotient if i <= remainder else quotient - 1
+            if radius < 0:
+                break
+            found, probes = self._bucket_ids(table, (value >> start) & mask,
+                                             length, min(radius, length))
+            for bucket in found:
+                ids.update(bucket)
+            self.probes += probes
+
+        self.queries += 1
+        self.candidates += len(ids)
+
+        results = []
+        for index in ids:
+            distance = bin(self._codes[index] ^ value).count("1")
+            if distance <= max_distance:
+                results.append((self._items[index], distance))
+
+        results.sort(key=lambda result: result[1])
+        return results
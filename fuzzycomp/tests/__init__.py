@@ -15,4 +15,4 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-__all__ = ['test_fuzzycomp']
\ No newline at end of file
+__all__ = ['test_fuzzycomp', 'test_index', 'test_dedupe', 'test_cli']
\ No newline at end of file
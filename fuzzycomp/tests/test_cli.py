@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Bjoern Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+from  fuzzycomp import cli
+
+class TestCli( unittest.TestCase ):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queries = self.write( "queries.csv", "id,name\n1,Smith\n2,Jonson\n3,\n4,Miller\n" )
+        self.choices = self.write( "choices.ndjson",
+                                   '{"name": "Smyth"}\n{"name": "Johnson"}\n{"name": "Smith"}\n"Muller"\n' )
+
+    def tearDown(self):
+        shutil.rmtree( self.directory )
+
+    def write(self, name, text):
+        path = os.path.join( self.directory, name )
+        open( path, "w" ).write( text )
+        return path
+
+    def run_cli(self, *args):
+        output = os.path.join( self.directory, "output.ndjson" )
+        status = cli.main( [ "-q", "-f", "name", "-o", output ] + list( args ) + [ self.queries, self.choices ] )
+        self.assertEqual( status, 0 )
+        return [ json.loads( line ) for line in open( output ) ]
+
+    def test_threshold(self):
+        """All pairs within the threshold should be written"""
+        matches = self.run_cli( "-t", "1" )
+        self.assertEqual( [ ( match["query_id"], match["choice_id"], match["score"] ) for match in matches ],
+                          [ ( 1, 1, 1 ), ( 1, 3, 0 ), ( 2, 2, 1 ), ( 4, 4, 1 ) ] )
+
+    def test_top(self):
+        """Only the best matches of every query should be written"""
+        matches = self.run_cli( "-m", "jaro_winkler", "-k", "1", "-b", "soundex" )
+        self.assertEqual( [ ( match["query"], match["choice"] ) for match in matches ],
+                          [ ( "Smith", "Smith" ), ( "Jonson", "Johnson" ), ( "Miller", "Muller" ) ] )
+
+    def test_metric_arguments(self):
+        """Arguments given with --arg should be passed on to the metric"""
+        matches = self.run_cli( "-m", "tversky_index", "-a", "alpha=0.5", "-a", "beta=0.5", "-t", "0.8" )
+        self.assertEqual( [ ( match["query"], match["choice"] ) for match in matches ],
+                          [ ( "Smith", "Smith" ), ( "Jonson", "Johnson" ) ] )
+
+    def test_csv_output(self):
+        """CSV output should have a header and one row per match"""
+        output = os.path.join( self.directory, "output.csv" )
+        cli.main( [ "-q", "-f", "name", "-t", "0", "-o", output, self.queries, self.choices ] )
+        self.assertEqual( open( output ).read(), "query_id,choice_id,query,choice,score\n1,3,Smith,Smith,0\n" )
+
+    def test_blank_lines(self):
+        """Blank lines of NDJSON input should not be numbered"""
+        self.choices = self.write( "choices.ndjson", '\n{"name": "Smyth"}\n\n{"name": null}\n"Smith"\n' )
+        matches = self.run_cli( "-t", "0" )
+        self.assertEqual( [ ( match["query_id"], match["choice_id"] ) for match in matches ], [ ( 1, 3 ) ] )
+
+    def run_invalid(self, *args):
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            status = cli.main( [ "-q", "-o", os.path.join( self.directory, "output.csv" ) ] + list( args ) +
+                               [ self.queries, self.choices ] )
+        finally:
+            message, sys.stderr = sys.stderr.getvalue(), stderr
+        self.assertEqual( status, 1 )
+        return message
+
+    def test_missing_metric_arguments(self):
+        """Arguments the metric requires should be checked before matching"""
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            self.assertRaises( SystemExit, cli.main, [ "-m", "tversky_index", "-a", "alpha=0.5",
+                                                       self.queries, self.choices ] )
+            self.assertRaises( SystemExit, cli.main, [ "-m", "jaro_winkler", "-a", "alpha=0.5",
+                                                       self.queries, self.choices ] )
+        finally:
+            message, sys.stderr = sys.stderr.getvalue(), stderr
+        self.assertTrue( "tversky_index requires -a beta=VALUE" in message )
+        self.assertTrue( "jaro_winkler takes no argument alpha" in message )
+
+    def test_unencoded_choices(self):
+        """Choices the blocker can not encode should be counted"""
+        self.choices = self.write( "choices.ndjson", '"Smith"\n"!%&"\n"123"\n' )
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            status = cli.main( [ "-f", "name", "-b", "soundex", "-t", "0", "-o",
+                                 os.path.join( self.directory, "output.csv" ), self.queries, self.choices ] )
+        finally:
+            message, sys.stderr = sys.stderr.getvalue(), stderr
+        self.assertEqual( status, 0 )
+        self.assertTrue( "Read 1 choices" in message )
+        self.assertTrue( "Skipped 2 choices that soundex can not encode" in message )
+
+    def test_invalid_input(self):
+        """Unknown fields should fail with an error status"""
+        self.assertTrue( "no column named 'surname'" in
+                         self.run_invalid( "--query-field", "surname", "--choice-field", "name" ) )
+        self.assertTrue( "record 1 has no key named 'surname'" in self.run_invalid( "-f", "surname" ) )
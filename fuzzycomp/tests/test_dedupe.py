@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Bjoern Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import glob
+import os
+import tempfile
+from  fuzzycomp import fuzzycomp, dedupe
+
+NAMES = ["Smith", "Jones", "Smyth", "Johnson", "Smithe", "Jonson", "Brown", "Miller", "Muller", "Browne"]
+
+class Record( object ):
+    """A record counting the instances that are alive"""
+    alive = 0
+
+    def __init__(self, name):
+        self.name = name
+        Record.alive += 1
+
+    def __setstate__(self, state):
+        self.__dict__.update( state )
+        Record.alive += 1
+
+    def __del__(self):
+        Record.alive -= 1
+
+def normalize( clusters ):
+    return sorted( sorted( cluster ) for cluster in clusters )
+
+class TestUnionFind( unittest.TestCase ):
+    def test_union(self):
+        """Merged ids should share a set"""
+        sets = dedupe.UnionFind( 6 )
+        self.assertTrue( sets.union( 0, 3 ) )
+        self.assertTrue( sets.union( 3, 5 ) )
+        self.assertFalse( sets.union( 5, 0 ) )
+        self.assertEqual( sets.find( 0 ), sets.find( 5 ) )
+        self.assertNotEqual( sets.find( 0 ), sets.find( 1 ) )
+        self.assertEqual( sets.sets(), [ [0, 3, 5], [1], [2], [4] ] )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on a negative size"""
+        self.assertRaises( ValueError, dedupe.UnionFind, -1 )
+
+class TestDedupe( unittest.TestCase ):
+    def test_clusters(self):
+        """Similar names sharing a code should be clustered"""
+        expected = [ ["Brown", "Browne"], ["Johnson", "Jonson"], ["Jones"], ["Miller", "Muller"],
+                     ["Smith", "Smithe", "Smyth"] ]
+        self.assertEqual( normalize( dedupe.dedupe( NAMES, threshold = 0.85 ) ), expected )
+
+    def test_presorted(self):
+        """Presorted input should give the same clusters as unsorted input"""
+        names = sorted( NAMES, key = fuzzycomp.soundex )
+        self.assertEqual( normalize( dedupe.dedupe( names, threshold = 0.85, presorted = True ) ),
+                          normalize( dedupe.dedupe( NAMES, threshold = 0.85, run_size = 3 ) ) )
+
+    def test_sorted_blocks(self):
+        """Sorting in runs should hold no more than one block in memory at a time"""
+        names = [ name for _ in range( 6 ) for name in NAMES ]
+        coded = ( ( fuzzycomp.soundex( name ), Record( name ) ) for name in names )
+        runs = len( names ) // 5
+        sizes = []
+        for code, block in dedupe._sorted_blocks( coded, 5 ):
+            block = list( block )
+            self.assertEqual( set( record.name for record in block ),
+                              set( name for name in NAMES if fuzzycomp.soundex( name ) == code ) )
+            self.assertTrue( Record.alive <= len( block ) + runs + 1 )
+            sizes.append( len( block ) )
+            del block
+        self.assertEqual( sum( sizes ), len( names ) )
+        self.assertTrue( max( sizes ) + runs + 1 < len( names ) )
+        self.assertEqual( Record.alive, 0 )
+
+    @unittest.skipIf( not os.path.isdir( "/proc/self/fd" ), "Open files can not be counted" )
+    def test_open_files(self):
+        """Sorting in many runs should keep no more than a merge of them open at a time"""
+        def open_files():
+            return len( os.listdir( "/proc/self/fd" ) )
+
+        def read_run( path ):
+            for item in read( path ):
+                peak[0] = max( peak[0], open_files() )
+                yield item
+
+        names = [ name for _ in range( 30 ) for name in NAMES ]
+        read, width, peak = dedupe._read_run, dedupe._MERGE_WIDTH, [0]
+        before = open_files()
+        dedupe._read_run, dedupe._MERGE_WIDTH = read_run, 4
+        try:
+            coded = [ ( fuzzycomp.soundex( name ), name ) for name in names ]
+            blocks = [ ( code, list( block ) ) for code, block in dedupe._sorted_blocks( coded, 2 ) ]
+        finally:
+            dedupe._read_run, dedupe._MERGE_WIDTH = read, width
+        self.assertEqual( sum( len( block ) for _, block in blocks ), len( names ) )
+        self.assertEqual( [ code for code, _ in blocks ], sorted( set( code for code, _ in coded ) ) )
+        self.assertTrue( peak[0] - before <= 5 )
+        self.assertEqual( open_files(), before )
+
+    def test_run_files_removed(self):
+        """The temporary files should be removed even if the blocks are not read to the end"""
+        pattern = os.path.join( tempfile.gettempdir(), "fuzzycomp-*.run" )
+        existing = set( glob.glob( pattern ) )
+        blocks = dedupe._sorted_blocks( ( ( fuzzycomp.soundex( name ), name ) for name in NAMES * 10 ), 3 )
+        blocks.next()
+        self.assertTrue( set( glob.glob( pattern ) ) - existing )
+        blocks.close()
+        self.assertEqual( set( glob.glob( pattern ) ) - existing, set() )
+
+    def test_records(self):
+        """Records should be clustered by their keys in the order they were read"""
+        records = [ ( i, name ) for i, name in enumerate( NAMES + [ "Smith", "" ] ) ]
+        clusters = list( dedupe.dedupe( records, key = lambda record: record[1],
+                                        metric = "levenshtein_distance", threshold = 1 ) )
+        self.assertTrue( [ ( 0, "Smith" ), ( 2, "Smyth" ), ( 4, "Smithe" ), ( 10, "Smith" ) ] in clusters )
+        self.assertTrue( [ ( 11, "" ) ] in clusters )
+        self.assertEqual( sorted( record for cluster in clusters for record in cluster ), records )
+
+    def test_metric_arguments(self):
+        """Additional arguments should be passed on to the metric"""
+        clusters = dedupe.dedupe( ["Miller", "Muller"], metric = "tversky_index", threshold = 0.5,
+                                  alpha = 0.5, beta = 0.5 )
+        self.assertEqual( normalize( clusters ), [ ["Miller", "Muller"] ] )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, list, dedupe.dedupe( NAMES, blocker = "levenshtein_distance" ) )
+        self.assertRaises( ValueError, list, dedupe.dedupe( NAMES, metric = "soundex" ) )
+        self.assertRaises( ValueError, list, dedupe.dedupe( NAMES, run_size = 0 ) )
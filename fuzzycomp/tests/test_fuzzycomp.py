@@ -18,12 +18,11 @@
 import unittest
 from  fuzzycomp import fuzzycomp
 import sys
+import re
+import pickle
+import operator
 
 
-#TODO: Both algorithms depending on the Matrix could be optimized to not use a Matrix at all,
-# this saves us the superfluous implementation of a Matrix and should save us a lot of memory,
-# especially for long sequences
-
 class BaseTester( unittest.TestCase ):
     def mixed_iterable_input(self, func, error = ValueError):
         self.assertRaises( error, func, "Hello", [1,5] )
@@ -51,6 +50,10 @@ class TestLevenshteinDistance( BaseTester ):
         """Algorithm should return correct values under valid input"""
         self.assertEqual( fuzzycomp.levenshtein_distance( "Hello", "Hello" ), 0 )
         self.assertEqual( fuzzycomp.levenshtein_distance( "Saturday", "Sunday" ), 3 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "kitten", "sitting" ), 3 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "sitting", "kitten" ), 3 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "a", "b" ), 1 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "a", "abc" ), 2 )
 
     def test_case_difference(self):
         """Algorithm should be case sensitive"""
@@ -78,6 +81,154 @@ class TestLevenshteinDistance( BaseTester ):
         """Function should raise value error if passed with mixed types"""
         self.mixed_iterable_input( fuzzycomp.levenshtein_distance )
 
+    def test_unhashable_input(self):
+        """Function should handle iterables with unhashable elements"""
+        self.assertEqual( fuzzycomp.levenshtein_distance( [[1], [2], [3]], [[1], [3]] ), 1 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( [[1], [2], [3]], [[1], [3]], 0 ), 1 )
+
+    def test_long_input(self):
+        """Function should return correct values for inputs longer than a machine word"""
+        lhs = "Saturday" * 20
+        rhs = "Sunday" * 20
+        self.assertEqual( fuzzycomp.levenshtein_distance( lhs, rhs ), 60 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( rhs, lhs ), 60 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( lhs, lhs + "x" ), 1 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( list( lhs ), list( rhs ) ), 60 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( lhs, rhs, 70 ), 60 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( lhs, rhs, 50 ), 51 )
+
+    def test_max_distance(self):
+        """Distances above max_distance should be reported as max_distance + 1"""
+        self.assertEqual( fuzzycomp.levenshtein_distance( "Saturday", "Sunday", 3 ), 3 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "Saturday", "Sunday", 2 ), 3 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "Saturday", "Sunday", 1 ), 2 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "Hello", "Hello", 0 ), 0 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "Hello", "Hallo", 0 ), 1 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "abcdef", "fedcba", 10 ), 6 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( "a", "abcdef", 2 ), 3 )
+
+        words = ["kitten", "sitting", "mitten", "sitten", "kitchen", "written", "knitting"]
+        for lhs in words:
+            for rhs in words:
+                distance = fuzzycomp.levenshtein_distance( lhs, rhs )
+                for max_distance in range( 5 ):
+                    self.assertEqual( fuzzycomp.levenshtein_distance( lhs, rhs, max_distance ),
+                                      min( distance, max_distance + 1 ) )
+
+    def test_negative_max_distance(self):
+        """Function should raise ValueError if max_distance is negative"""
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance, "Hello", "Hallo", -1 )
+
+class TestLevenshteinDistanceMany( unittest.TestCase ):
+    def setUp(self):
+        self.choices = ["Sunday", "Saturday", "Monday", "Satyrday", "Sundae", "S"]
+
+    def test_valid_input(self):
+        """Function should return the same distances as levenshtein_distance"""
+        result = fuzzycomp.levenshtein_distance_many( "Saturday", self.choices )
+        self.assertEqual( result, [ ( choice, fuzzycomp.levenshtein_distance( "Saturday", choice ), index )
+                                    for index, choice in enumerate( self.choices ) ] )
+
+    def test_generator_input(self):
+        """Function should accept choices from a generator"""
+        result = fuzzycomp.levenshtein_distance_many( "Saturday", ( choice for choice in self.choices ) )
+        self.assertEqual( len( result ), len( self.choices ) )
+
+    def test_score_cutoff(self):
+        """Only choices within score_cutoff should be returned"""
+        result = fuzzycomp.levenshtein_distance_many( "Saturday", self.choices, score_cutoff = 3 )
+        self.assertEqual( result, [ ( "Sunday", 3, 0 ), ( "Saturday", 0, 1 ), ( "Satyrday", 1, 3 ) ] )
+        self.assertEqual( fuzzycomp.levenshtein_distance_many( "Saturday", self.choices, score_cutoff = 0 ),
+                          [ ( "Saturday", 0, 1 ) ] )
+
+    def test_limit(self):
+        """Only the closest choices should be returned, sorted by distance"""
+        result = fuzzycomp.levenshtein_distance_many( "Saturday", self.choices, limit = 2 )
+        self.assertEqual( result, [ ( "Saturday", 0, 1 ), ( "Satyrday", 1, 3 ) ] )
+
+        result = fuzzycomp.levenshtein_distance_many( "Sunday", self.choices, limit = 3 )
+        self.assertEqual( result, [ ( "Sunday", 0, 0 ), ( "Sundae", 1, 4 ), ( "Monday", 2, 2 ) ] )
+
+        result = fuzzycomp.levenshtein_distance_many( "Sunday", self.choices, score_cutoff = 1, limit = 3 )
+        self.assertEqual( result, [ ( "Sunday", 0, 0 ), ( "Sundae", 1, 4 ) ] )
+
+    def test_long_input(self):
+        """Function should return correct values for queries longer than a machine word"""
+        query = "Saturday" * 10
+        choices = [ "Sunday" * 10, "Saturday" * 9, "Saturday" * 10 ]
+        result = fuzzycomp.levenshtein_distance_many( query, choices, score_cutoff = 10, limit = 2 )
+        self.assertEqual( result, [ ( choices[2], 0, 2 ), ( choices[1], 8, 1 ) ] )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on empty, mixed or invalid input"""
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance_many, "", self.choices )
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance_many, "Hello", [ "Hello", "" ] )
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance_many, "Hello", [ "Hello", [1, 2] ] )
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance_many, "Hello", self.choices, -1 )
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance_many, "Hello", self.choices, None, 0 )
+
+@unittest.skipIf( fuzzycomp.np is None, "NumPy is not installed" )
+class TestCdist( unittest.TestCase ):
+    def setUp(self):
+        self.queries = ["Saturday", "Sunday", "Hello", "XMJYAUZ"]
+        self.choices = ["Sunday", "World", "MZJAWXU", "Saturday", "Hallo", "S"]
+
+    def check_metric(self, metric, queries, choices, **kwargs):
+        result = fuzzycomp.cdist( queries, choices, metric, **kwargs )
+        func = getattr( fuzzycomp, metric )
+        self.assertEqual( result.shape, ( len( queries ), len( choices ) ) )
+        for i, query in enumerate( queries ):
+            for j, choice in enumerate( choices ):
+                self.assertAlmostEqual( result[i, j], func( query, choice, **kwargs ) )
+
+    def test_vectorized_metrics(self):
+        """Vectorized metrics should return the same values as the plain functions"""
+        self.check_metric( "levenshtein_distance", self.queries, self.choices )
+        self.check_metric( "lcs_length", self.queries, self.choices )
+        self.check_metric( "hamming_distance", ["Hello", "World"], ["Hallo", "Word!", "12345"] )
+
+    def test_other_metrics(self):
+        """Other metrics should be evaluated pair by pair"""
+        self.check_metric( "jaccard_distance", self.queries, self.choices )
+        self.check_metric( "dice_coefficient", self.queries, self.choices )
+        self.check_metric( "tversky_index", self.queries, self.choices, alpha = 0.5, beta = 0.5 )
+
+    def test_prepared_input(self):
+        """Function should accept prepared objects"""
+        queries = [ fuzzycomp.prepare( query ) for query in self.queries ]
+        self.check_metric( "levenshtein_distance", queries, self.choices )
+        self.check_metric( "jaro_winkler", queries, self.choices )
+
+    def test_function_metric(self):
+        """Function should accept the metric function itself"""
+        result = fuzzycomp.cdist( self.queries, self.choices, fuzzycomp.levenshtein_distance )
+        self.assertEqual( result[0, 0], 3 )
+
+    def test_iterable_input(self):
+        """Function should accept lists and tuples as objects"""
+        result = fuzzycomp.cdist( [ (1, 2, 3), (4, 5) ], [ (1, 3), (5, 4) ] )
+        self.assertEqual( result.tolist(), [ [1, 3], [2, 2] ] )
+        result = fuzzycomp.cdist( [ [ [1], [2] ] ], [ [ [1], [3] ] ] )
+        self.assertEqual( result.tolist(), [ [1] ] )
+
+    def test_workers(self):
+        """Function should return the same values when using several processes"""
+        for metric in ["levenshtein_distance", "jaccard_distance", fuzzycomp.jaro_distance]:
+            self.assertEqual( fuzzycomp.cdist( self.queries, self.choices, metric, workers = 2 ).tolist(),
+                              fuzzycomp.cdist( self.queries, self.choices, metric ).tolist() )
+        result = fuzzycomp.cdist( self.queries, self.choices, "tversky_index", workers = 3,
+                                  alpha = 0.5, beta = 0.5 )
+        self.assertEqual( result.shape, ( len( self.queries ), len( self.choices ) ) )
+        self.assertRaises( ValueError, fuzzycomp.cdist, self.queries, self.choices, workers = 0 )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid input or unknown metrics"""
+        self.assertRaises( ValueError, fuzzycomp.cdist, ["Hello"], ["Hello", ""] )
+        self.assertRaises( ValueError, fuzzycomp.cdist, ["Hello"], ["Hello", [1, 2]] )
+        self.assertRaises( ValueError, fuzzycomp.cdist, ["Hello"], ["Goodbye"], "hamming_distance" )
+        self.assertRaises( ValueError, fuzzycomp.cdist, ["Hello"], ["Hello"], "soundex" )
+        self.assertRaises( ValueError, fuzzycomp.cdist, ["Hello"], ["Hello"], "no_such_metric" )
+
 class TestMatrix( unittest.TestCase ):
     def setUp(self):
         self.size = ( 4, 5 )
@@ -113,6 +264,51 @@ class TestMatrix( unittest.TestCase ):
             for j in range( self.size[1] ):
                 self.assertEqual( self.m[ i, j ], i+j )
 
+    def test_data(self):
+        """Data should hold the values as a list of rows"""
+        self.m[ 1, 2 ] = 7
+        self.assertEqual( len( self.m.data ), self.size[0] )
+        self.assertEqual( self.m.data[1], [ 0, 0, 7, 0, 0 ] )
+        self.assertEqual( self.m.data[-3][2], 7 )
+        self.assertEqual( self.m.data, [ [ 7 if ( i, j ) == ( 1, 2 ) else 0 for j in range( self.size[1] ) ]
+                                         for i in range( self.size[0] ) ] )
+
+    def test_mixed_values(self):
+        """Values of any type should be stored unchanged"""
+        m = fuzzycomp.Matrix( 2, 2, 0.5 )
+        m[ 0, 0 ] = 3
+        m[ 0, 1 ] = "abc"
+        m[ 1, 0 ] = 2 ** 80
+        self.assertEqual( type( m[ 0, 0 ] ), int )
+        self.assertEqual( m.data, [ [ 3, "abc" ], [ 2 ** 80, 0.5 ] ] )
+
+    def test_pickle(self):
+        """A pickled Matrix should hold the same values"""
+        m = fuzzycomp.Matrix( 2, 3 )
+        m[ 1, 2 ] = 7
+        m[ 0, 1 ] = "abc"
+        for protocol in range( pickle.HIGHEST_PROTOCOL + 1 ):
+            copy = pickle.loads( pickle.dumps( m, protocol ) )
+            self.assertEqual( copy.size(), ( 2, 3 ) )
+            self.assertEqual( copy.data, m.data )
+        copy = pickle.loads( pickle.dumps( fuzzycomp.Matrix( 2, 2, 0.5 ) ) )
+        self.assertEqual( copy[ 1, 1 ], 0.5 )
+
+    def test_data_write_through(self):
+        """Values and rows stored through data should be stored in the Matrix"""
+        self.m.data[0][1] = 5
+        self.m.data[-1][-1] = "abc"
+        self.m.data[2] = [ 1, 2, 3, 4, 5 ]
+        self.assertEqual( self.m[ 0, 1 ], 5 )
+        self.assertEqual( self.m[ 3, 4 ], "abc" )
+        self.assertEqual( [ self.m[ 2, j ] for j in range( 5 ) ], [ 1, 2, 3, 4, 5 ] )
+        self.m.data = [ [ i * j for j in range( 5 ) ] for i in range( 4 ) ]
+        self.assertEqual( self.m[ 3, 4 ], 12 )
+        self.assertRaises( IndexError, operator.getitem, self.m.data, 4 )
+        self.assertRaises( IndexError, operator.setitem, self.m.data[0], 5, 1 )
+        self.assertRaises( ValueError, operator.setitem, self.m.data, 0, [ 1, 2 ] )
+        self.assertRaises( ValueError, setattr, self.m, "data", [] )
+
 class TestJaccardDistance( BaseTester ):
     def test_valid_input(self):
         """Algorithm should return correct values under valid input"""
@@ -170,11 +366,62 @@ class TestHammingDistance( BaseTester ):
         self.assertRaises( ValueError, fuzzycomp.hamming_distance, [1, 2, 3], "Foo" )
 
 
+class TestBitwiseHammingDistance( unittest.TestCase ):
+    def test_valid_input(self):
+        """Algorithm should count the bits that differ"""
+        self.assertEqual( fuzzycomp.bitwise_hamming_distance( "\x00\xff", "\x00\xff" ), 0 )
+        self.assertEqual( fuzzycomp.bitwise_hamming_distance( "\x0f\x01", "\xf0\x03" ), 9 )
+        self.assertEqual( fuzzycomp.bitwise_hamming_distance( bytearray( "\x07" ), "\x00" ), 3 )
+        self.assertEqual( fuzzycomp.bitwise_hamming_distance( 0, 2 ** 70 + 5 ), 3 )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError for codes it cannot compare"""
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance, "", "" )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance, "ab", "abc" )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance, "a", 97 )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance, u"a", u"b" )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance, -1, 1 )
+
+    @unittest.skipIf( fuzzycomp.np is None, "NumPy is not installed" )
+    def test_many(self):
+        """Batched distances should match those of the pairwise function"""
+        np = fuzzycomp.np
+        state = np.random.RandomState( 0 )
+        for width in ( 3, 16 ):
+            codes = state.randint( 0, 256, ( 100, width ) ).astype( np.uint8 )
+            query = codes[7].tostring()
+            expected = [fuzzycomp.bitwise_hamming_distance( query, code.tostring() )
+                        for code in codes]
+            self.assertEqual( list( fuzzycomp.bitwise_hamming_distance_many( query, codes ) ), expected )
+            self.assertEqual( list( fuzzycomp.bitwise_hamming_distance_many( codes[7], codes ) ), expected )
+
+        codes = np.array( [0, 1, 6, 2 ** 63], np.uint64 )
+        self.assertEqual( list( fuzzycomp.bitwise_hamming_distance_many( 3, codes ) ), [2, 1, 2, 3] )
+
+    @unittest.skipIf( fuzzycomp.np is None, "NumPy is not installed" )
+    def test_many_invalid_input(self):
+        """Batched distances should raise ValueError if the query does not fit the codes"""
+        np = fuzzycomp.np
+        codes = np.zeros( ( 4, 8 ), np.uint8 )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance_many, "abc", codes )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance_many, 3, codes )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance_many,
+                           256, np.zeros( 4, np.uint8 ) )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance_many,
+                           "abc", np.zeros( ( 2, 2, 2 ), np.uint8 ) )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance_many,
+                           1, np.array( [0, -1, 3], np.int64 ) )
+        self.assertRaises( ValueError, fuzzycomp.bitwise_hamming_distance_many,
+                           np.array( [-1], np.int64 ), np.array( [0, 1], np.uint64 ) )
+
+
 class TestLCS( BaseTester ):
     def test_valid_input(self):
         """Algorithm should return correct values under valid input"""
         self.assertEqual( fuzzycomp.lcs_length("XMJYAUZ", "MZJAWXU"), 4 )
         self.assertEqual( fuzzycomp.lcs_length("foo", "bar"), 0 )
+        self.assertEqual( fuzzycomp.lcs_length("MZJAWXU", "XMJYAUZ"), 4 )
+        self.assertEqual( fuzzycomp.lcs_length("A", "BANANA"), 1 )
            
     def test_empty_input(self):
         """Function should raise ValueError if called with empty input"""
@@ -195,6 +442,75 @@ class TestLCS( BaseTester ):
         """Function should raise ValueError if called with mixed input"""
         self.mixed_iterable_input( fuzzycomp.lcs_length )
 
+    def test_unhashable_input(self):
+        """Function should handle iterables with unhashable elements"""
+        self.assertEqual( fuzzycomp.lcs_length( [[1], [2], [3]], [[1], [3]] ), 2 )
+        self.assertEqual( fuzzycomp.lcs_length( [[1], [2]], [[3]] ), 0 )
+
+    def test_long_input(self):
+        """Function should return correct values for inputs longer than a machine word"""
+        lhs = "XMJYAUZ" * 20
+        rhs = "MZJAWXU" * 20
+        self.assertEqual( fuzzycomp.lcs_length( lhs, rhs ),
+                          fuzzycomp._lcs_rows( lhs, rhs ) )
+        self.assertEqual( fuzzycomp.lcs_length( rhs, lhs ),
+                          fuzzycomp._lcs_rows( lhs, rhs ) )
+        self.assertEqual( fuzzycomp.lcs_length( lhs, lhs ), len( lhs ) )
+        self.assertEqual( fuzzycomp.lcs_length( lhs, "A" * 200 ), 20 )
+        self.assertEqual( fuzzycomp.lcs_length( list( lhs ), list( rhs ) ),
+                          fuzzycomp._lcs_rows( lhs, rhs ) )
+
+class TestLCSSequence( unittest.TestCase ):
+    def is_common_subsequence(self, lhs, rhs, pairs):
+        """Check that pairs are increasing positions of equal elements"""
+        for (i, j), (k, l) in zip( pairs, pairs[1:] ):
+            self.assertTrue( i < k and j < l )
+        for i, j in pairs:
+            self.assertEqual( lhs[i], rhs[j] )
+
+    def test_valid_input(self):
+        """Function should return a longest common subsequence"""
+        self.assertEqual( len( fuzzycomp.lcs( "XMJYAUZ", "MZJAWXU" ) ), 4 )
+        self.assertEqual( fuzzycomp.lcs( "AGGTAB", "GXTXAYB" ), "GTAB" )
+        self.assertEqual( fuzzycomp.lcs( "foo", "bar" ), "" )
+        self.assertEqual( fuzzycomp.lcs( "A", "BANANA" ), "A" )
+        self.assertEqual( fuzzycomp.lcs( u"Björn", u"Bjorn" ), u"Bjrn" )
+
+    def test_pairs(self):
+        """Function should return the matching positions with pairs=True"""
+        self.assertEqual( fuzzycomp.lcs( "AGGTAB", "GXTXAYB", pairs = True ),
+                          [ (1, 0), (3, 2), (4, 4), (5, 6) ] )
+        self.assertEqual( fuzzycomp.lcs( "GXTXAYB", "AGGTAB", pairs = True ),
+                          [ (0, 1), (2, 3), (4, 4), (6, 5) ] )
+        self.assertEqual( fuzzycomp.lcs( "foo", "bar", pairs = True ), [] )
+
+    def test_iterable_input(self):
+        """Function should return the same type as the input"""
+        self.assertEqual( fuzzycomp.lcs( list( "AGGTAB" ), list( "GXTXAYB" ) ),
+                          list( "GTAB" ) )
+        self.assertEqual( fuzzycomp.lcs( tuple( "AGGTAB" ), tuple( "GXTXAYB" ) ),
+                          tuple( "GTAB" ) )
+        self.assertEqual( fuzzycomp.lcs( [[1], [2], [3]], [[1], [3]] ), [[1], [3]] )
+
+    def test_long_input(self):
+        """Function should agree with lcs_length on long inputs"""
+        lhs = "XMJYAUZ" * 50
+        rhs = "MZJAWXU" * 40
+        pairs = fuzzycomp.lcs( lhs, rhs, pairs = True )
+        self.assertEqual( len( pairs ), fuzzycomp.lcs_length( lhs, rhs ) )
+        self.is_common_subsequence( lhs, rhs, pairs )
+
+        pairs = fuzzycomp.lcs( list( rhs ), list( lhs ), pairs = True )
+        self.assertEqual( len( pairs ), fuzzycomp.lcs_length( lhs, rhs ) )
+        self.is_common_subsequence( rhs, lhs, pairs )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on empty or mixed input"""
+        self.assertRaises( ValueError, fuzzycomp.lcs, "", "Foo" )
+        self.assertRaises( ValueError, fuzzycomp.lcs, "Foo", [] )
+        self.assertRaises( ValueError, fuzzycomp.lcs, "Foo", ["F", "o"] )
+
+
 class TestJaroDistance( BaseTester ):
     def test_valid_input(self):
         """Algorithm should return correct values under valid input"""
@@ -227,6 +543,25 @@ class TestJaroDistance( BaseTester ):
         """Function should raise ValueError if called with mixed input"""
         self.mixed_iterable_input( fuzzycomp.jaro_distance )
 
+    def test_repeated_elements(self):
+        """Every element should be matched at most once"""
+        self.assertAlmostEqual( fuzzycomp.jaro_distance( "CRATE", "TRACE" ), 0.733, places=3 )
+        self.assertAlmostEqual( fuzzycomp.jaro_distance( "AABA", "ABBB" ), 0.667, places=3 )
+        self.assertEqual( fuzzycomp.jaro_distance( "ABC", "XYZ" ), 0 )
+
+    def test_unhashable_input(self):
+        """Function should handle iterables with unhashable elements"""
+        self.assertAlmostEqual( fuzzycomp.jaro_distance( [[1], [2], [3]], [[1], [3], [2]] ),
+                                0.556, places=3 )
+        self.assertAlmostEqual( fuzzycomp.jaro_distance( [list( c ) for c in "MARTHA"],
+            [list( c ) for c in "MARHTA"] ), 0.944, places=3 )
+
+    def test_long_input(self):
+        """Function should return correct values for inputs longer than a machine word"""
+        self.assertAlmostEqual( fuzzycomp.jaro_distance( "MARTHA" * 20, "MARHTA" * 20 ),
+                                0.944, places=3 )
+        self.assertEqual( fuzzycomp.jaro_distance( "DIXON" * 20, "DIXON" * 20 ), 1.0 )
+
 class TestJaroWinklerDistance( BaseTester ):
     def test_valid_input(self):
         """Algorithm should return correct values under valid input"""
@@ -258,6 +593,150 @@ class TestJaroWinklerDistance( BaseTester ):
         """Function should raise ValueError if called with mixed input"""
         self.mixed_iterable_input( fuzzycomp.jaro_winkler )
 
+    def test_shorter_input(self):
+        """Function should handle a common prefix longer than one of the inputs"""
+        self.assertAlmostEqual( fuzzycomp.jaro_winkler( "MARTHA", "MAR" ), 0.883, places=3 )
+        self.assertAlmostEqual( fuzzycomp.jaro_winkler( "MAR", "MARTHA" ), 0.883, places=3 )
+        self.assertAlmostEqual( fuzzycomp.jaro_winkler( [1, 2, 3, 4, 5], [1, 2] ), 0.84, places=3 )
+
+class TestPrepare( unittest.TestCase ):
+    def setUp(self):
+        self.pairs = [ ( "MARTHA", "MARHTA" ), ( "DWAYNE", "DUANE" ), ( "DIXON", "DICKSONX" ),
+                       ( "night", "nacht" ), ( list( "Saturday" ), list( "Sunday" ) ),
+                       ( ( 1, 2, 3, 4 ), ( 1, 3, 4, 4 ) ), ( "Saturday" * 10, "Sunday" * 10 ) ]
+        self.metrics = [ fuzzycomp.levenshtein_distance, fuzzycomp.jaccard_distance,
+                         fuzzycomp.lcs_length, fuzzycomp.jaro_distance, fuzzycomp.jaro_winkler,
+                         fuzzycomp.dice_coefficient, fuzzycomp.lcs,
+                         lambda lhs, rhs: fuzzycomp.tversky_index( lhs, rhs, 0.5, 0.5 ),
+                         lambda lhs, rhs: fuzzycomp.levenshtein_distance( lhs, rhs, 2 ) ]
+
+    def test_metrics(self):
+        """Every metric should give the same results for prepared objects"""
+        for lhs, rhs in self.pairs:
+            prepared_lhs = fuzzycomp.prepare( lhs )
+            prepared_rhs = fuzzycomp.prepare( rhs )
+            for metric in self.metrics:
+                expected = metric( lhs, rhs )
+                self.assertEqual( metric( prepared_lhs, rhs ), expected )
+                self.assertEqual( metric( lhs, prepared_rhs ), expected )
+                self.assertEqual( metric( prepared_lhs, prepared_rhs ), expected )
+                # The cached values should give the same result again
+                self.assertEqual( metric( prepared_lhs, prepared_rhs ), expected )
+
+    def test_hamming_distance(self):
+        """Hamming distance should accept prepared objects"""
+        self.assertEqual( fuzzycomp.hamming_distance( fuzzycomp.prepare( "Hello" ), "World" ), 4 )
+        self.assertRaises( ValueError, fuzzycomp.hamming_distance, fuzzycomp.prepare( "Hello" ), "Foo" )
+
+    def test_batch(self):
+        """The batch functions should accept prepared queries and choices"""
+        choices = [ "Sunday", "Saturday", "Monday" ]
+        prepared = [ fuzzycomp.prepare( choice ) for choice in choices ]
+        expected = fuzzycomp.levenshtein_distance_many( "Saturday", choices )
+        result = fuzzycomp.levenshtein_distance_many( fuzzycomp.prepare( "Saturday" ), prepared )
+        self.assertEqual( [ ( choice.value, distance, index ) for choice, distance, index in result ],
+                          expected )
+
+        expected = fuzzycomp.jaro_winkler_topk( "Saturday", choices, 2 )
+        result = fuzzycomp.jaro_winkler_topk( fuzzycomp.prepare( "Saturday" ), prepared, 2 )
+        self.assertEqual( [ ( choice.value, score, index ) for choice, score, index in result ],
+                          expected )
+
+    def test_prepared_masks(self):
+        """A prepared query should have its masks built once and reused on either side"""
+        query = fuzzycomp.prepare( "MARTHA" )
+        self.assertEqual( fuzzycomp.jaro_winkler( query, "MARHTA" ),
+                          fuzzycomp.jaro_winkler( "MARTHA", "MARHTA" ) )
+        masks = query._masks
+        self.assertTrue( masks )
+        self.assertEqual( fuzzycomp.jaro_winkler( "MARHTA", query ),
+                          fuzzycomp.jaro_winkler( "MARHTA", "MARTHA" ) )
+        fuzzycomp.jaro_winkler_topk( query, ["MARHTA", "MARTA", "MATHRA"], 2 )
+        self.assertTrue( query._masks is masks )
+
+    def test_unhashable_input(self):
+        """Prepared objects with unhashable elements should be compared row by row"""
+        prepared = fuzzycomp.prepare( [[1], [2], [3]] )
+        self.assertEqual( fuzzycomp.levenshtein_distance( prepared, [[1], [3]] ), 1 )
+        self.assertEqual( fuzzycomp.levenshtein_distance( [[1], [3]], prepared ), 1 )
+        self.assertEqual( fuzzycomp.lcs_length( [[1], [3]], prepared ), 2 )
+
+    def test_sequence(self):
+        """Prepared objects should behave like the wrapped sequence"""
+        prepared = fuzzycomp.prepare( "MARTHA" )
+        self.assertEqual( len( prepared ), 6 )
+        self.assertEqual( list( prepared ), list( "MARTHA" ) )
+        self.assertEqual( prepared[1], "A" )
+        self.assertEqual( prepared.value, "MARTHA" )
+        self.assertTrue( fuzzycomp.prepare( prepared ) is prepared )
+
+    def test_pickle(self):
+        """Prepared objects should survive pickling"""
+        prepared = fuzzycomp.prepare( "MARTHA" )
+        fuzzycomp.jaro_distance( prepared, "MARHTA" )
+        for protocol in range( pickle.HIGHEST_PROTOCOL + 1 ):
+            copy = pickle.loads( pickle.dumps( prepared, protocol ) )
+            self.assertEqual( copy.value, "MARTHA" )
+            self.assertEqual( fuzzycomp.jaro_distance( copy, "MARHTA" ),
+                              fuzzycomp.jaro_distance( "MARTHA", "MARHTA" ) )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on empty or mixed input"""
+        self.assertRaises( ValueError, fuzzycomp.prepare, "" )
+        self.assertRaises( ValueError, fuzzycomp.prepare, [] )
+        self.assertRaises( ValueError, fuzzycomp.jaro_distance, fuzzycomp.prepare( "Foo" ), ["F"] )
+        self.assertRaises( ValueError, fuzzycomp.levenshtein_distance, ["F"], fuzzycomp.prepare( "Foo" ) )
+
+
+class TestJaroWinklerTopk( unittest.TestCase ):
+    def setUp(self):
+        self.choices = ["MARHTA", "DUANE", "MARTHA", "MARTA", "DICKSONX", "M",
+                        "MARTHAMARTHA", "ARTHAM"]
+
+    def scores(self, query, **kwargs):
+        """The results of a full scan, sorted by score then index"""
+        results = [ ( choice, fuzzycomp.jaro_winkler( query, choice, **kwargs ), index )
+                    for index, choice in enumerate( self.choices ) ]
+        return sorted( results, key = lambda result: ( -result[1], result[2] ) )
+
+    def test_valid_input(self):
+        """Function should return the k best choices of a full scan"""
+        for k in range( 1, len( self.choices ) + 1 ):
+            self.assertEqual( fuzzycomp.jaro_winkler_topk( "MARTHA", self.choices, k ),
+                              self.scores( "MARTHA" )[:k] )
+        self.assertEqual( fuzzycomp.jaro_winkler_topk( "DWAYNE", self.choices, 2 ),
+                          self.scores( "DWAYNE" )[:2] )
+        self.assertEqual( fuzzycomp.jaro_winkler_topk( "MARTHA", iter( self.choices ), 3,
+                                                       prefix_scale = 0.2 ),
+                          self.scores( "MARTHA", prefix_scale = 0.2 )[:3] )
+
+    def test_score_cutoff(self):
+        """Only choices scoring at least score_cutoff should be returned"""
+        result = fuzzycomp.jaro_winkler_topk( "MARTHA", self.choices, 10, score_cutoff = 0.9 )
+        self.assertEqual( result, [ item for item in self.scores( "MARTHA" ) if item[1] >= 0.9 ] )
+        self.assertEqual( fuzzycomp.jaro_winkler_topk( "MARTHA", ["XYZ"], 1, score_cutoff = 0.5 ), [] )
+
+    def test_ties(self):
+        """Ties should be resolved in favour of the choice read first"""
+        result = fuzzycomp.jaro_winkler_topk( "AB", ["AB", "XY", "AB", "AB"], 2 )
+        self.assertEqual( result, [ ( "AB", 1.0, 0 ), ( "AB", 1.0, 2 ) ] )
+
+    def test_iterable_input(self):
+        """Function should accept lists, including unhashable elements"""
+        result = fuzzycomp.jaro_winkler_topk( list( "MARTHA" ), [ list( choice ) for choice in self.choices ], 2 )
+        self.assertEqual( [ ( "".join( choice ), score, index ) for choice, score, index in result ],
+                          self.scores( "MARTHA" )[:2] )
+        result = fuzzycomp.jaro_winkler_topk( [[1], [2]], [ [[2], [1]], [[1], [2]] ], 1 )
+        self.assertEqual( result, [ ( [[1], [2]], 1.0, 1 ) ] )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on empty, mixed or invalid input"""
+        self.assertRaises( ValueError, fuzzycomp.jaro_winkler_topk, "", self.choices )
+        self.assertRaises( ValueError, fuzzycomp.jaro_winkler_topk, "MARTHA", [ "MARTHA", "" ] )
+        self.assertRaises( ValueError, fuzzycomp.jaro_winkler_topk, "MARTHA", [ "MARTHA", [1, 2] ] )
+        self.assertRaises( ValueError, fuzzycomp.jaro_winkler_topk, "MARTHA", self.choices, 0 )
+
+
 class TestDiceCoefficient( BaseTester ):
     def test_valid_input(self):
          """Algorithm should return correct values under valid input"""
@@ -339,6 +818,119 @@ class TestTverskyIndex( unittest.TestCase ):
         self.assertRaises( ValueError, fuzzycomp.tversky_index, [1,5], (1,5), 4, 8 )
 
 
+class TestPhoneticRules( unittest.TestCase ):
+    def test_compiled_rules(self):
+        """Compiled rule programs should give the same result as applying the rules one by one"""
+        names = ["SCHWARZENEGGER", "MAC DONALD JR.", "KNUTH", "PHILLIPSON", "WRIGHT", "XAVIER",
+                 "SCHMIDT III", "GNEDDY", "AEBERSOLD", "THOMPSON", "BACHMANN", "DIXON",
+                 "WHEATLEY", "CZERNY", "LUDWIG", "SCHUSTER", "!%&", "EEEE", "KEHR", "GAUGHT",
+                 "PHAETON", "CHRISTIE", "KNIGHT", "DODGE", "MBMB", "PSYCHE", "SCIENCE", "TICHO"]
+        for table, rules in fuzzycomp._PHONETIC_RULES.items():
+            for name in names:
+                expected = name
+                for rule in rules:
+                    expected = re.sub( rule[0], rule[1], expected )
+                self.assertEqual( fuzzycomp._run_rules( table, name ), expected )
+
+    def test_guards(self):
+        """The guard of a rule should pass for every name its pattern matches"""
+        names = ["SCHWARZENEGGER", "MAC DONALD JR.", "KNUTH", "PHILLIPSON", "WRIGHT", "XAVIER", "SCHMIDT III",
+                 "GNEDDY", "AEBERSOLD", "THOMPSON", "BACHMANN", "DIXON", "WHEATLEY", "CZERNY", "LUDWIG", "KEHR",
+                 "GAUGHT", "PHAETON", "CHRISTIE", "KNIGHT", "DODGE", "MBMB", "PSYCHE", "SCIENCE", "TICHO", "EVE",
+                 "MAY", "TEE\n", "SIGN", "BADGE", "AHHA", "BECK", "NATION", "MATCHES", "WYNN", "BOOTH", "0012"]
+        guards = { fuzzycomp._CONTAINS: lambda name, value: value in name,
+                   fuzzycomp._STARTS: lambda name, value: name.startswith( value ),
+                   fuzzycomp._ENDS: lambda name, value: name.endswith( value ),
+                   fuzzycomp._ANY_OF: lambda name, value: not set( name ).isdisjoint( value ),
+                   fuzzycomp._NONE_OF: lambda name, value: not set( name ) <= value }
+        for rules in fuzzycomp._PHONETIC_RULES.values():
+            for rule in rules:
+                kind, value = fuzzycomp._rule_guard( rule )
+                for name in names:
+                    if kind != fuzzycomp._ALWAYS and re.search( rule[0], name ):
+                        self.assertTrue( guards[kind]( name, value ), ( rule, name ) )
+
+class TestEncodeMany( unittest.TestCase ):
+    def setUp(self):
+        self.names = ["Robert", "Rupert", "Robert", "Rubin", "Robert", "Rupert"]
+
+    def test_valid_input(self):
+        """Codes should be the same as those of the encoder"""
+        for encoder in ["soundex", "nysiis", "metaphone", fuzzycomp.soundex]:
+            func = encoder if callable( encoder ) else getattr( fuzzycomp, encoder )
+            self.assertEqual( list( fuzzycomp.encode_many( encoder, self.names ) ),
+                              [ func( name ) for name in self.names ] )
+        self.assertEqual( list( fuzzycomp.encode_many( "cologne_phonetic", ["Breschnew"] ) ), ["17863"] )
+
+    def test_lazy(self):
+        """Names should be read lazily"""
+        codes = fuzzycomp.encode_many( "soundex", iter( self.names ) )
+        self.assertEqual( codes.next(), "R163" )
+
+    def test_encoder_arguments(self):
+        """Additional arguments should be passed to the encoder"""
+        self.assertEqual( list( fuzzycomp.encode_many( "nysiis", ["PHILLIPSON"], truncate = False ) ),
+                          ["FFALAPSAN"] )
+        self.assertEqual( list( fuzzycomp.encode_many( "metaphone", ["ESCARMANT"], length = 7 ) ),
+                          ["ESKRMNT"] )
+
+    def test_cache(self):
+        """Repeated names should be served from the cache"""
+        cache = fuzzycomp.LRUCache( 10 )
+        list( fuzzycomp.encode_many( "soundex", self.names, cache ) )
+        self.assertEqual( cache.misses, 3 )
+        self.assertEqual( cache.hits, 3 )
+        self.assertEqual( len( cache ), 3 )
+
+    def test_cache_size(self):
+        """The cache should not grow beyond its size, and drop the least recently used entries"""
+        cache = fuzzycomp.LRUCache( 2 )
+        list( fuzzycomp.encode_many( "soundex", ["Robert", "Rupert", "Robert", "Rubin", "Rupert"], cache ) )
+        self.assertEqual( len( cache ), 2 )
+        self.assertEqual( cache.hits, 1 )
+        self.assertEqual( cache.misses, 4 )
+
+    def test_invalid_rows(self):
+        """Names that can not be encoded should be passed to the error handler"""
+        failed = []
+        codes = list( fuzzycomp.encode_many( "soundex", ["Robert", "", None, [1, 2], "!%&", "Rubin", ""],
+                                             errors = lambda name, error: failed.append( ( name, error ) ) ) )
+        self.assertEqual( codes, ["R163", None, None, None, None, "R150", None] )
+        self.assertEqual( [ name for name, _ in failed ], ["", None, [1, 2], "!%&", ""] )
+        for _, error in failed:
+            self.assertTrue( isinstance( error, ValueError ) )
+        self.assertRaises( ValueError, list, fuzzycomp.encode_many( "soundex", ["Robert", ""] ) )
+
+    def test_cache_key_type(self):
+        """Equal str and unicode names should be cached apart"""
+        cache = fuzzycomp.LRUCache( 10 )
+        codes = list( fuzzycomp.encode_many( "soundex", ["abc", u"abc", "abc"], cache ) )
+        self.assertEqual( map( type, codes ), map( type, [ fuzzycomp.soundex( "abc" ), fuzzycomp.soundex( u"abc" ),
+                                                           fuzzycomp.soundex( "abc" ) ] ) )
+        self.assertEqual( cache.misses, 2 )
+        self.assertEqual( cache.hits, 1 )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on unknown encoders or cache sizes"""
+        self.assertRaises( ValueError, fuzzycomp.encode_many, "levenshtein_distance", self.names )
+        self.assertRaises( ValueError, fuzzycomp.encode_many, "soundex", self.names, None, 0 )
+
+class TestLRUCache( unittest.TestCase ):
+    def test_lru(self):
+        """The least recently used entry should be discarded first"""
+        cache = fuzzycomp.LRUCache( 2 )
+        cache.put( "a", 1 )
+        cache.put( "b", 2 )
+        self.assertEqual( cache.get( "a" ), 1 )
+        cache.put( "c", 3 )
+        self.assertFalse( "b" in cache )
+        self.assertEqual( cache.get( "b" ), None )
+        self.assertEqual( cache.get( "a" ), 1 )
+        self.assertEqual( cache.get( "c" ), 3 )
+        self.assertEqual( ( cache.hits, cache.misses ), ( 3, 1 ) )
+        cache.clear()
+        self.assertEqual( ( len( cache ), cache.hits, cache.misses ), ( 0, 0, 0 ) )
+
 class TestSoundex( unittest.TestCase ):
     def test_valid_input(self):
         """Algorithm should return correct values under valid input"""
@@ -366,6 +958,10 @@ class TestSoundex( unittest.TestCase ):
         """function should raise ValueError when provided with an empty string"""
         self.assertRaises( ValueError, fuzzycomp.soundex, "" )
 
+    def test_non_encodable_string(self):
+        """function should raise ValueError when the string has no letters to encode"""
+        self.assertRaises( ValueError, fuzzycomp.soundex, "!%&)#=&#" )
+
     def test_non_string(self):
         """function should raise ValueError when provided with a value that is not a string"""
         data = [ 2,
@@ -718,6 +1314,12 @@ class TestColognePhonetic( unittest.TestCase ):
             self.assertEqual( fuzzycomp.cologne_phonetic( unicode(name[0]) ), name[1] )
 
 
+    def test_byte_strings(self):
+        """Byte strings should be decoded as UTF-8"""
+        self.assertEqual( fuzzycomp.cologne_phonetic( u"Müller".encode( "utf-8" ) ),
+                          fuzzycomp.cologne_phonetic( u"Müller" ) )
+        self.assertEqual( fuzzycomp.cologne_phonetic( "M\xfcller" ), fuzzycomp.cologne_phonetic( u"Mller" ) )
+
     def test_non_string(self):
         """Function should raise ValueError when provided with input not being str or unicode"""
         data = [ 2,
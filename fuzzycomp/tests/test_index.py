@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011  Bjoern Larsson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import pickle
+from  fuzzycomp import fuzzycomp, index
+import sys
+
+WORDS = ["hello", "hallo", "hullo", "help", "hell", "shell", "yellow", "fellow",
+         "world", "word", "sword", "saturday", "sunday", "monday", "tuesday"]
+
+def linear_scan( term, words, max_distance, metric = fuzzycomp.levenshtein_distance ):
+    return sorted( ( word, metric( term, word ) ) for word in words
+                   if metric( term, word ) <= max_distance )
+
+class TestBKTree( unittest.TestCase ):
+    def setUp(self):
+        self.tree = index.BKTree( WORDS )
+
+    def test_size(self):
+        """The tree should hold every distinct item"""
+        self.assertEqual( len( self.tree ), len( WORDS ) )
+        self.assertEqual( sorted( self.tree ), sorted( WORDS ) )
+        self.assertFalse( self.tree.add( "hello" ) )
+        self.assertEqual( len( self.tree ), len( WORDS ) )
+
+    def test_query(self):
+        """Query should return the same items as a linear scan"""
+        for term in ["hello", "word", "sundae", "xyz"]:
+            for max_distance in range( 4 ):
+                self.assertEqual( sorted( self.tree.query( term, max_distance ) ),
+                                  linear_scan( term, WORDS, max_distance ) )
+
+    def test_query_sorted(self):
+        """Query results should be sorted by distance"""
+        distances = [ distance for _, distance in self.tree.query( "hello", 3 ) ]
+        self.assertEqual( distances, sorted( distances ) )
+        self.assertEqual( self.tree.query( "hello", 3 )[0], ( "hello", 0 ) )
+
+    def test_nearest(self):
+        """Nearest should return the k closest items"""
+        self.assertEqual( self.tree.nearest( "hello" ), [ ( "hello", 0 ) ] )
+        for term in ["hello", "word", "sundae", "xyz"]:
+            for k in range( 1, len( WORDS ) + 2 ):
+                expected = sorted( fuzzycomp.levenshtein_distance( term, word ) for word in WORDS )[:k]
+                self.assertEqual( [ distance for _, distance in self.tree.nearest( term, k ) ], expected )
+
+    def test_hamming_distance(self):
+        """The tree should work with the Hamming distance"""
+        codes = ["0101", "1111", "0000", "0011", "1000"]
+        tree = index.BKTree( codes, "hamming_distance" )
+        self.assertEqual( sorted( tree.query( "0001", 1 ) ),
+                          linear_scan( "0001", codes, 1, fuzzycomp.hamming_distance ) )
+        self.assertEqual( tree.nearest( "1111", 1 ), [ ( "1111", 0 ) ] )
+
+    def test_float_distance(self):
+        """The tree should work with a metric returning floats"""
+        tree = index.BKTree( WORDS, "jaccard_distance" )
+        for term in ["hello", "word", "sundae"]:
+            for max_distance in [0, 0.3, 0.5, 1]:
+                self.assertEqual( sorted( tree.query( term, max_distance ) ),
+                                  linear_scan( term, WORDS, max_distance, fuzzycomp.jaccard_distance ) )
+        self.assertEqual( tree.nearest( "hello", 1 ), [ ( "hello", 0 ) ] )
+
+    def test_empty_tree(self):
+        """An empty tree should return no results"""
+        tree = index.BKTree()
+        self.assertEqual( tree.query( "hello", 2 ), [] )
+        self.assertEqual( tree.nearest( "hello", 2 ), [] )
+
+    def test_pickle(self):
+        """A pickled tree should return the same results"""
+        tree = pickle.loads( pickle.dumps( self.tree, pickle.HIGHEST_PROTOCOL ) )
+        self.assertEqual( tree.query( "hello", 2 ), self.tree.query( "hello", 2 ) )
+        self.assertEqual( tree.nearest( "word", 3 ), self.tree.nearest( "word", 3 ) )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, self.tree.query, "hello", -1 )
+        self.assertRaises( ValueError, self.tree.nearest, "hello", 0 )
+        self.assertRaises( ValueError, index.BKTree, WORDS, "soundex" )
+        for metric in [ "jaro_winkler", "dice_coefficient", "lcs_length", fuzzycomp.jaro_distance ]:
+            self.assertRaises( ValueError, index.BKTree, WORDS, metric )
+
+class TestTrie( unittest.TestCase ):
+    def setUp(self):
+        self.trie = index.Trie( WORDS )
+
+    def test_size(self):
+        """The trie should hold every distinct word"""
+        self.assertEqual( len( self.trie ), len( WORDS ) )
+        self.assertEqual( sorted( self.trie ), sorted( WORDS ) )
+        self.assertFalse( self.trie.add( "hello" ) )
+        self.assertTrue( self.trie.add( "he" ) )
+        self.assertEqual( len( self.trie ), len( WORDS ) + 1 )
+
+    def test_contains(self):
+        """Only added words should be found, not their prefixes"""
+        self.assertTrue( "hello" in self.trie )
+        self.assertFalse( "hel" in self.trie )
+        self.assertFalse( "helloo" in self.trie )
+
+    def test_search(self):
+        """Search should return the same words as a linear scan"""
+        for term in ["hello", "word", "sundae", "xyz", "h"]:
+            for max_distance in range( 4 ):
+                self.assertEqual( sorted( self.trie.search( term, max_distance ) ),
+                                  linear_scan( term, WORDS, max_distance ) )
+
+    def test_search_sorted(self):
+        """Search results should be sorted by distance"""
+        distances = [ distance for _, distance in self.trie.search( "hello", 3 ) ]
+        self.assertEqual( distances, sorted( distances ) )
+
+    def test_iterable_input(self):
+        """The trie should accept tuples as words"""
+        trie = index.Trie( [ (1, 2, 3), (1, 2), (4, 5, 6) ] )
+        self.assertEqual( sorted( trie.search( (1, 2, 4), 1 ) ), [ ( (1, 2), 1 ), ( (1, 2, 3), 1 ) ] )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, self.trie.search, "hello", -1 )
+        self.assertRaises( ValueError, self.trie.search, "", 1 )
+        self.assertRaises( ValueError, self.trie.add, "" )
+
+class TestDeletionIndex( unittest.TestCase ):
+    def setUp(self):
+        self.index = index.DeletionIndex( WORDS )
+
+    def test_size(self):
+        """The index should hold every distinct word"""
+        self.assertEqual( len( self.index ), len( WORDS ) )
+        self.assertEqual( sorted( self.index ), sorted( WORDS ) )
+        self.assertTrue( "hello" in self.index )
+        self.assertFalse( self.index.add( "hello" ) )
+
+    def test_query(self):
+        """Query should return the same words as a linear scan"""
+        for term in ["hello", "word", "sundae", "xyz", "h", "sword"]:
+            for max_distance in range( 3 ):
+                self.assertEqual( sorted( self.index.query( term, max_distance ) ),
+                                  linear_scan( term, WORDS, max_distance ) )
+        self.assertEqual( sorted( self.index.query( "hello" ) ), linear_scan( "hello", WORDS, 2 ) )
+
+    def test_iterable_input(self):
+        """The index should accept tuples as words"""
+        deletions = index.DeletionIndex( [ (1, 2, 3), (1, 2), (4, 5, 6) ], 1 )
+        self.assertEqual( sorted( deletions.query( (1, 2, 4) ) ), [ ( (1, 2), 1 ), ( (1, 2, 3), 1 ) ] )
+
+    def test_pickle(self):
+        """A pickled index should return the same results"""
+        deletions = pickle.loads( pickle.dumps( self.index, pickle.HIGHEST_PROTOCOL ) )
+        self.assertEqual( len( deletions ), len( self.index ) )
+        for term in ["hello", "word", "sundae"]:
+            self.assertEqual( sorted( deletions.query( term ) ), sorted( self.index.query( term ) ) )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, index.DeletionIndex, WORDS, -1 )
+        self.assertRaises( ValueError, self.index.query, "hello", 3 )
+        self.assertRaises( ValueError, self.index.query, "hello", -1 )
+        self.assertRaises( ValueError, self.index.query, "" )
+        self.assertRaises( ValueError, self.index.add, "" )
+
+class TestPhoneticIndex( unittest.TestCase ):
+    def setUp(self):
+        self.names = ["Robert", "Rupert", "Rubin", "Smith", "Smyth", "Schmidt", "!%&", "Ashcraft"]
+
+    def test_candidates(self):
+        """Candidates should be the records sharing a code with the name"""
+        phonetic = index.PhoneticIndex( self.names )
+        self.assertEqual( len( phonetic ), len( self.names ) )
+        self.assertEqual( phonetic.candidates( "Robert" ), [0, 1] )
+        self.assertEqual( phonetic.candidates( "Smith" ), [3, 4] )
+        self.assertEqual( phonetic.candidates( "Xavier" ), [] )
+
+    def test_several_encoders(self):
+        """Candidates should be the union of the blocks of all encoders"""
+        phonetic = index.PhoneticIndex( self.names, ["soundex", fuzzycomp.metaphone] )
+        expected = set()
+        for encoder in [fuzzycomp.soundex, fuzzycomp.metaphone]:
+            expected.update( i for i, name in enumerate( self.names[:6] )
+                             if encoder( name ) == encoder( "Smith" ) )
+        self.assertEqual( phonetic.candidates( "Smith" ), sorted( expected ) )
+
+    def test_unencodable(self):
+        """Records that can not be encoded should be kept apart"""
+        phonetic = index.PhoneticIndex( self.names, ["soundex", "nysiis"] )
+        self.assertEqual( list( phonetic.unencodable ), [6] )
+        self.assertEqual( phonetic.candidates( "!%&" ), [] )
+        for block in phonetic.blocks():
+            self.assertFalse( 6 in block )
+
+    def test_key(self):
+        """Names should be taken from the records using the key"""
+        records = [ { "name" : name } for name in self.names ]
+        phonetic = index.PhoneticIndex( records, key = lambda record: record["name"] )
+        self.assertEqual( phonetic.candidates( "Robert" ), [0, 1] )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on unknown encoders"""
+        self.assertRaises( ValueError, index.PhoneticIndex, self.names, ["levenshtein_distance"] )
+        self.assertRaises( ValueError, index.PhoneticIndex, self.names, [] )
+
+if __name__ == "__main__":
+    sys.exit( unittest.main() )
+
+class TestNGramIndex( unittest.TestCase ):
+    def scan(self, term, metric, threshold, **kwargs):
+        """Every word passing the threshold, found by comparing all of them"""
+        results = []
+        for word in WORDS:
+            score = metric( term, word, **kwargs )
+            if score <= threshold if metric is fuzzycomp.jaccard_distance else score >= threshold:
+                results.append( ( word, score ) )
+        return sorted( results )
+
+    def test_query(self):
+        """Query should return the same results as a linear scan"""
+        terms = ["hello", "word", "sundae", "xyz", "yellowish", "shell"]
+        for threshold in [0.4, 0.6, 0.8, 1.0]:
+            ngrams = index.NGramIndex( WORDS, "dice_coefficient", threshold )
+            for term in terms:
+                self.assertEqual( sorted( ngrams.query( term ) ),
+                                  self.scan( term, fuzzycomp.dice_coefficient, threshold ) )
+
+            ngrams = index.NGramIndex( WORDS, "tversky_index", threshold, alpha = 0.3, beta = 1.5 )
+            for term in terms:
+                self.assertEqual( sorted( ngrams.query( term ) ),
+                                  self.scan( term, fuzzycomp.tversky_index, threshold,
+                                             alpha = 0.3, beta = 1.5 ) )
+
+        for threshold in [0.0, 0.2, 0.5]:
+            ngrams = index.NGramIndex( WORDS, fuzzycomp.jaccard_distance, threshold )
+            for term in terms:
+                self.assertEqual( sorted( ngrams.query( term ) ),
+                                  self.scan( term, fuzzycomp.jaccard_distance, threshold ) )
+
+    def test_ordering(self):
+        """Results should be sorted from the best match"""
+        ngrams = index.NGramIndex( WORDS, "dice_coefficient", 0.4 )
+        self.assertEqual( ngrams.query( "hello" )[0], ( "hello", 1.0 ) )
+        ngrams = index.NGramIndex( WORDS, "jaccard_distance", 0.5 )
+        self.assertEqual( ngrams.query( "hello" )[0], ( "hello", 0.0 ) )
+
+    def test_stricter_threshold(self):
+        """Queries should accept a threshold stricter than that of the index"""
+        ngrams = index.NGramIndex( WORDS, "dice_coefficient", 0.4 )
+        self.assertEqual( sorted( ngrams.query( "hello", 0.7 ) ),
+                          self.scan( "hello", fuzzycomp.dice_coefficient, 0.7 ) )
+        self.assertRaises( ValueError, ngrams.query, "hello", 0.3 )
+
+    def test_self_join(self):
+        """Self join should return every pair passing the threshold once"""
+        ngrams = index.NGramIndex( WORDS[:8] )
+        for word in WORDS[8:]:
+            ngrams.add( word )
+        expected = [ ( i, j, fuzzycomp.dice_coefficient( WORDS[i], WORDS[j] ) )
+                     for j in range( len( WORDS ) ) for i in range( j )
+                     if fuzzycomp.dice_coefficient( WORDS[i], WORDS[j] ) >= 0.5 ]
+        ngrams = index.NGramIndex( WORDS, "dice_coefficient", 0.5 )
+        self.assertEqual( list( ngrams.self_join() ), expected )
+
+    def test_iterable_input(self):
+        """The index should accept other sequences, compared by their elements"""
+        ngrams = index.NGramIndex( [ (1, 2, 3), (1, 2), (4, 5, 6) ], "jaccard_distance", 0.5 )
+        self.assertEqual( sorted( ngrams.query( (1, 2, 4) ) ), [ ( (1, 2), 1 - 2 / 3.0 ), ( (1, 2, 3), 0.5 ) ] )
+        self.assertEqual( list( ngrams.self_join() ), [ ( 0, 1, 1 - 2 / 3.0 ) ] )
+
+    def test_pickle(self):
+        """A pickled index should return the same results"""
+        ngrams = index.NGramIndex( WORDS, "dice_coefficient", 0.5 )
+        copy = pickle.loads( pickle.dumps( ngrams, pickle.HIGHEST_PROTOCOL ) )
+        self.assertEqual( len( copy ), len( WORDS ) )
+        self.assertEqual( list( copy ), WORDS )
+        for term in ["hello", "word", "sundae"]:
+            self.assertEqual( copy.query( term ), ngrams.query( term ) )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, index.NGramIndex, WORDS, "levenshtein_distance" )
+        self.assertRaises( ValueError, index.NGramIndex, WORDS, "soundex" )
+        self.assertRaises( ValueError, index.NGramIndex, WORDS, "dice_coefficient", 0 )
+        self.assertRaises( ValueError, index.NGramIndex, WORDS, "dice_coefficient", 1.5 )
+        self.assertRaises( ValueError, index.NGramIndex, WORDS, "jaccard_distance", 1 )
+        self.assertRaises( ValueError, index.NGramIndex, WORDS, "tversky_index", 0.5, 0, 1 )
+        self.assertRaises( ValueError, index.NGramIndex, [ "hello", "" ] )
+
+@unittest.skipIf( fuzzycomp.np is None, "NumPy is not installed" )
+class TestMinHashLSH( unittest.TestCase ):
+    def setUp(self):
+        self.documents = [ tuple( sentence.split() ) for sentence in [
+            "the quick brown fox jumps over the lazy dog",
+            "the quick brown fox jumped over the lazy dog",
+            "the quick brown fox jumps over a lazy dog",
+            "a stitch in time saves nine",
+            "a stitch in time saves nine lives",
+            "an apple a day keeps the doctor away" ] ]
+
+    def test_query(self):
+        """Query should return the similar documents with their exact distance"""
+        lsh = index.MinHashLSH( self.documents, 0.5 )
+        result = lsh.query( self.documents[0] )
+        self.assertEqual( result[0], ( self.documents[0], 0.0 ) )
+        self.assertEqual( sorted( result ),
+                          sorted( ( document, fuzzycomp.jaccard_distance( self.documents[0], document ) )
+                                  for document in self.documents[:3] ) )
+        self.assertEqual( lsh.query( ( "nothing", "in", "common" ) ), [] )
+
+    def test_self_join(self):
+        """Self join should return the pairs within the threshold"""
+        lsh = index.MinHashLSH( self.documents[:2], 0.5 )
+        for document in self.documents[2:]:
+            lsh.add( document )
+        expected = [ ( i, j, fuzzycomp.jaccard_distance( self.documents[i], self.documents[j] ) )
+                     for j in range( len( self.documents ) ) for i in range( j )
+                     if fuzzycomp.jaccard_distance( self.documents[i], self.documents[j] ) <= 0.5 ]
+        self.assertEqual( list( lsh.self_join() ), expected )
+
+    def test_no_false_positives(self):
+        """Candidates outside the threshold should not be reported"""
+        lsh = index.MinHashLSH( self.documents, 0.5, bands = 128 )
+        self.assertTrue( len( lsh.candidates( self.documents[3] ) ) >= 2 )
+        for i, j, distance in lsh.self_join():
+            self.assertTrue( distance <= 0.5 )
+
+    def test_estimate(self):
+        """The estimate should be close to the exact distance"""
+        lsh = index.MinHashLSH( num_perm = 256 )
+        for lhs, rhs in [ ( self.documents[0], self.documents[1] ), ( self.documents[3], self.documents[4] ),
+                          ( self.documents[0], self.documents[5] ) ]:
+            self.assertAlmostEqual( lsh.estimate( lhs, rhs ), fuzzycomp.jaccard_distance( lhs, rhs ),
+                                    delta = 0.15 )
+        self.assertEqual( lsh.estimate( self.documents[0], self.documents[0] ), 0.0 )
+        self.assertEqual( len( lsh.signature( "hello" ) ), 256 )
+
+    def test_bands(self):
+        """The bands should give a pair at the threshold the requested recall"""
+        for num_perm in [ 16, 100, 128 ]:
+            for threshold in [ 0.03, 0.07, 0.2, 0.5, 0.8 ]:
+                for recall in [ 0.5, 0.9, 0.99 ]:
+                    similarity = 1 - threshold
+                    if 1 - threshold ** num_perm < recall:
+                        # Not even one row per band reaches the recall
+                        self.assertRaises( ValueError, index.MinHashLSH, threshold = threshold,
+                                           num_perm = num_perm, recall = recall )
+                        continue
+                    lsh = index.MinHashLSH( threshold = threshold, num_perm = num_perm, recall = recall )
+                    self.assertTrue( 1 - ( 1 - similarity ** lsh.rows ) ** lsh.bands >= recall,
+                                     ( num_perm, threshold, recall ) )
+                    self.assertTrue( lsh.bands * lsh.rows <= lsh.num_perm )
+        lsh = index.MinHashLSH( bands = 16 )
+        self.assertEqual( ( lsh.bands, lsh.rows ), ( 16, 8 ) )
+
+    def test_pickle(self):
+        """A pickled index should return the same results"""
+        lsh = index.MinHashLSH( self.documents, 0.5 )
+        copy = pickle.loads( pickle.dumps( lsh, pickle.HIGHEST_PROTOCOL ) )
+        self.assertEqual( list( copy ), self.documents )
+        self.assertEqual( copy.query( self.documents[3] ), lsh.query( self.documents[3] ) )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, index.MinHashLSH, self.documents, 1 )
+        self.assertRaises( ValueError, index.MinHashLSH, self.documents, -0.1 )
+        self.assertRaises( ValueError, index.MinHashLSH, self.documents, 0.5, 0 )
+        self.assertRaises( ValueError, index.MinHashLSH, self.documents, 0.5, 128, 0 )
+        self.assertRaises( ValueError, index.MinHashLSH, self.documents, 0.5, 128, 0.9, 129 )
+        self.assertRaises( ValueError, index.MinHashLSH, self.documents, 0.9, 4, 0.99 )
+        self.assertRaises( ValueError, index.MinHashLSH, [ ( "a", ), () ] )
+
+class TestMultiIndexHash( unittest.TestCase ):
+    def setUp(self):
+        self.codes = [ 0x0000, 0x0001, 0x0003, 0x8001, 0x00ff, 0xffff, 0xfffe, 0x0f0f ]
+
+    def test_query(self):
+        """Query should return all codes within the distance of the term"""
+        mih = index.MultiIndexHash( self.codes, 16, 4 )
+        for term in [ 0x0000, 0x0f0f, 0xfff0, 0x1234 ]:
+            for max_distance in range( 17 ):
+                expected = [ ( code, distance ) for code, distance in
+                             linear_scan( term, self.codes, max_distance, fuzzycomp.bitwise_hamming_distance ) ]
+                self.assertEqual( sorted( mih.query( term, max_distance ) ), sorted( expected ) )
+        self.assertEqual( mih.query( 0x0003, 1 ), [ ( 0x0003, 0 ), ( 0x0001, 1 ) ] )
+
+    def test_byte_codes(self):
+        """Byte string codes should be compared bit by bit"""
+        mih = index.MultiIndexHash( [ "\x00\x00", "\x80\x01", "\xff\xff" ], 16 )
+        self.assertEqual( sorted( mih.query( "\x00\x01", 1 ) ), [ ( "\x00\x00", 1 ), ( "\x80\x01", 1 ) ] )
+        self.assertEqual( mih.query( "\x7f\xff", 1 ), [ ( "\xff\xff", 1 ) ] )
+
+    def test_counters(self):
+        """The counters should add up the work of all queries"""
+        mih = index.MultiIndexHash( self.codes, 16, 4 )
+        mih.query( 0x0000, 0 )
+        self.assertEqual( ( mih.queries, mih.probes, mih.candidates ), ( 1, 1, 1 ) )
+        mih.query( 0x0000, 3 )
+        self.assertEqual( ( mih.queries, mih.probes, mih.candidates ), ( 2, 1 + 4, 1 + 6 ) )
+
+    def test_invalid_input(self):
+        """Function should raise ValueError on invalid arguments"""
+        self.assertRaises( ValueError, index.MultiIndexHash, [], 0 )
+        self.assertRaises( ValueError, index.MultiIndexHash, [], 8, 9 )
+        self.assertRaises( ValueError, index.MultiIndexHash, [ 256 ], 8 )
+        self.assertRaises( ValueError, index.MultiIndexHash, [ -1 ], 8 )
+        self.assertRaises( ValueError, index.MultiIndexHash, [ "ab" ], 8 )
+        self.assertRaises( ValueError, index.MultiIndexHash( [], 8 ).query, 1, -1 )
@@ -26,7 +26,8 @@ def get_description():
 setup(
     name = "fuzzycomp",
     version = "0.2.1",
-    packages = ["fuzzycomp"],
+    packages = ["fuzzycomp", "fuzzycomp.benchmarks"],
+    scripts = ["scripts/fuzzycomp"],
     author = "Björn Larsson",
     author_email = "fuzzycomp@googlegroups.com",
     url = "http://code.google.com/p/fuzzycomp/",
@@ -38,9 +39,6 @@ setup(
     keywords = ["comparison", "fuzzy"],
     classifiers = [
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2.4",
-        "Programming Language :: Python :: 2.5",
-        "Programming Language :: Python :: 2.6",
         "Programming Language :: Python :: 2.7",
         "License :: OSI Approved :: GNU General Public License (GPL)",
         "Operating System :: OS Independent",